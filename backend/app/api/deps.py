@@ -2,7 +2,29 @@ from typing import Any, Dict, List, Optional
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.responses import RedirectResponse
 from app.core.security import decode_jwt 
-from app.core.db import users_col
+from app.crud import (
+    CartRepository, OrderRepository, ProductRepository, RefreshTokenRepository, Repositories, UserRepository,
+)
+
+# ---- Repository providers：lifespan 建好放在 app.state.repos，這裡只取屬性 ----
+# 都是 async def：sync 的 dependency 會被丟到 threadpool 執行，反而比較慢
+async def get_repos(request: Request) -> Repositories:
+    return request.app.state.repos
+
+async def users_repo(request: Request) -> UserRepository:
+    return request.app.state.repos.users
+
+async def products_repo(request: Request) -> ProductRepository:
+    return request.app.state.repos.products
+
+async def carts_repo(request: Request) -> CartRepository:
+    return request.app.state.repos.carts
+
+async def orders_repo(request: Request) -> OrderRepository:
+    return request.app.state.repos.orders
+
+async def refresh_tokens_repo(request: Request) -> RefreshTokenRepository:
+    return request.app.state.repos.refresh_tokens
 
 async def get_bearer_token(request: Request) -> str:
     auth = request.headers.get("Authorization", "")
@@ -55,13 +77,14 @@ def require_level_page(levels: List[int]):
 
 async def get_current_user(
     payload: Dict[str, Any] = Depends(get_jwt_payload),
-    users = Depends(users_col),
+    users: UserRepository = Depends(users_repo),
     ) -> Dict[str, Any]:
     account = payload.get("account")
     if not account:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
 
-    user = await users.find_one({"account": account})
+    # 先查快取；update/delete user 會主動失效，其他 worker 的修改最多晚 TTL 秒生效
+    user = await users.get_principal(account)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
 
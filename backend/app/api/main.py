@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.routes import products, login, users, carts , register, products_management, story, home
+from app.api.routes import products, login, users, carts , register, products_management, story, home, orders, images, metrics
 
 
 api_router = APIRouter()
@@ -8,8 +8,11 @@ api_router.include_router(home.router)
 api_router.include_router(login.router)
 api_router.include_router(users.router)
 api_router.include_router(carts.router)
+api_router.include_router(orders.router)
 api_router.include_router(products.router)
+api_router.include_router(images.router)
 api_router.include_router(products_management.router)
 api_router.include_router(register.router)
 api_router.include_router(story.router)
+api_router.include_router(metrics.router)
 
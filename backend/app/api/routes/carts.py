@@ -1,15 +1,22 @@
 from app.models import AddToCartRequest, SetQuantityRequest
 from fastapi import APIRouter, Depends , HTTPException , status , Request
-from fastapi.responses import FileResponse , PlainTextResponse
+from fastapi.responses import PlainTextResponse
 from datetime import datetime , timezone
 import secrets
+import time
 from dotenv import load_dotenv
-from app.api.deps import get_current_user
-from app.core.db import carts_col, products_col
+from app.api.deps import get_current_user, get_repos, carts_repo, products_repo, orders_repo
+from app.core.payment_inbox import inbox
+from app.crud import CartRepository, OrderRepository, ProductRepository, Repositories, cart_totals
 from app.core.ECpay.ECpay_sdk import ECPayPaymentSdk
+from app.core.ECpay.ECpay_async import AsyncECPayClient
+from app.core import etags, metrics
+from app.core.responses import ORJSONResponse
+from app.core.config import settings
 import logging
 import os
-from app.core.paths import STATIC_DIR
+from pymongo.errors import PyMongoError
+from app.core.pages import page
 
 router = APIRouter(tags=["carts"])
 
@@ -20,15 +27,25 @@ MERCHANT_ID = os.getenv("MERCHANT_ID")
 HASH_KEY    = os.getenv("HASH_KEY")
 HASH_IV     = os.getenv("HASH_IV")
 sdk = ECPayPaymentSdk(MerchantID=MERCHANT_ID, HashKey=HASH_KEY, HashIV=HASH_IV)
+# 查單 / 關帳退刷等後台 API 在 handler 裡要用這個 async 版本，不要直接呼叫 sdk 的同步方法（例如 payment_status）
+ecpay_client = AsyncECPayClient(
+    sdk,
+    timeout=settings.ECPAY_HTTP_TIMEOUT_SECONDS,
+    max_connections=settings.ECPAY_HTTP_MAX_CONNECTIONS,
+    max_concurrency=settings.ECPAY_HTTP_MAX_CONNECTIONS,
+    retries=settings.ECPAY_HTTP_RETRIES,
+)
 ECPAY_STAGE = "https://payment-stage.ecpay.com.tw/Cashier/AioCheckOut/V5"
+ECPAY_QUERY_URL = "https://payment-stage.ecpay.com.tw/Cashier/QueryTradeInfo/V5"
 FRONTEND_BASE_URL = os.getenv("FRONTEND_BASE_URL")
 BASE_URL = os.getenv("BASE_URL")
 
 
-def _totals(items: list[dict]):
-    subtotal = sum(int(i.get("price", 0)) * int(i.get("quantity", 0)) for i in items)
-    count = sum(int(i.get("quantity", 0)) for i in items)
-    return {"subtotal": subtotal, "count": count}
+def _cart_etag(cart: dict | None) -> str:
+    # 沒有 active 車 → 固定回空車；_id 一起算進去，刪掉重建的車 rev 從頭算也不會撞到
+    if not cart:
+        return etags.make("cart", 0)
+    return etags.make("cart", cart.get("rev", 0), cart["_id"])
 
 def gen_order_no() -> str:
     return datetime.now(timezone.utc).strftime("ODR%Y%m%d") + secrets.token_hex(4).upper()
@@ -36,24 +53,28 @@ def gen_order_no() -> str:
 
 @router.get("/cart")
 async def get_cart():
-    return FileResponse(STATIC_DIR / "Product" / "cart.html")
+    return page("Product", "cart.html")
 
 # 取得購物車（前端用這個拉資料）
 @router.get("/api/cart")
-async def get_cart_api(current: dict = Depends(get_current_user),carts_collection = Depends(carts_col),):
+async def get_cart_api(request: Request, current: dict = Depends(get_current_user), carts: CartRepository = Depends(carts_repo),):
     # get_current_user 已經保證有登入，不需要再 _require_login
     account = current["account"]  # 只信 JWT 裡的 account
 
-    cart = await carts_collection.find_one(
-        {"account": account, "status": "active"},
-        {"_id": 0},
-    )
+    # 帶了 If-None-Match：先只讀 rev（覆蓋索引），沒變就回 304，不讀購物車內容
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        etag = _cart_etag(await carts.get_revision(account))
+        if etags.matches(if_none_match, etag):
+            return etags.not_modified(etag)
+
+    cart = await carts.get_active(account)
 
     items = cart.get("items", []) if cart else []
-    return {
+    return ORJSONResponse(content={
         "cart": items,
-        "total": _totals(items),
-    }
+        "total": cart_totals(cart),
+    }, headers=etags.headers(_cart_etag(cart)))
 
 
 
@@ -62,8 +83,8 @@ async def get_cart_api(current: dict = Depends(get_current_user),carts_collectio
 async def add_to_cart(
     body: AddToCartRequest,
     current: dict = Depends(get_current_user),
-    products_collection = Depends(products_col),
-    carts_collection = Depends(carts_col),
+    products: ProductRepository = Depends(products_repo),
+    carts: CartRepository = Depends(carts_repo),
 ):
     # 這裡一定是有登入的使用者（get_current_user 已檢查）
     account = current["account"]
@@ -71,86 +92,48 @@ async def add_to_cart(
     name = body.name      # 已經 strip + 檢查不得為空
     quantity = body.quantity  # 至少 1，因為 Field(ge=1)
 
-    # 確認商品存在
-    product = await products_collection.find_one({"name": name}, {"_id": 0})
+    # 確認商品存在（查記憶體裡的商品目錄，不打 DB）
+    product = await products.get_cached(name)
     if not product:
         raise HTTPException(status_code=404, detail="商品不存在")
 
-    price = int(product.get("price", 0))
-
-    # 找使用者的 active 購物車
-    cart = await carts_collection.find_one(
-        {"account": account, "status": "active"},
-        {"_id": 0},
-    )
-    items = cart.get("items", []) if cart else []
-
-    # 3️⃣ 如果商品已在購物車裡 → 累加數量；否則新增一筆
-    for it in items:
-        if it["name"] == name:
-            it["quantity"] = int(it.get("quantity", 0)) + quantity
-            it["price"] = price  # 價格以現在商品價格為準
-            break
-    else:
-        items.append({
-            "name": name,
-            "quantity": quantity,
-            "price": price,
-            "img": product.get("img"),
-        })
-
-    # 4️⃣ 寫回 DB（upsert：第一次也會建立）
-    await carts_collection.update_one(
-        {"account": account, "status": "active"},
-        {
-            "$set": {
-                "items": items,
-                "account": account,
-                "status": "active",
-            }
-        },
-        upsert=True,
+    # 一次 round trip：已在車裡就累加、不在就 append，並回傳更新後的購物車
+    cart = await carts.add_item(
+        account, name=name, quantity=quantity, price=int(product.get("price", 0)), img=product.get("img"),
     )
 
-    return {
+    items = cart.get("items", [])
+    return ORJSONResponse(status_code=201, content={
         "success": True,
         "cart": items,
-        "total": _totals(items),
-    }
+        "total": cart_totals(cart),
+    })
 
 @router.delete("/api/cart/items/{name}")
 async def remove_from_cart(
     name: str,
     current: dict = Depends(get_current_user),
-    carts_collection = Depends(carts_col),
+    carts: CartRepository = Depends(carts_repo),
 ):
     # 只信 JWT 拿 account（get_current_user 已經確保有登入）
     account = current["account"]
 
-    filter_ = {"account": account, "status": "active"}
+    # 把 items 陣列裡 name=指定值 的項目移除並重算總計，直接拿回更新後的購物車
+    cart = await carts.remove_item(account, name)
 
-    # 用 $pull 把 items 陣列裡 name=指定值 的項目移除
-    result = await carts_collection.update_one(
-        filter_,
-        {"$pull": {"items": {"name": name}}},
-    )
-
-    if result.modified_count == 0:
+    if cart is None:
         # 沒有那個項目（或購物車不存在）
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="項目不存在或購物車不存在",
         )
 
-    # 回傳最新購物車內容給前端
-    cart = await carts_collection.find_one(filter_, {"_id": 0, "items": 1})
-
-    items = cart.get("items", []) if cart else []
-    return {
+    items = cart.get("items", [])
+    return ORJSONResponse(content={
         "success": True,
         "cart": items,
-        "total": _totals(items),
-    }
+        "total": cart_totals(cart),
+    })
 
 
 
@@ -159,49 +142,35 @@ async def set_quantity(
     name: str,
     body: SetQuantityRequest,
     current: dict = Depends(get_current_user),
-    carts_collection = Depends(carts_col),
+    carts: CartRepository = Depends(carts_repo),
 ):
     account = current["account"]
 
     qty = body.quantity  # 一定 >= 1（前端也保證 >0）
 
-    result = await carts_collection.update_one(
-        {"account": account, "status": "active", "items.name": name},
-        {"$set": {"items.$.quantity": qty}},
-    )
+    cart = await carts.set_quantity(account, name, qty)
 
-    if result.matched_count == 0:
+    if cart is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="項目不存在",
         )
 
-    cart = await carts_collection.find_one(
-        {"account": account, "status": "active"},
-        {"_id": 0, "items": 1},
-    )
-
-    items = cart.get("items", []) if cart else []
-    return {
+    items = cart.get("items", [])
+    return ORJSONResponse(content={
         "cart": items,
-        "total": _totals(items),
-    }
+        "total": cart_totals(cart),
+    })
 
 # 清空購物車
 @router.delete("/api/cart")
 async def clear_cart(
     current: dict = Depends(get_current_user),
-    carts_collection = Depends(carts_col),
+    carts: CartRepository = Depends(carts_repo),
 ):
     account = current["account"]  # 一律信 JWT 內的 account
 
-    filter_ = {"account": account, "status": "active"}
-
-    await carts_collection.update_one(
-        filter_,
-        {"$set": {"items": []}},
-        upsert=False,  # 清空通常不需要幫你建立新車
-    )
+    await carts.clear(account)
 
     # 策略 A：永遠回空車（前端處理最簡單）
     return {
@@ -214,43 +183,32 @@ async def clear_cart(
 @router.post("/api/checkout")
 async def create_checkout_session(
     current: dict = Depends(get_current_user),
-    carts_collection = Depends(carts_col),
+    carts: CartRepository = Depends(carts_repo),
+    orders: OrderRepository = Depends(orders_repo),
 ):
     account = current["account"]
 
-    cart = await carts_collection.find_one(
-        {"account": account, "status": "active"},
-        {"_id": 0},
-    )
-    items = (cart or {}).get("items") or []
-
-    if not items:
-        raise HTTPException(status_code=400, detail="購物車為空")
-
-    total = _totals(items)  # 你的實作是 dict: {"subtotal": ..., "count": ...}
-    amount = int(total["subtotal"])
-
-    if amount <= 0:
+    # 1) 原子地拿走 active 車裡的商品（車同時清空），拿走之後再加入的商品不會被算進這張單
+    cart = await carts.take_items(account)
+    if cart is None:
+        current_cart = await carts.get_active(account)
+        if not (current_cart or {}).get("items"):
+            raise HTTPException(status_code=400, detail="購物車為空")
         raise HTTPException(status_code=400, detail="金額錯誤")
 
-    # 2) 建立訂單號（寫在 cart 上，當作 pending 訂單）
-    order_id = gen_order_no()
+    items = cart["items"]
+    # 金額直接用購物車上存好的 subtotal（每次改 items 時同步寫入）
+    totals = cart_totals(cart)
+    amount = totals["subtotal"]
 
-    upd = {
-        "status": "pending",
-        "merchant_trade_no": order_id,
-        "amount_snapshot": amount,
-        "items_snapshot": items,
-        "provider": "ECPay",
-        "paid_at": None,
-        "attempt": int((cart or {}).get("attempt", 0)) + 1,
-        "updated_at": datetime.now(timezone.utc),
-    }
-    await carts_collection.update_one(
-        {"account": account, "status": "active"},
-        {"$set": upd},
-        upsert=False,  # 若沒有 active cart 通常代表流程有問題（items 都清掉了）
-    )
+    # 2) 建立訂單（orders 裡的 items / 金額之後不再變動），並登記結帳保留（逾時未付款會被回收）
+    order_id = gen_order_no()
+    try:
+        await orders.reserve_checkout(order_no=order_id, account=account)
+        await orders.create(order_no=order_id, account=account, items=items, amount=amount, count=totals["count"])
+    except PyMongoError:
+        await carts.restore_items(account, items)
+        raise
 
     # 3) 組 ECPay 欄位（ChoosePayment=ALL）
     params = {
@@ -269,18 +227,18 @@ async def create_checkout_session(
     }
 
     fields = sdk.create_order(params)
-    return {
+    return ORJSONResponse(content={
         "action": ECPAY_STAGE,
         "method": "POST",
         "fields": fields,
-    }
+    })
 
 
 # === 2) ECPay 付款通知（Webhook） ===
 @router.post("/payment/notify", response_class=PlainTextResponse)
 async def ecpay_notify(
     request: Request,
-    carts_collection = Depends(carts_col),
+    repos: Repositories = Depends(get_repos),
 ):
     form = dict((await request.form()).items())
 
@@ -292,76 +250,64 @@ async def ecpay_notify(
     try:
         if not sdk.verify_notify_mac(form):
             logger.error("[ECPAY] BAD_MAC no=%s payload=%s", merchant_trade_no, form)
+            metrics.inc("ecpay_notify_total", result="bad_mac")
             return PlainTextResponse("0|FAIL")
     except Exception as e:
         logger.exception("[ECPAY] MAC_EXCEPTION no=%s err=%s payload=%s", merchant_trade_no, e, form)
+        metrics.inc("ecpay_notify_total", result="mac_error")
         return PlainTextResponse("0|FAIL")
 
-    # 2) 解析金額
-    try:
-        trade_amt = int(form.get("TradeAmt", "0"))
-    except Exception:
-        logger.warning("[ECPAY] BAD_TRADE_AMT no=%s raw=%s", merchant_trade_no, form.get("TradeAmt"))
-        return PlainTextResponse("0|FAIL")
+    # 2) 寫進 inbox 就回 1|OK；找單、比對金額、改狀態由背景 consumer 處理（重送的通知只會存一次）
+    if not await inbox.record(repos.ecpay_inbox, form):
+        logger.info("[ECPAY] DUPLICATE no=%s rtn=%s -> idempotent OK", merchant_trade_no, rtn_code)
+        metrics.inc("ecpay_notify_total", result="duplicate")
+    else:
+        metrics.inc("ecpay_notify_total", result="recorded")
+    return PlainTextResponse("1|OK")
 
-    # 3) 找單（冪等：找不到視為已處理）
-    cart = await carts_collection.find_one({"merchant_trade_no": merchant_trade_no})
-    if not cart:
-        logger.warning("[ECPAY] CART_NOT_FOUND no=%s", merchant_trade_no)
-        return PlainTextResponse("1|OK")
 
-    # 4) 若非 pending
-    status_now = cart.get("status")
-    if status_now != "pending":
-        logger.info("[ECPAY] NON_PENDING no=%s status=%s -> idempotent OK", merchant_trade_no, status_now)
-        return PlainTextResponse("1|OK")
+# === 3) 主動查詢付款狀態：webhook 還沒到（或沒送到）時，前端可以用這支向 ECPay 查單 ===
+@router.get("/api/payment/status/{order_no}")
+async def payment_status(
+    order_no: str,
+    current: dict = Depends(get_current_user),
+    repos: Repositories = Depends(get_repos),
+):
+    order = await repos.orders.get_for_account(order_no, current["account"])
+    if not order:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="訂單不存在")
+    if order["status"] != "pending":
+        return ORJSONResponse(content={"orderNo": order_no, "status": order["status"]})
 
-    # 5) 金額比對
     try:
-        expect_amt = int(cart.get("amount_snapshot", -1))
-    except Exception:
-        expect_amt = -1
-    if expect_amt != trade_amt:
-        logger.warning("[ECPAY] AMOUNT_MISMATCH no=%s expect=%s got=%s", merchant_trade_no, expect_amt, trade_amt)
-        return PlainTextResponse("0|FAIL")
-
-    # 6) 準備更新
-    now = datetime.now(timezone.utc)
-    updates = {
-        "provider_payload": form,
-        "updated_at": now,
-    }
-
-    if rtn_code == "1":  # 成功
-        updates.update({
-            "status": "success",
-            "provider_trade_no": form.get("TradeNo"),
-            "paid_at": now,
+        trade = await ecpay_client.order_search(ECPAY_QUERY_URL, {
+            "MerchantTradeNo": order_no, "TimeStamp": int(time.time()),
         })
-    else:  # 未成功 → active（保留購物車內容）
-        updates.update({
-            "status": "active",
-            "provider_trade_no": None,
-            "paid_at": None,
-            "last_payment_failed": True,
-            "failure_reason": form.get("RtnMsg") or "PaymentNotSuccessful",
+    except Exception as e:
+        # 查不到不影響訂單，之後的 webhook / 下次查詢還會處理
+        logger.warning("[ECPAY] QUERY_FAILED no=%s err=%r", order_no, e)
+        metrics.inc("ecpay_query_total", result="error")
+        return ORJSONResponse(content={"orderNo": order_no, "status": order["status"]})
+
+    metrics.inc("ecpay_query_total", result="ok")
+    if trade.get("TradeStatus") == "1":
+        # 已付款：跟 webhook 走同一條路寫進 inbox（之後真的通知到了會被當成重送），由 consumer 改訂單狀態
+        await inbox.record(repos.ecpay_inbox, {
+            "MerchantTradeNo": order_no,
+            "TradeNo": trade.get("TradeNo"),
+            "RtnCode": "1",
+            "RtnMsg": "QueryTradeInfo",
+            "TradeAmt": trade.get("TradeAmt"),
+            "PaymentDate": trade.get("PaymentDate"),
+            "PaymentType": trade.get("PaymentType"),
         })
-
-    res = await carts_collection.update_one(
-        {"merchant_trade_no": merchant_trade_no, "status": "pending"},
-        {"$set": updates},
-    )
-    logger.info(
-        "[ECPAY] UPDATE no=%s matched=%s modified=%s -> %s",
-        merchant_trade_no, res.matched_count, res.modified_count, updates["status"],
-    )
-
-    # 7) 一定回 1|OK
-    return PlainTextResponse("1|OK")
+    return ORJSONResponse(content={
+        "orderNo": order_no, "status": order["status"], "trade_status": trade.get("TradeStatus"),
+    })
 
 
-# === 3) ECPay 導回頁（使用者付款後跳回來） ===
+# === 4) ECPay 導回頁（使用者付款後跳回來） ===
 @router.api_route("/payment/return", methods=["POST"])
 async def payment_return():
     # 你原本就是直接回首頁 HTML
-    return FileResponse(STATIC_DIR/ "home.html")
\ No newline at end of file
+    return page("home.html")
\ No newline at end of file
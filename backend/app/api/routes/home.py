@@ -1,9 +1,8 @@
-from fastapi.responses import FileResponse
 from fastapi import APIRouter
-from app.core.paths import STATIC_DIR
+from app.core.pages import page
 
 router = APIRouter(tags=["home"])
 
 @router.get("/")
 async def serve_home_page():
-    return FileResponse(STATIC_DIR/"home.html")
\ No newline at end of file
+    return page("home.html")
\ No newline at end of file
@@ -0,0 +1,36 @@
+import os
+import anyio
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import FileResponse, RedirectResponse, Response
+from app.core.images import FORMATS, ImageUnavailable, derivatives, negotiate_format
+
+router = APIRouter(tags=["images"])
+
+# 衍生檔 URL 不帶版本（原圖換掉時內容會變），給一天快取 + ETag 重新驗證
+CACHE_CONTROL = "public, max-age=86400"
+
+# 商品圖縮圖：/img/<寬度>/<原圖在 /image 底下的路徑>，格式依 Accept（AVIF > WebP > JPEG）
+@router.get("/img/{width}/{path:path}")
+async def get_image_derivative(width: int, path: str, request: Request):
+    if width <= 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    fmt = negotiate_format(request.headers.get("accept", ""))
+    try:
+        target = await derivatives.get(path, width, fmt)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="圖片不存在")
+    except ImageUnavailable:
+        # 沒裝 Pillow / 原圖無法處理 → 直接給原圖
+        return RedirectResponse(url=f"/image/{path}", status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+    response = FileResponse(
+        target,
+        stat_result=await anyio.to_thread.run_sync(os.stat, target),  # 先 stat 才有 ETag 可以比對
+        media_type=FORMATS[fmt][2],
+        headers={"Cache-Control": CACHE_CONTROL, "Vary": "Accept"},
+    )
+    if request.headers.get("if-none-match") == response.headers["etag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={
+            "ETag": response.headers["etag"], "Cache-Control": CACHE_CONTROL, "Vary": "Accept",
+        })
+    return response
@@ -1,47 +1,88 @@
 from fastapi import APIRouter, Depends, Request
-from fastapi.responses import JSONResponse, FileResponse
-from app.core.paths import STATIC_DIR
-from app.core.db import users_col
-from app.crud import get_user_by_account
-from app.core.security import create_jwt, decode_jwt  # 你自己的 jwt 工具
-from passlib.context import CryptContext
-from app.models import LoginData
+from app.core.responses import ORJSONResponse
+from app.core.pages import page
+from app.api.deps import users_repo, refresh_tokens_repo
+from app.crud import UserRepository, RefreshTokenRepository
+from app.core.security import create_jwt, decode_jwt, verify_password, PasswordHashBusy, ACCESS_TTL  # 你自己的 jwt 工具
+from app.models import LoginData, RefreshTokenRequest
 router = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def _access_claims(user: dict) -> dict:
+    return {"account": user["account"], "username": user["username"], "level": int(user["level"])}
 
 
 
 @router.get("/login")
 async def get_login_page():
-    return FileResponse(STATIC_DIR /"User"/"login.html")
+    return page("User", "login.html")
 
 @router.post("/api/login")
-async def login(data: LoginData, users = Depends(users_col)):
-    user = await get_user_by_account(users, data.account)
+async def login(
+    data: LoginData,
+    users: UserRepository = Depends(users_repo),
+    tokens: RefreshTokenRepository = Depends(refresh_tokens_repo),
+):
+    user = await users.get_by_account(data.account)
     if not user:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=400,
             content={"error": "帳號或密碼錯誤"}
         )
 
     # 3. 密碼比對（DB 裡 password 要是 bcrypt hash）
-    if not pwd_context.verify(data.password, user.get("password", "")):
-        return JSONResponse(
+    try:
+        ok = await verify_password(data.password, user.get("password", ""))
+    except PasswordHashBusy:
+        return ORJSONResponse(
+            status_code=429,
+            content={"error": "系統忙碌中，請稍後再試"},
+            headers={"Retry-After": "1"},
+        )
+    if not ok:
+        return ORJSONResponse(
             status_code=400,
             content={"error": "帳號或密碼錯誤"}
         )
-    payload = {"account": user["account"], "username": user["username"], "level": int(user["level"])}
-    token = create_jwt(payload, expires_in=10)  # 你原本的 10 秒
-    return JSONResponse(content={"message": "登入成功", "token": token})
+    token = create_jwt(_access_claims(user))  # 有效期 settings.ACCESS_TOKEN_EXPIRE_MINUTES
+    refresh_token = await tokens.create(account=user["account"])
+    return ORJSONResponse(content={
+        "message": "登入成功", "token": token, "refresh_token": refresh_token, "expires_in": ACCESS_TTL,
+    })
+
+# 用 refresh token 換新的 access token（不跑 bcrypt）；refresh token 同時輪替
+@router.post("/api/token/refresh")
+async def refresh_access_token(
+    body: RefreshTokenRequest,
+    users: UserRepository = Depends(users_repo),
+    tokens: RefreshTokenRepository = Depends(refresh_tokens_repo),
+):
+    rotated = await tokens.rotate(body.refresh_token)
+    if rotated is None:
+        return ORJSONResponse(status_code=401, content={"error": "請重新登入"})
+    account, refresh_token = rotated
+
+    # 等級、停用狀態以 DB 為準
+    user = await users.get_principal(account)
+    if not user or user.get("is_active") is False:
+        await tokens.revoke(refresh_token)
+        return ORJSONResponse(status_code=401, content={"error": "請重新登入"})
+
+    token = create_jwt(_access_claims(user))
+    return ORJSONResponse(content={"token": token, "refresh_token": refresh_token, "expires_in": ACCESS_TTL})
+
+# 登出：撤銷這次登入的整串 refresh token
+@router.post("/api/token/revoke")
+async def revoke_token(body: RefreshTokenRequest, tokens: RefreshTokenRepository = Depends(refresh_tokens_repo)):
+    await tokens.revoke(body.refresh_token)
+    return ORJSONResponse(content={"message": "已登出"})
 
 @router.get("/api/user")
 async def get_user(request: Request):
     auth = request.headers.get("Authorization") or ""
     if not auth.startswith("Bearer "):
-        return JSONResponse(content={"username": None})
+        return ORJSONResponse(content={"username": None})
     token = auth.removeprefix("Bearer ").strip()
     data = decode_jwt(token)
     if not data:
-        return JSONResponse(content={"username": None})
-    return JSONResponse(content={"username": data["username"], "level": data["level"]})
+        return ORJSONResponse(content={"username": None})
+    return ORJSONResponse(content={"username": data["username"], "level": data["level"]})
@@ -0,0 +1,23 @@
+import hmac
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import Response
+from app.api.deps import get_bearer_token
+from app.core import metrics
+from app.core.config import settings
+
+router = APIRouter(tags=["metrics"])
+
+# 指標會透露路由、流量與付款結果，不能公開：沒設 METRICS_TOKEN 就當作不存在，有設就要帶對的 bearer token
+async def require_metrics_token(request: Request) -> None:
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    token = await get_bearer_token(request)
+    if not hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+# Prometheus 抓取用（每個 worker 各自的計數；多 worker 時 scrape 每個 worker 或用 sticky target）
+# 付款：ecpay_notify_total{result=recorded|duplicate|bad_mac|mac_error} 是 webhook 收到的通知，
+#       ecpay_inbox_processed_total{outcome=paid|failed|amount_mismatch|...} 是套用到訂單的結果
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_token)])
+async def prometheus_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from app.api.deps import get_current_user, orders_repo
+from app.core.responses import ORJSONResponse
+from app.crud import OrderRepository, decode_order_cursor
+
+router = APIRouter(tags=["orders"])
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# 訂單紀錄：由新到舊，keyset 分頁（ix_account_createdAt_id_desc）
+@router.get("/api/orders")
+async def list_orders(
+    current: dict = Depends(get_current_user),
+    orders_repository: OrderRepository = Depends(orders_repo),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+):
+    try:
+        after = decode_order_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="cursor 格式錯誤")
+
+    orders, next_cursor = await orders_repository.get_page(current["account"], after=after, limit=limit)
+    # createdAt 是 datetime，orjson 直接輸出 ISO 8601，不用先走 jsonable_encoder
+    return ORJSONResponse(content={"orders": orders, "next_cursor": next_cursor})
@@ -1,20 +1,94 @@
-from fastapi import APIRouter, Depends
-from fastapi.responses import FileResponse, JSONResponse
-from app.core.db import products_col
-from app.api.deps import get_jwt_payload_optional
-from app.core.paths import STATIC_DIR
-from app.crud import get_all_products
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
+from app.api.deps import get_jwt_payload_optional, products_repo
+from app.core import etags
+from app.core.pages import page
+from app.core.images import with_srcset
+from app.core.responses import ORJSONResponse, dumps
+from app.crud import (
+    PRODUCT_VIEWS, ProductRepository, decode_product_cursor, decode_search_cursor, encode_search_cursor,
+)
 
 router = APIRouter(tags=["products"])
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
 @router.get("/products")
 async def serve_product_page():
-    return FileResponse(STATIC_DIR/"Product"/"products.html")
+    return page("Product", "products.html")
 
 @router.get("/api/products")
-async def get_product_page(products_collection = Depends(products_col),  payload: dict | None = Depends(get_jwt_payload_optional)):
-    products = await get_all_products(products_collection)
+async def get_product_page(
+    request: Request,
+    products: ProductRepository = Depends(products_repo),
+    payload: dict | None = Depends(get_jwt_payload_optional),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    view: Literal["full", "list"] = "full",
+    fmt: Literal["json", "ndjson"] = Query("json", alias="format"),
+):
     viewer = payload.get("account") if payload else None
-    return JSONResponse(content={
-        "products": products,  "viewer": viewer
-    })
\ No newline at end of file
+
+    # ETag = 目錄版本 + 這次的參數；版本跟快照一起在記憶體，對上就回 304，不讀商品
+    etag = etags.make("catalog", await products.catalog_version(), viewer, limit, cursor, view, fmt)
+    if etags.matches(request.headers.get("if-none-match"), etag):
+        return etags.not_modified(etag)
+    headers = etags.headers(etag)
+
+    # 沒帶任何參數 → 整份目錄，走記憶體快照（已序列化），不再每次掃 collection
+    if limit is None and cursor is None and view == "full" and fmt == "json":
+        body = await products.render_catalog(viewer)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    try:
+        after = decode_product_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="cursor 格式錯誤")
+    projection = PRODUCT_VIEWS[view]
+
+    # NDJSON：一行一個商品，邊讀 cursor 邊送，記憶體不隨商品數成長
+    if fmt == "ndjson":
+        async def lines():
+            async for p in products.stream(after=after, limit=limit, projection=projection):
+                with_srcset(p)
+                yield dumps(p) + b"\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+
+    page_items, next_cursor = await products.get_page(
+        after=after, limit=limit or DEFAULT_PAGE_SIZE, projection=projection,
+    )
+    return ORJSONResponse(content={
+        "products": [with_srcset(p) for p in page_items], "viewer": viewer, "next_cursor": next_cursor
+    }, headers=headers)
+
+# 搜尋：mode=text 全文檢索（name / description，依相關度排序），mode=prefix 商品名稱自動完成
+@router.get("/api/products/search")
+async def search_products(
+    request: Request,
+    products: ProductRepository = Depends(products_repo),
+    q: str = Query(..., min_length=1, max_length=100),
+    mode: Literal["text", "prefix"] = "text",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    view: Literal["full", "list"] = "full",
+):
+    try:
+        offset = decode_search_cursor(cursor) if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="cursor 格式錯誤")
+
+    # 結果只跟目錄內容有關（不含 viewer）
+    etag = etags.make("search", await products.catalog_version(), q, mode, limit, offset, view)
+    if etags.matches(request.headers.get("if-none-match"), etag):
+        return etags.not_modified(etag)
+
+    page_items, total = await products.search(q, mode=mode, offset=offset, limit=limit)
+    hidden = [k for k, v in PRODUCT_VIEWS[view].items() if not v]
+    if hidden:
+        page_items = [{k: v for k, v in p.items() if k not in hidden} for p in page_items]
+    next_cursor = encode_search_cursor(offset + limit) if offset + limit < total else None
+    return ORJSONResponse(content={
+        "products": page_items, "total": total, "next_cursor": next_cursor,
+    }, headers=etags.headers(etag))
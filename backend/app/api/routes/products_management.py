@@ -1,68 +1,66 @@
 from fastapi import APIRouter, Depends,  HTTPException , status
-from fastapi.responses import FileResponse, JSONResponse
-from app.core.db import products_col
-from app.api.deps import  require_level_api, get_jwt_payload
-from app.core.paths import STATIC_DIR
-from app.crud import get_all_products , delete_product_by_name , update_product , create_product, product_name_exists, get_product_by_name
+from fastapi.responses import Response
+from app.core.responses import ORJSONResponse
+from app.api.deps import  require_level_api, get_jwt_payload, products_repo
+from app.core.pages import page
+from app.crud import ProductRepository
 from app.models import ProductUpdate, ProductBuild
 router = APIRouter(tags=["products_management"])
 
 @router.get("/products_management")
 async def serve_product_management_page():
-    return FileResponse(STATIC_DIR/"Product"/"products_management.html")
+    return page("Product", "products_management.html")
 
 @router.get("/api/products_management", dependencies=[Depends(require_level_api([2,3]))])
-async def get_product_management_page(products_collection = Depends(products_col),  payload: dict | None = Depends(get_jwt_payload)):
-    products = await get_all_products(products_collection)
+async def get_product_management_page(products: ProductRepository = Depends(products_repo),  payload: dict | None = Depends(get_jwt_payload)):
     viewer = payload.get("account")
-    return JSONResponse(content={
-        "products": products, "viewer": viewer
-    })
+    body = await products.render_catalog(viewer)
+    return Response(content=body, media_type="application/json")
 
 @router.delete("/api/products_delete/{name}", dependencies=[Depends(require_level_api([3]))])
 async def delete_product(
     name: str,
-    products_collection = Depends(products_col),
+    products: ProductRepository = Depends(products_repo),
 ):
-    await delete_product_by_name(products_collection, name)
-    return JSONResponse(status_code=200, content={"message": "刪除成功"})
+    await products.delete_by_name(name)
+    return ORJSONResponse(status_code=200, content={"message": "刪除成功"})
     
 @router.get("/products_edit/{name}")
 async def serve_product_edit_page(name: str):
-    return FileResponse(STATIC_DIR/"Product"/"products_edit.html")
+    return page("Product", "products_edit.html")
 
 @router.get("/api/products_edit/{name}", dependencies=[Depends(require_level_api([3]))])
-async def edit_product(name: str,products_collection = Depends(products_col)):
-    product = await get_product_by_name(products_collection, name)
-    return JSONResponse(content={"products": product})
+async def edit_product(name: str, products: ProductRepository = Depends(products_repo)):
+    product = await products.get_by_name(name)
+    return ORJSONResponse(content={"products": product})
 
 
 @router.patch("/api/products_edit/{name}", dependencies=[Depends(require_level_api([3]))])
 async def update_product(
     name: str,
     body: ProductUpdate,
-    products_collection = Depends(products_col),
+    products: ProductRepository = Depends(products_repo),
 ):
     # 組更新欄位：只保留不是 None 的
     update_fields = {
         k: v for k, v in body.model_dump().items() if v is not None
     }
 
-    await update_product(products_collection, name, update_fields)
+    await products.update(name, update_fields)
 
     return {"message": "編輯成功"}
 
 
 @router.get("/products_build")
 async def serve_product_build_page():
-    return FileResponse(STATIC_DIR/"Product"/"products_build.html")   
+    return page("Product", "products_build.html")   
 
 
 
 @router.post("/api/products_build", dependencies=[Depends(require_level_api([2, 3]))])
 async def register_product(
     body: ProductBuild,
-    products_collection = Depends(products_col),
+    products: ProductRepository = Depends(products_repo),
 ):
     name = body.name.strip()
     img = body.img.strip()
@@ -77,15 +75,14 @@ async def register_product(
         )
 
     # 2️⃣ 呼叫 CRUD 檢查名稱是否已存在
-    if await product_name_exists(products_collection, name):
+    if await products.name_exists(name):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="商品名稱已存在，請重新輸入",
         )
 
     # 3️⃣ 呼叫 CRUD 建立商品
-    await create_product(
-        products_collection,
+    await products.create(
         name=name,
         price=price,
         img=img,
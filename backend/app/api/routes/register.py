@@ -1,36 +1,48 @@
 # register.py
 from fastapi import APIRouter, Depends
-from fastapi.responses import FileResponse, JSONResponse
-from app.core.db import users_col
-from app.crud import user_exists, create_user
-from app.core.paths import STATIC_DIR
+from pymongo.errors import DuplicateKeyError
+from app.core.responses import ORJSONResponse
+from app.api.deps import users_repo
+from app.crud import UserRepository
+from app.core.pages import page
+from app.core.security import PasswordHashBusy
 from app.models import RegisterData
 router = APIRouter(tags=["register"])
 
+# 唯一欄位（ux_email / ux_account / ux_phone）→ 撞到時的訊息，依序檢查
+DUPLICATE_ERRORS = {
+    "email": "Email已存在，請重新輸入",
+    "account": "帳號已存在，請重新輸入",
+    "phone": "電話已存在，請重新輸入",
+}
+
 
 
 @router.get("/build")
 async def get_build_page():
-    return FileResponse(STATIC_DIR/"User"/"build.html")
+    return page("User", "build.html")
 
 @router.post("/api/register")
-async def register_user(body: RegisterData, users = Depends(users_col)):
+async def register_user(body: RegisterData, users: UserRepository = Depends(users_repo)):
     # 唯一性檢查（任何一個撞到就回 400）
-    if await user_exists(users, {"email": body.email}):
-        return JSONResponse(status_code=400, content={"error": "Email已存在，請重新輸入"})
-    if await user_exists(users, {"account": body.account}):
-        return JSONResponse(status_code=400, content={"error": "帳號已存在，請重新輸入"})
-    if await user_exists(users, {"phone": body.phone}):
-        return JSONResponse(status_code=400, content={"error": "電話已存在，請重新輸入"})
+    for field, message in DUPLICATE_ERRORS.items():
+        if await users.exists({field: getattr(body, field)}):
+            return ORJSONResponse(status_code=400, content={"error": message})
 
     # 建立使用者（在 CRUD 內負責雜湊密碼）
-    await create_user(
-        users,
-        account=body.account,
-        username=body.username,
-        password=body.password,
-        phone=body.phone,
-        email=body.email,
-        level=0,
-    )
-    return JSONResponse(status_code=201, content={"message": "註冊成功"})
+    try:
+        await users.create(
+            account=body.account,
+            username=body.username,
+            password=body.password,
+            phone=body.phone,
+            email=body.email,
+            level=0,
+        )
+    except DuplicateKeyError as e:
+        # 兩個請求同時用同一個帳號 / Email / 電話註冊：上面的檢查都通過，由 unique index 擋下晚到的那個
+        field = next(iter((e.details or {}).get("keyPattern") or {}), "account")
+        return ORJSONResponse(status_code=400, content={"error": DUPLICATE_ERRORS.get(field, DUPLICATE_ERRORS["account"])})
+    except PasswordHashBusy:
+        return ORJSONResponse(status_code=429, content={"error": "系統忙碌中，請稍後再試"}, headers={"Retry-After": "1"})
+    return ORJSONResponse(status_code=201, content={"message": "註冊成功"})
@@ -1,9 +1,8 @@
-from fastapi.responses import FileResponse
 from fastapi import APIRouter
-from app.core.paths import STATIC_DIR
+from app.core.pages import page
 
 router = APIRouter(tags=["story"])
 
 @router.get("/story")
 async def story():
-    return FileResponse(STATIC_DIR/"story.html")
\ No newline at end of file
+    return page("story.html")
\ No newline at end of file
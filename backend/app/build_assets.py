@@ -0,0 +1,104 @@
+import gzip, hashlib, json, logging, os, re, shutil
+from pathlib import Path
+from app.core.assets import COMPRESSIBLE, HASH_LENGTH
+from app.core.paths import DIST_DIR, IMAGE_DIR, STATIC_DIR
+
+try:  # brotli 已列在依賴裡；沒裝的開發環境就只產 gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("build_assets")
+
+# URL 前綴 → 原始目錄
+ROOTS = {"static": STATIC_DIR, "image": IMAGE_DIR}
+# 這些檔案裡的 /static/...、/image/... 參照會改寫成指紋 URL
+REWRITE = {".css", ".js", ".mjs", ".html"}
+# 出現在引號或 url( 後面的站內資源路徑
+_REF = re.compile(r"""(?<=["'(])/(?:static|image)/[^"'()\s?#]+""")
+
+
+def _link_or_copy(src: Path, dst: Path):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _compress(path: Path, data: bytes):
+    # 壓縮後沒有明顯變小就不產生變體
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data) * 0.95:
+        path.with_name(path.name + ".gz").write_bytes(gz)
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data) * 0.95:
+            path.with_name(path.name + ".br").write_bytes(br)
+
+
+class Builder:
+    """
+    每個檔案：改寫裡面的參照（被參照的檔案先處理，所以內容 hash 會跟著變）→
+    寫出 <名稱>.<hash>.<副檔名> 與原檔名兩份 → 文字檔再產生 .gz / .br。
+    """
+
+    def __init__(self, out: Path):
+        self.out = out
+        self.manifest = {}
+        self._visiting = set()
+
+    def rewrite(self, text: str) -> str:
+        return _REF.sub(lambda m: self.asset(m.group(0)), text)
+
+    def asset(self, url: str) -> str:
+        if url in self.manifest:
+            return self.manifest[url]
+        kind, rel = url[1:].split("/", 1)
+        src = ROOTS[kind] / rel
+        if not src.is_file() or url in self._visiting:
+            return url  # 不存在（例如 JS 裡組出來的路徑）或循環參照就保留原樣
+        self._visiting.add(url)
+
+        dst = self.out / kind / rel
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        rewrite = src.suffix in REWRITE
+        data = self.rewrite(src.read_text(encoding="utf-8")).encode("utf-8") if rewrite else src.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        hashed = dst.with_name(f"{src.stem}.{digest}{src.suffix}")
+        if rewrite:
+            dst.write_bytes(data)
+            hashed.write_bytes(data)
+        else:
+            _link_or_copy(src, dst)
+            _link_or_copy(src, hashed)
+        if src.suffix in COMPRESSIBLE:
+            _compress(dst, data)
+            _compress(hashed, data)
+
+        self._visiting.discard(url)
+        self.manifest[url] = f"/{kind}/{hashed.relative_to(self.out / kind).as_posix()}"
+        return self.manifest[url]
+
+    def build(self):
+        for kind, root in ROOTS.items():
+            for src in sorted(root.rglob("*")):
+                if src.is_file():
+                    self.asset(f"/{kind}/{src.relative_to(root).as_posix()}")
+        (self.out / "manifest.json").write_text(
+            json.dumps(self.manifest, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8",
+        )
+
+
+def main():
+    # 先建到暫存目錄，完成後再換上去，避免服務中的 app 讀到一半的結果
+    tmp = DIST_DIR.with_name(DIST_DIR.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    builder = Builder(tmp)
+    builder.build()
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    tmp.rename(DIST_DIR)
+    logger.info("Built %s asset(s) into %s (brotli=%s).", len(builder.manifest), DIST_DIR, brotli is not None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# coding: utf-8
+"""
+ECPay 後台 API（查單、關帳退刷、對帳下載…）的 async 版本。
+參數組裝與 CheckMacValue 沿用 ECPayPaymentSdk 的 prepare_* 方法，這裡只負責送出：
+共用 keep-alive 連線池、每次呼叫都有逾時、查詢類 API 失敗時退避重試、限制同時送出的請求數。
+"""
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qsl
+
+import httpx
+
+logger = logging.getLogger("ecpay")
+
+# 可以安全重試的錯誤：連不上 / 逾時 / ECPay 5xx
+_RETRYABLE_STATUS = {502, 503, 504}
+
+
+class AsyncECPayClient:
+
+    def __init__(self, sdk, *, timeout=10.0, max_connections=10,
+                 max_concurrency=10, retries=2, backoff=0.2, transport=None):
+        self.sdk = sdk
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+            transport=transport,  # 測試時可換成本機 stand-in server 或 httpx.MockTransport
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def send_post(self, url, params, idempotent=True):
+        """送出表單；idempotent=False（例如關帳退刷）只送一次，不重試。"""
+        attempts = 1 + (self.retries if idempotent else 0)
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            try:
+                async with self._semaphore:
+                    response = await self._client.post(url, data=params)
+                if response.status_code not in _RETRYABLE_STATUS:
+                    return response
+                if last:
+                    response.raise_for_status()
+                logger.warning("[ECPAY] %s -> HTTP %s, retry %s/%s",
+                               url, response.status_code, attempt + 1, self.retries)
+            except httpx.TransportError as e:
+                if last:
+                    raise
+                logger.warning("[ECPAY] %s -> %r, retry %s/%s", url, e, attempt + 1, self.retries)
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    # ---- 各 API：跟 ECPayPaymentSdk 同名、同回傳格式 ----
+    async def order_search(self, action_url=None, client_parameters={}):
+        params = self.sdk.prepare_order_search(client_parameters)
+        response = await self.send_post(action_url or self.sdk.ORDER_SEARCH_URL, params)
+        return self.sdk.parse_order_search(response.text)
+
+    async def order_search_period(self, action_url=None, client_parameters={}):
+        params = self.sdk.prepare_order_search_period(client_parameters)
+        response = await self.send_post(action_url or self.sdk.ORDER_SEARCH_PERIODIC_URL, params)
+        return json.loads(response.text)
+
+    async def credit_do_action(self, action_url=None, client_parameters={}):
+        params = self.sdk.prepare_credit_do_action(client_parameters)
+        response = await self.send_post(action_url or self.sdk.CREDIT_DO_ACTION_URL, params, idempotent=False)
+        return dict(parse_qsl(response.text, keep_blank_values=True))
+
+    async def download_merchant_balance(self, action_url=None, client_parameters={}):
+        params = self.sdk.prepare_download_merchant_balance(client_parameters)
+        response = await self.send_post(action_url or self.sdk.DOWNLOAD_MERCHANT_BALANCE_URL, params)
+        return response.content.decode('big5', errors='replace')
+
+    async def search_single_transaction(self, action_url=None, client_parameters={}):
+        params = self.sdk.prepare_search_single_transaction(client_parameters)
+        response = await self.send_post(action_url or self.sdk.SEARCH_SINGLE_TRANSACTION_URL, params)
+        return json.loads(response.text)
+
+    async def download_disbursement_balance(self, action_url=None, client_parameters={}):
+        params = self.sdk.prepare_download_disbursement_balance(client_parameters)
+        response = await self.send_post(action_url or self.sdk.DOWNLOAD_DISBURSEMENT_BALANCE_URL, params)
+        return response.content.decode('big5', errors='replace')
@@ -0,0 +1,88 @@
+# coding: utf-8
+"""
+CheckMacValue 簽章引擎（送單簽章 + 付款通知驗章）。
+
+規則跟 ECPay 文件一致：依 key（不分大小寫）排序 → HashKey=..&k=v&..&HashIV=..
+→ quote_plus（safe='-_.!*()'）→ 轉小寫 → SHA256 / MD5 → 轉大寫。
+URL 編碼與轉小寫都是逐字元處理，所以可以拆段算好再串接：
+HashKey / HashIV 的前後綴只算一次，常見的 key 與值也會快取編碼結果。
+"""
+import hashlib
+import hmac
+from functools import lru_cache
+from urllib.parse import quote_plus
+
+_SAFE = '-_.!*()'
+_EQ = '%3d'   # quote_plus('=').lower()
+_AMP = '%26'  # quote_plus('&').lower()
+
+# 付款通知裡不參與簽章的欄位（測試環境多餘 & 一定排除）
+NOTIFY_EXCLUDE = frozenset({
+    "CheckMacValue",
+    "card4no", "card6no", "gwsr", "auth_code", "eci",
+    "stage", "staed", "stast",
+})
+
+
+@lru_cache(maxsize=4096)
+def _encode(text):
+    return quote_plus(text, safe=_SAFE).lower()
+
+
+class CheckMacSigner:
+
+    def __init__(self, hash_key, hash_iv):
+        self.hash_key = hash_key
+        self.hash_iv = hash_iv
+        self._prefix = _encode(f"HashKey={hash_key}&")
+        self._suffix = _encode(f"HashIV={hash_iv}")
+        # 同一種表單（例如結帳）的欄位順序每次都一樣：以原始 key 順序為 key 快取排序結果
+        self._orders = {}
+
+    def _sorted_keys(self, keys):
+        order = self._orders.get(keys)
+        if order is None:
+            order = tuple(sorted(keys, key=str.lower))
+            if len(self._orders) < 256:
+                self._orders[keys] = order
+        return order
+
+    def _digest(self, values, encrypt_type):
+        parts = [self._prefix]
+        for k in self._sorted_keys(tuple(values)):
+            v = values[k]
+            parts.append(_encode(k))
+            parts.append(_EQ)
+            parts.append(_encode(v) if len(v) <= 64 else quote_plus(v, safe=_SAFE).lower())
+            parts.append(_AMP)
+        parts.append(self._suffix)
+        data = ''.join(parts).encode('ascii')
+        h = hashlib.sha256 if encrypt_type == 1 else hashlib.md5
+        return h(data).hexdigest().upper()
+
+    def sign(self, params, merchant_id):
+        """送單用：去掉 CheckMacValue、MerchantID 以 merchant_id 為準，None 視為空字串。"""
+        values = {k: '' if v is None else str(v) for k, v in params.items() if k != 'CheckMacValue'}
+        values['MerchantID'] = '' if merchant_id is None else str(merchant_id)
+        encrypt_type = params['EncryptType'] if 'EncryptType' in params else 1
+        return self._digest(values, int(encrypt_type))
+
+    def sign_notify(self, form):
+        """付款通知用：排除黑名單欄位、有 TradeAmt 時不算 amount、空值欄位不參與。"""
+        drop_amount = 'TradeAmt' in form
+        values = {}
+        for k, v in form.items():
+            if k in NOTIFY_EXCLUDE or (drop_amount and k == 'amount') or v is None:
+                continue
+            v = str(v)
+            if v:
+                values[k] = v
+        return self._digest(values, int(values.get('EncryptType', 1)))
+
+    def verify_notify(self, form):
+        given = str(form.get('CheckMacValue', ''))
+        return hmac.compare_digest(self.sign_notify(form).encode(), given.encode('utf-8'))
+
+    def verify_notify_many(self, forms):
+        """批次驗章（例如重放一批歷史通知）；回傳每一筆是否通過。"""
+        return [self.verify_notify(form) for form in forms]
@@ -1,15 +1,11 @@
 # coding: utf-8
 import collections
-import hashlib
-import copy
 import requests
 import json
-import pprint
 from decimal import Decimal
-from urllib.parse import quote_plus, parse_qsl, parse_qs
-import copy, collections, hashlib
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, parse_qsl
 import logging
+from app.core.ECpay.ECpay_mac import CheckMacSigner
 """
 付款方式
 """
@@ -213,9 +209,19 @@ UnionPay = {
     'Hidden': 2,  # 不可使用銀聯卡, 綠界會將交易頁面隱藏銀聯選項
 }
 
+# 同步版本也共用 keep-alive 連線，並且一定要有逾時（連線, 讀取）秒數
+_session = requests.Session()
+SEND_POST_TIMEOUT = (5, 30)
+
+
+# CreateOrder 編譯後的參數表：預設值樣板 + 必填檢查 (key, 是否字串, 長度上限) + 可省略欄位 (key, 是否字串)
+OrderSchema = collections.namedtuple('OrderSchema', ['template', 'required', 'optional'])
+
+
 class BasePayment(object):
 
-    def merge(self, x, y):
+    @staticmethod
+    def merge(x, y):
         """
         Given two dicts, merge them into a new dict as a shallow copy.
         """
@@ -241,7 +247,8 @@ class BasePayment(object):
                         raise Exception('parameter %s is required.' % k)
 
     # 先用 required.dict 設定預設值並產生新 new.required.dict
-    def create_default_dict(self, parameters):
+    @staticmethod
+    def create_default_dict(parameters):
         default_dict = dict()
         for k, v in parameters.items():
             if v['type'] is str:
@@ -270,85 +277,34 @@ class BasePayment(object):
                     if parameters.get(k) < 0:
                         del parameters[k]
 
+    @property
+    def mac_signer(self):
+        # HashKey / HashIV 在 ECPayPaymentSdk.__init__ 設定；換 key 時重建
+        signer = self.__dict__.get('_mac_signer')
+        if signer is None or signer.hash_key != self.HashKey or signer.hash_iv != self.HashIV:
+            signer = self._mac_signer = CheckMacSigner(self.HashKey, self.HashIV)
+        return signer
+
     def generate_check_value(self, params: dict) -> str:
-        _params = copy.deepcopy(params)
-        _params.pop('CheckMacValue', None)
         # 送單時 → 覆寫 MerchantID
-        _params['MerchantID'] = self.MerchantID
-
-        ordered = collections.OrderedDict(
-            sorted(_params.items(), key=lambda kv: kv[0].lower())
-        )
-
-        raw = f"HashKey={self.HashKey}&"
-        raw += ''.join([f"{k}={'' if v is None else str(v)}&" for k, v in ordered.items()])
-        raw += f"HashIV={self.HashIV}"
-
-        encoded = quote_plus(raw, safe='-_.!*()').lower()
-        et = int(_params.get('EncryptType', 1))
-        if et == 1:
-            return hashlib.sha256(encoded.encode('utf-8')).hexdigest().upper()
-        else:
-            return hashlib.md5(encoded.encode('utf-8')).hexdigest().upper()
-
-
+        return self.mac_signer.sign(params, self.MerchantID)
 
     def generate_check_value_for_notify(self, params: dict) -> str:
-        import copy, collections, hashlib
-        from urllib.parse import quote_plus
-
-        _p = copy.deepcopy(params)
-
-        # 1) 黑名單（測試環境多餘 & 一定排除）
-        EXCLUDE_ALWAYS = {
-            "CheckMacValue",
-            "card4no", "card6no", "gwsr", "auth_code", "eci",
-            "stage", "staed", "stast",
-        }
-        for k in list(_p.keys()):
-            if k in EXCLUDE_ALWAYS:
-                _p.pop(k, None)
-
-        # 2) 金額欄位規則：同時有 TradeAmt 與 amount → 僅保留 TradeAmt
-        if "TradeAmt" in _p and "amount" in _p:
-            _p.pop("amount", None)
-
-        # 3) ⚠️ 重要：剔除空值欄位（None 或 ''）
-        for k, v in list(_p.items()):
-            if v is None or str(v) == "":
-                _p.pop(k, None)
-
-        # 4) Debug：看看參與簽章的最終欄位
-        logger.debug("[ECPAY] notify params for sign = %s", list(_p.keys()))
-
-
-
-        # 5) 依 key 名（不分大小寫）排序
-        ordered = collections.OrderedDict(sorted(_p.items(), key=lambda kv: kv[0].lower()))
-
-        # 6) 串接（值統一用字串）
-        raw = f"HashKey={self.HashKey}&" + \
-            "".join(f"{k}={str(v)}&" for k, v in ordered.items()) + \
-            f"HashIV={self.HashIV}"
-
-        logger.debug("[ECPAY] raw for sign = %s", raw)
-
-        encoded = quote_plus(raw, safe='-_.!*()').lower()
-
-        logger.debug("[ECPAY] encoded for sign = %s", encoded)
-
-        et = int(_p.get("EncryptType", 1))
-        h = hashlib.sha256 if et == 1 else hashlib.md5
-        return h(encoded.encode("utf-8")).hexdigest().upper()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[ECPAY] notify params for sign = %s", list(params.keys()))
+        return self.mac_signer.sign_notify(params)
 
     def verify_notify_mac(self, form: dict) -> bool:
-        calc = self.generate_check_value_for_notify(form)
-        given = str(form.get("CheckMacValue", ""))
-        ok = (calc == given)
+        ok = self.mac_signer.verify_notify(form)
         if not ok:
-            logger.error("[ECPAY] BAD_MAC_VERIFY given=%s calc=%s", given, calc)
+            logger.error("[ECPAY] BAD_MAC_VERIFY given=%s calc=%s",
+                         form.get("CheckMacValue", ""), self.generate_check_value_for_notify(form))
         return ok
 
+    def verify_notify_macs(self, forms) -> list:
+        """批次驗章（重放歷史通知用）"""
+        return self.mac_signer.verify_notify_many(forms)
+
     def integrate_parameter(self, parameters, patterns):
         # 更新 MerchantID
         parameters['MerchantID'] = self.MerchantID
@@ -361,7 +317,7 @@ class BasePayment(object):
         return parameters
 
     def send_post(self, url, params):
-        response = requests.post(url, data=params)
+        response = _session.post(url, data=params, timeout=SEND_POST_TIMEOUT)
         return response
 
 
@@ -484,56 +440,139 @@ class CreateOrder(BasePayment):
         "InvType": {'type': str, 'required': True, 'max': 2},
     }
 
-    def create_order(self, client_parameters):
-        self.__check_pattern = []
-        # 先用 required.dict 設定預設值並產生新 new.required.dict
-        default_parameters = dict()
-        default_parameters = self.create_default_dict(
-            self.__ORDER_REQUIRED_PARAMETERS)
-        self.__check_pattern.append(self.__ORDER_REQUIRED_PARAMETERS)
+    # 依 (ChoosePayment, 信用卡三擇一, 是否開發票) 編譯好的 schema，同一組合只編譯一次
+    __compiled_schemas = {}
 
-        # 看看 client.dict 付款方式
-        # 有的話 merge.dict 合併 payment.method.dict
-        # 使用 ALL 或 ATM 付款方式
-        choose_payment = client_parameters.get('ChoosePayment')
-        if choose_payment == ChoosePayment['ALL'] or \
-                choose_payment == ChoosePayment['ATM']:
-            payment_extend_parameters = self.create_default_dict(
-                self.__ATM_EXTEND_PARAMETERS)
-            self.__check_pattern.append(self.__ATM_EXTEND_PARAMETERS)
-            # 合併
-            default_parameters = super().merge(
-                default_parameters, payment_extend_parameters)
+    @classmethod
+    def compile_order_schema(cls, choose_payment, credit_option=None, invoice=False):
+        key = (choose_payment, credit_option, invoice)
+        schema = cls.__compiled_schemas.get(key)
+        if schema is not None:
+            return schema
 
+        patterns = [cls.__ORDER_REQUIRED_PARAMETERS]
+        # 使用 ALL 或 ATM 付款方式
+        if choose_payment in (ChoosePayment['ALL'], ChoosePayment['ATM']):
+            patterns.append(cls.__ATM_EXTEND_PARAMETERS)
         # 使用 ALL 或 CVS 或 BARCODE 付款方式
-        if choose_payment == ChoosePayment['ALL'] or \
-                choose_payment == ChoosePayment['CVS'] or \
-                choose_payment == ChoosePayment['BARCODE']:
-            payment_extend_parameters = self.create_default_dict(
-                self.__CVS_BARCODE_EXTEND_PARAMETERS)
-            self.__check_pattern.append(self.__CVS_BARCODE_EXTEND_PARAMETERS)
-            # 合併
-            default_parameters = super().merge(
-                default_parameters, payment_extend_parameters)
-
+        if choose_payment in (ChoosePayment['ALL'], ChoosePayment['CVS'], ChoosePayment['BARCODE']):
+            patterns.append(cls.__CVS_BARCODE_EXTEND_PARAMETERS)
         # 使用 ALL 或 Credit 付款方式
-        if choose_payment == ChoosePayment['ALL'] or \
-                choose_payment == ChoosePayment['Credit']:
-            payment_extend_parameters = self.create_default_dict(
-                self.__CREDIT_EXTEND_PARAMETERS_1)
-            self.__check_pattern.append(self.__CREDIT_EXTEND_PARAMETERS_1)
-            # 合併
-            default_parameters = super().merge(
-                default_parameters, payment_extend_parameters)
-
+        if choose_payment in (ChoosePayment['ALL'], ChoosePayment['Credit']):
+            patterns.append(cls.__CREDIT_EXTEND_PARAMETERS_1)
         # 使用 Credit 付款方式
         if choose_payment == ChoosePayment['Credit']:
-            payment_extend_parameters = self.create_default_dict(
-                self.__CREDIT_EXTEND_PARAMETERS_2)
-            self.__check_pattern.append(self.__CREDIT_EXTEND_PARAMETERS_2)
-            # 合併
-            default_parameters = super().merge(
-                default_parameters, payment_extend_parameters)
+            patterns.append(cls.__CREDIT_EXTEND_PARAMETERS_2)
+        # 一次付清 / 分期 / 定期定額（三擇一）
+        if credit_option == 'Redeem':
+            patterns.append(cls.__CREDIT_EXTEND_PARAMETERS_3)
+        elif credit_option == 'Installment':
+            patterns.append(cls.__CREDIT_EXTEND_PARAMETERS_4)
+        elif credit_option == 'Period':
+            patterns.append(cls.__CREDIT_EXTEND_PARAMETERS_5)
+        # 電子發票
+        if invoice:
+            patterns.append(cls.__INVOICE_EXTEND_PARAMETERS)
+
+        # 預設值樣板：跟原本逐一 create_default_dict + merge 的 key 順序、值完全相同
+        template = dict()
+        for pattern in patterns:
+            template = cls.merge(template, cls.create_default_dict(pattern))
+
+        # 攤平成兩張清單，依原本 check_required_parameter / filter_parameter 的走訪順序
+        required, optional, seen_required, seen_optional = [], [], set(), set()
+        for pattern in patterns:
+            for k, v in pattern.items():
+                if v.get('required') and k not in seen_required and v.get('type') in (str, int):
+                    seen_required.add(k)
+                    required.append((k, v.get('type') is str, v.get('max')))
+                elif v.get('required') is False and k not in seen_optional and v.get('type') in (str, int):
+                    seen_optional.add(k)
+                    optional.append((k, v.get('type') is str))
+
+        schema = cls.__compiled_schemas[key] = OrderSchema(template, tuple(required), tuple(optional))
+        return schema
+
+    @staticmethod
+    def credit_option(client_parameters):
+        """信用卡三擇一：一次付清(Redeem) / 分期(Installment) / 定期定額(Period)"""
+        if client_parameters.get('Redeem') or client_parameters.get('UnionPay'):
+            return 'Redeem'
+        if client_parameters.get('CreditInstallment'):
+            return 'Installment'
+        if client_parameters.get('PeriodAmount') or \
+                client_parameters.get('PeriodType') or \
+                client_parameters.get('Frequency') or \
+                client_parameters.get('ExecTimes') or \
+                client_parameters.get('PeriodReturnURL'):
+            return 'Period'
+        return None
+
+    def check_invoice_parameters(self, client_parameters):
+        # 該參數有值時，請帶固定長度為數字 8 碼
+        customer_identifier = client_parameters.get('CustomerIdentifier')
+        if customer_identifier and (len(customer_identifier) != 8):
+            raise Exception(
+                'CustomerIdentifier have to fill fixed length of 8 digits.')
+        # 若統一編號 CustomerIdentifier 有值時，填入載具參數應出現錯誤訊息(不可以有載具)
+        if customer_identifier and client_parameters.get('CarruerType'):
+            raise Exception(
+                'CarruerType do not fill any value, when CustomerIdentifier have value.')
+        # 統一編號 CustomerIdentifier 有值時，一定要列印，否則會出現錯誤訊息
+        if customer_identifier and (client_parameters.get('Print') == '0'):
+            raise Exception(
+                'Print have to fill "1", when CustomerIdentifier have value.')
+        # 統一編號 CustomerIdentifier 有值時，Donation 要為 '0'，否則會出現錯誤訊息
+        if customer_identifier and (client_parameters.get('Donation') == '1'):
+            raise Exception(
+                'Donation have to fill "0", when CustomerIdentifier have value.')
+
+        # 當列印註記 Print 為 1 (列印)時，則 CustomerName 與 CustomerAddr 參數必須有值
+        print_param = client_parameters.get('Print')
+        if (print_param == '1') and (not client_parameters.get('CustomerName')):
+            raise Exception('CustomerName have to fill value.')
+        if (print_param == '1') and (not client_parameters.get('CustomerAddr')):
+            raise Exception('CustomerAddr have to fill value.')
+        if (print_param == '1') and client_parameters.get('CarruerType'):
+            raise Exception(
+                'CarruerType do not fill any value, when Print is "1".')
+
+        # 當客戶電子信箱 CustomerEmail 為空字串時，則 CustomerPhone 參數必須有值
+        customer_email = client_parameters.get('CustomerEmail')
+        if (not customer_email) and (not client_parameters.get('CustomerPhone')):
+            raise Exception('CustomerPhone have to fill value.')
+
+        # 當客戶手機號碼 CustomerPhone 為空字串時，則 CustomerEmail 參數必須有值
+        customer_email = client_parameters.get('CustomerPhone')
+        if (not customer_email) and (not client_parameters.get('CustomerEmail')):
+            raise Exception('CustomerEmail have to fill value.')
+
+        # 當 Donation 為 '1' 時，Print 要為 '0'，否則會出現錯誤訊息
+        donation_param = client_parameters.get('Donation')
+        if (donation_param == '1') and (print_param == '1'):
+            raise Exception(
+                'Print have to fill "0", when Donation is "1".')
+        # 若捐贈註記 Donation = '1' (捐贈)時，LoveCode 須有值
+        love_code = client_parameters.get('LoveCode')
+        if (donation_param == '1') and (not love_code):
+            raise Exception(
+                'LoveCode have to fill value, when Donation is "1".')
+        if love_code:
+            if len(love_code) < 3 or len(love_code) > 7:
+                raise Exception(
+                    'LoveCode have to fill fixed length of 3~7 digits.')
+
+        urlencode_parameters = ['CustomerName', 'CustomerAddr', 'CustomerEmail',
+                                'InvoiceItemName', 'InvoiceItemWord', 'InvoiceRemark']
+
+        for urlencode_parameter in urlencode_parameters:
+            for k, v in client_parameters.items():
+                if urlencode_parameter == k:
+                    client_parameters.update(
+                        {k: quote_plus(str(v)).lower()})
+
+    def create_order(self, client_parameters):
+        choose_payment = client_parameters.get('ChoosePayment')
 
         # 付款子方式 WebATM 大眾銀行跟永豐銀行已經無法使用
         if client_parameters.get('ChooseSubPayment') == ChooseSubPayment['WebATM']['TACHONG'] or \
@@ -541,119 +580,45 @@ class CreateOrder(BasePayment):
             raise Exception(
                 'ChooseSubPayment is not supported with TACHONG or SINOPAC.')
 
+        credit_option = None
         if choose_payment == ChoosePayment['ALL'] or \
                 choose_payment == ChoosePayment['Credit']:
-            credit_extend_parameters = dict()
-            # 使用 ALL 或 Credit 付款方式: 一次付清(三擇一)
-            if client_parameters.get('Redeem') or \
-                    client_parameters.get('UnionPay'):
-                credit_extend_parameters = self.create_default_dict(
-                    self.__CREDIT_EXTEND_PARAMETERS_3)
-                self.__check_pattern.append(self.__CREDIT_EXTEND_PARAMETERS_3)
-
-            # 使用 ALL 或 Credit 付款方式: 分期付款、圓夢分期付款(三擇一)
-            elif client_parameters.get('CreditInstallment'):
-                credit_extend_parameters = self.create_default_dict(
-                    self.__CREDIT_EXTEND_PARAMETERS_4)
-                self.__check_pattern.append(self.__CREDIT_EXTEND_PARAMETERS_4)
-
-            # 使用 ALL 或 Credit 付款方式: 定期定額(三擇一)
-            elif client_parameters.get('PeriodAmount') or \
-                    client_parameters.get('PeriodType') or \
-                    client_parameters.get('Frequency') or \
-                    client_parameters.get('ExecTimes') or \
-                    client_parameters.get('PeriodReturnURL'):
-                credit_extend_parameters = self.create_default_dict(
-                    self.__CREDIT_EXTEND_PARAMETERS_5)
-                self.__check_pattern.append(self.__CREDIT_EXTEND_PARAMETERS_5)
-            # 合併
-            if credit_extend_parameters:
-                default_parameters = super().merge(
-                    default_parameters, credit_extend_parameters)
+            credit_option = self.credit_option(client_parameters)
 
         # 看看 client.dict 有無 invoice='Y'
-        # 有的話 new.required.dict 合併 invoice.dict
-        if client_parameters.get('InvoiceMark') == 'Y':
-            invoice_parameters = self.create_default_dict(
-                self.__INVOICE_EXTEND_PARAMETERS)
-            self.__check_pattern.append(self.__INVOICE_EXTEND_PARAMETERS)
-            # 合併
-            default_parameters = super().merge(
-                default_parameters, invoice_parameters)
-
-            # 該參數有值時，請帶固定長度為數字 8 碼
-            customer_identifier = client_parameters.get('CustomerIdentifier')
-            if customer_identifier and (len(customer_identifier) != 8):
-                raise Exception(
-                    'CustomerIdentifier have to fill fixed length of 8 digits.')
-            # 若統一編號 CustomerIdentifier 有值時，填入載具參數應出現錯誤訊息(不可以有載具)
-            if customer_identifier and client_parameters.get('CarruerType'):
-                raise Exception(
-                    'CarruerType do not fill any value, when CustomerIdentifier have value.')
-            # 統一編號 CustomerIdentifier 有值時，一定要列印，否則會出現錯誤訊息
-            if customer_identifier and (client_parameters.get('Print') == '0'):
-                raise Exception(
-                    'Print have to fill "1", when CustomerIdentifier have value.')
-            # 統一編號 CustomerIdentifier 有值時，Donation 要為 '0'，否則會出現錯誤訊息
-            if customer_identifier and (client_parameters.get('Donation') == '1'):
-                raise Exception(
-                    'Donation have to fill "0", when CustomerIdentifier have value.')
-
-            # 當列印註記 Print 為 1 (列印)時，則 CustomerName 與 CustomerAddr 參數必須有值
-            print_param = client_parameters.get('Print')
-            if (print_param == '1') and (not client_parameters.get('CustomerName')):
-                raise Exception('CustomerName have to fill value.')
-            if (print_param == '1') and (not client_parameters.get('CustomerAddr')):
-                raise Exception('CustomerAddr have to fill value.')
-            if (print_param == '1') and client_parameters.get('CarruerType'):
-                raise Exception(
-                    'CarruerType do not fill any value, when Print is "1".')
+        invoice = client_parameters.get('InvoiceMark') == 'Y'
+        if invoice:
+            self.check_invoice_parameters(client_parameters)
 
-            # 當客戶電子信箱 CustomerEmail 為空字串時，則 CustomerPhone 參數必須有值
-            customer_email = client_parameters.get('CustomerEmail')
-            if (not customer_email) and (not client_parameters.get('CustomerPhone')):
-                raise Exception('CustomerPhone have to fill value.')
+        schema = self.compile_order_schema(choose_payment, credit_option, invoice)
 
-            # 當客戶手機號碼 CustomerPhone 為空字串時，則 CustomerEmail 參數必須有值
-            customer_email = client_parameters.get('CustomerPhone')
-            if (not customer_email) and (not client_parameters.get('CustomerEmail')):
-                raise Exception('CustomerEmail have to fill value.')
-
-            # 當 Donation 為 '1' 時，Print 要為 '0'，否則會出現錯誤訊息
-            donation_param = client_parameters.get('Donation')
-            if (donation_param == '1') and (print_param == '1'):
-                raise Exception(
-                    'Print have to fill "0", when Donation is "1".')
-            # 若捐贈註記 Donation = '1' (捐贈)時，LoveCode 須有值
-            love_code = client_parameters.get('LoveCode')
-            if (donation_param == '1') and (not love_code):
-                raise Exception(
-                    'LoveCode have to fill value, when Donation is "1".')
-            if love_code:
-                if len(love_code) < 3 or len(love_code) > 7:
-                    raise Exception(
-                        'LoveCode have to fill fixed length of 3~7 digits.')
-
-            urlencode_parameters = ['CustomerName', 'CustomerAddr', 'CustomerEmail',
-                                    'InvoiceItemName', 'InvoiceItemWord', 'InvoiceRemark']
-
-            for urlencode_parameter in urlencode_parameters:
-                for k, v in client_parameters.items():
-                    if urlencode_parameter == k:
-                        client_parameters.update(
-                            {k: quote_plus(str(v)).lower()})
-
-        # 用 new.required.dict 與 client.dict 合併為 merge.dict
-        self.final_merge_parameters = super().merge(
-            default_parameters, client_parameters)
+        # 用預設值樣板與 client.dict 合併為 merge.dict
+        parameters = super().merge(schema.template, client_parameters)
+        parameters['MerchantID'] = self.MerchantID
 
-        # 檢查參數, 並產生 CheckMacValue
-        self.final_merge_parameters = self.integrate_parameter(
-            self.final_merge_parameters,
-            self.__check_pattern)
+        # 檢查必填參數
+        for k, is_str, max_length in schema.required:
+            value = parameters.get(k)
+            if value is None:
+                raise Exception('parameter %s is required.' % k)
+            if is_str:
+                if len(value) == 0:
+                    raise Exception('%s content is required.' % k)
+                elif max_length is not None and len(value) > max_length:
+                    raise Exception('%s max langth is %d.' % (k, max_length))
 
-        # 回傳給 client
-        return self.final_merge_parameters
+        # 將 merge.dict 內的無用參數消除
+        for k, is_str in schema.optional:
+            value = parameters.get(k)
+            if value is None:
+                continue
+            if (len(value) == 0) if is_str else (value < 0):
+                del parameters[k]
+
+        # 產生 CheckMacValue，回傳給 client
+        parameters['CheckMacValue'] = self.generate_check_value(parameters)
+        self.final_merge_parameters = parameters
+        return parameters
 
 
 class OrderSearch(BasePayment):
@@ -666,12 +631,10 @@ class OrderSearch(BasePayment):
         'PlatformID': {'type': str, 'required': False, 'max': 10},
     }
 
-    __url = 'https://payment.ecpay.com.tw/Cashier/QueryTradeInfo/V5'
+    ORDER_SEARCH_URL = 'https://payment.ecpay.com.tw/Cashier/QueryTradeInfo/V5'
 
-    def order_search(self, action_url=__url, client_parameters={}):
+    def prepare_order_search(self, client_parameters):
         self.__check_pattern = []
-        if action_url is None:
-            action_url = self.__url
         # 先用 required.dict 設定預設值並產生新 new.required.dict
         default_parameters = dict()
         default_parameters = self.create_default_dict(
@@ -686,11 +649,18 @@ class OrderSearch(BasePayment):
         self.final_merge_parameters = self.integrate_parameter(
             self.final_merge_parameters,
             self.__check_pattern)
+        return self.final_merge_parameters
 
+    def order_search(self, action_url=ORDER_SEARCH_URL, client_parameters={}):
+        if action_url is None:
+            action_url = self.ORDER_SEARCH_URL
         # 回傳給 client
         response = super().send_post(
-            action_url, self.final_merge_parameters)
-        query = dict(parse_qsl(response.text, keep_blank_values=True))
+            action_url, self.prepare_order_search(client_parameters))
+        return self.parse_order_search(response.text)
+
+    def parse_order_search(self, text):
+        query = dict(parse_qsl(text, keep_blank_values=True))
         if query.get('CheckMacValue') == self.generate_check_value(query):
             query.pop('CheckMacValue')
             return query
@@ -707,12 +677,10 @@ class OrderSearchPeriodic(BasePayment):
         'TimeStamp': {'type': int, 'required': True, },
     }
 
-    __url = 'https://payment.ecpay.com.tw/Cashier/QueryCreditCardPeriodInfo'
+    ORDER_SEARCH_PERIODIC_URL = 'https://payment.ecpay.com.tw/Cashier/QueryCreditCardPeriodInfo'
 
-    def order_search_period(self, action_url=__url, client_parameters={}):
+    def prepare_order_search_period(self, client_parameters):
         self.__check_pattern = []
-        if action_url is None:
-            action_url = self.__url
         # 先用 required.dict 設定預設值並產生新 new.required.dict
         default_parameters = dict()
         default_parameters = self.create_default_dict(
@@ -727,10 +695,14 @@ class OrderSearchPeriodic(BasePayment):
         self.final_merge_parameters = self.integrate_parameter(
             self.final_merge_parameters,
             self.__check_pattern)
+        return self.final_merge_parameters
 
+    def order_search_period(self, action_url=ORDER_SEARCH_PERIODIC_URL, client_parameters={}):
+        if action_url is None:
+            action_url = self.ORDER_SEARCH_PERIODIC_URL
         # 回傳給 client
         response = super().send_post(
-            action_url, self.final_merge_parameters)
+            action_url, self.prepare_order_search_period(client_parameters))
         query = json.loads(response.text)
         return query
 
@@ -747,12 +719,10 @@ class CreditDoAction(BasePayment):
         'PlatformID': {'type': str, 'required': False, 'max': 10},
     }
 
-    __url = 'https://payment.ecpay.com.tw/CreditDetail/DoAction'
+    CREDIT_DO_ACTION_URL = 'https://payment.ecpay.com.tw/CreditDetail/DoAction'
 
-    def credit_do_action(self, action_url=__url, client_parameters={}):
+    def prepare_credit_do_action(self, client_parameters):
         self.__check_pattern = []
-        if action_url is None:
-            action_url = self.__url
         # 先用 required.dict 設定預設值並產生新 new.required.dict
         default_parameters = dict()
         default_parameters = self.create_default_dict(
@@ -767,10 +737,14 @@ class CreditDoAction(BasePayment):
         self.final_merge_parameters = self.integrate_parameter(
             self.final_merge_parameters,
             self.__check_pattern)
+        return self.final_merge_parameters
 
+    def credit_do_action(self, action_url=CREDIT_DO_ACTION_URL, client_parameters={}):
+        if action_url is None:
+            action_url = self.CREDIT_DO_ACTION_URL
         # 回傳給 client
         response = super().send_post(
-            action_url, self.final_merge_parameters)
+            action_url, self.prepare_credit_do_action(client_parameters))
         query = dict(parse_qsl(response.text, keep_blank_values=True))
 
         return query
@@ -791,12 +765,10 @@ class DownloadMerchantBalance(BasePayment):
         'MediaFormated': {'type': str, 'required': True, 'max': 1},
     }
 
-    __url = 'https://vendor.ecpay.com.tw/PaymentMedia/TradeNoAio'
+    DOWNLOAD_MERCHANT_BALANCE_URL = 'https://vendor.ecpay.com.tw/PaymentMedia/TradeNoAio'
 
-    def download_merchant_balance(self, action_url=__url, client_parameters={}):
+    def prepare_download_merchant_balance(self, client_parameters):
         self.__check_pattern = []
-        if action_url is None:
-            action_url = self.__url
         # 先用 required.dict 設定預設值並產生新 new.required.dict
         default_parameters = dict()
         default_parameters = self.create_default_dict(
@@ -812,10 +784,14 @@ class DownloadMerchantBalance(BasePayment):
         self.final_merge_parameters = self.integrate_parameter(
             self.final_merge_parameters,
             self.__check_pattern)
+        return self.final_merge_parameters
 
+    def download_merchant_balance(self, action_url=DOWNLOAD_MERCHANT_BALANCE_URL, client_parameters={}):
+        if action_url is None:
+            action_url = self.DOWNLOAD_MERCHANT_BALANCE_URL
         # 回傳給 client
         response = super().send_post(
-            action_url, self.final_merge_parameters)
+            action_url, self.prepare_download_merchant_balance(client_parameters))
         response.encoding = 'big5'
         return response.text
 
@@ -830,12 +806,10 @@ class SearchSingleTransaction(BasePayment):
         'CreditCheckCode': {'type': int, 'required': True, },
     }
 
-    __url = 'https://payment.ecPay.com.tw/CreditDetail/QueryTrade/V2'
+    SEARCH_SINGLE_TRANSACTION_URL = 'https://payment.ecPay.com.tw/CreditDetail/QueryTrade/V2'
 
-    def search_single_transaction(self, action_url=__url, client_parameters={}):
+    def prepare_search_single_transaction(self, client_parameters):
         self.__check_pattern = []
-        if action_url is None:
-            action_url = self.__url
         # 先用 required.dict 設定預設值並產生新 new.required.dict
         default_parameters = dict()
         default_parameters = self.create_default_dict(
@@ -851,10 +825,14 @@ class SearchSingleTransaction(BasePayment):
         self.final_merge_parameters = self.integrate_parameter(
             self.final_merge_parameters,
             self.__check_pattern)
+        return self.final_merge_parameters
 
+    def search_single_transaction(self, action_url=SEARCH_SINGLE_TRANSACTION_URL, client_parameters={}):
+        if action_url is None:
+            action_url = self.SEARCH_SINGLE_TRANSACTION_URL
         # 回傳給 client
         response = super().send_post(
-            action_url, self.final_merge_parameters)
+            action_url, self.prepare_search_single_transaction(client_parameters))
         query = json.loads(response.text)
 
         return query
@@ -870,12 +848,10 @@ class DownloadDisbursementBalance(BasePayment):
         'EndDate': {'type': str, 'required': True, 'max': 10},
     }
 
-    __url = 'https://payment.ecPay.com.tw/CreditDetail/FundingReconDetail'
+    DOWNLOAD_DISBURSEMENT_BALANCE_URL = 'https://payment.ecPay.com.tw/CreditDetail/FundingReconDetail'
 
-    def download_disbursement_balance(self, action_url=__url, client_parameters={}):
+    def prepare_download_disbursement_balance(self, client_parameters):
         self.__check_pattern = []
-        if action_url is None:
-            action_url = self.__url
         # 先用 required.dict 設定預設值並產生新 new.required.dict
         default_parameters = dict()
         default_parameters = self.create_default_dict(
@@ -891,10 +867,14 @@ class DownloadDisbursementBalance(BasePayment):
         self.final_merge_parameters = self.integrate_parameter(
             self.final_merge_parameters,
             self.__check_pattern)
+        return self.final_merge_parameters
 
+    def download_disbursement_balance(self, action_url=DOWNLOAD_DISBURSEMENT_BALANCE_URL, client_parameters={}):
+        if action_url is None:
+            action_url = self.DOWNLOAD_DISBURSEMENT_BALANCE_URL
         # 回傳給 client
         response = super().send_post(
-            action_url, self.final_merge_parameters)
+            action_url, self.prepare_download_disbursement_balance(client_parameters))
         response.encoding = 'big5'
         return response.text
 
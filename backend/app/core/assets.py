@@ -0,0 +1,93 @@
+"""
+靜態檔案：優先讀 build_assets 產出的 frontend/dist（指紋檔名 + 預壓縮），沒有的再回原始目錄。
+指紋檔名（style.<hash>.css）內容永遠不變 → 一年 immutable；其他檔案每次都要用 ETag 重新驗證。
+"""
+import json
+import mimetypes
+import os
+import re
+import stat
+from typing import Dict, List, Optional
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from app.core.paths import DIST_DIR
+
+# 指紋長度（build_assets 用同一個值）
+HASH_LENGTH = 12
+_HASHED_NAME = re.compile(r"\.[0-9a-f]{%d}\.[^./]+$" % HASH_LENGTH)
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# 有預壓縮版本的副檔名；依偏好順序嘗試的編碼
+COMPRESSIBLE = frozenset({".css", ".js", ".mjs", ".html", ".svg", ".json", ".txt", ".map"})
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def load_manifest() -> Dict[str, str]:
+    """原始 URL → 指紋 URL；還沒 build 過時是空的。"""
+    try:
+        return json.loads((DIST_DIR / "manifest.json").read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+
+
+manifest = load_manifest()
+
+
+def accepted_encodings(scope: Scope) -> List[str]:
+    accepted = []
+    for part in Headers(scope=scope).get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.append(name.strip().lower())
+    return accepted
+
+
+class AssetFiles(StaticFiles):
+    """
+    StaticFiles + 預壓縮變體（.br / .gz）+ Cache-Control。
+    dist_directory 存在時排在原始目錄前面；build 之後新增的檔案（例如新商品圖）照樣從原始目錄讀。
+    """
+
+    def __init__(self, *, directory, dist_directory=None, **kwargs) -> None:
+        super().__init__(directory=directory, **kwargs)
+        if dist_directory is not None and os.path.isdir(dist_directory):
+            self.all_directories = [dist_directory, *self.all_directories]
+
+    async def _precompressed(self, path: str, scope: Scope) -> Optional[Response]:
+        if scope["method"] not in ("GET", "HEAD") or os.path.splitext(path)[1] not in COMPRESSIBLE:
+            return None
+        accepted = accepted_encodings(scope)
+        for encoding, suffix in _ENCODINGS:
+            if encoding not in accepted:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                continue
+            response = FileResponse(
+                full_path,
+                stat_result=stat_result,
+                media_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+                headers={"Content-Encoding": encoding},
+            )
+            if self.is_not_modified(response.headers, Headers(scope=scope)):
+                return NotModifiedResponse(response.headers)
+            return response
+        return None
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await self._precompressed(path, scope)
+        if response is None:
+            response = await super().get_response(path, scope)
+        response.headers["Cache-Control"] = IMMUTABLE if _HASHED_NAME.search(path) else REVALIDATE
+        if os.path.splitext(path)[1] in COMPRESSIBLE:
+            response.headers["Vary"] = "Accept-Encoding"
+        return response
+
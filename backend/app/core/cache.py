@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from app.core import metrics
+from app.core.config import settings
+
+
+class TTLCache:
+    """
+    TTL + LRU 快取。只在單一 event loop 裡使用（沒有 await），不需要鎖。
+    命中 / 未命中 / 淘汰次數記在 metrics 的 cache_*_total{cache=name}。
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            metrics.inc("cache_misses_total", cache=self.name)
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            metrics.inc("cache_misses_total", cache=self.name)
+            return default
+        self._data.move_to_end(key)
+        metrics.inc("cache_hits_total", cache=self.name)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            metrics.inc("cache_evictions_total", cache=self.name)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+# get_current_user 用：account → user（不含 password）
+user_cache = TTLCache("users", maxsize=settings.USER_CACHE_MAXSIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.core.config import settings
+from app.core.images import with_srcset
+from app.core.responses import dumps
+from app.core.search import SearchIndex
+
+logger = logging.getLogger("catalog")
+
+# meta collection 裡的目錄版本文件：{"_id": "catalog", "version": n}，商品每次寫入後由 crud +1（ETag 用）
+CATALOG_VERSION_ID = "catalog"
+# 載入途中版本一直在變（大量寫入）時最多重讀幾次；還是不穩定就不裝快照
+LOAD_ATTEMPTS = 3
+
+
+class CatalogCache:
+    """
+    商品目錄快照：整份 products 放在記憶體，並預先序列化成 JSON bytes。
+    本行程的寫入由 crud 呼叫 invalidate()；其他 worker 的寫入靠 change stream（或輪詢）失效。
+    """
+
+    def __init__(self) -> None:
+        self.products: Optional[List[Dict[str, Any]]] = None
+        self.by_name: Dict[str, Dict[str, Any]] = {}
+        self.body: bytes = b"[]"
+        self.version: Optional[int] = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        # (建索引時的 by_name, 索引)：快照換掉之後第一次搜尋才重建
+        self._search: Optional[Tuple[Dict[str, Dict[str, Any]], SearchIndex]] = None
+        self._search_lock = asyncio.Lock()
+        self._watcher: Optional[asyncio.Task] = None
+        self._database = None
+        self._meta = None
+        self._pipeline: List[Dict[str, Any]] = []
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self.products = None
+        self.version = None
+
+    @staticmethod
+    async def _read_version(meta_collection) -> int:
+        doc = await meta_collection.find_one({"_id": CATALOG_VERSION_ID}, {"version": 1})
+        return int(doc["version"]) if doc else 0
+
+    async def _load(self, products_collection, meta_collection) -> None:
+        generation = self._generation
+        for _ in range(LOAD_ATTEMPTS):
+            version = await self._read_version(meta_collection)
+            products = [with_srcset(p) for p in await products_collection.find({}, {"_id": 0}).to_list(length=None)]
+            # 讀完商品再讀一次版本：途中有寫入（版本變了）就重讀，免得新內容配上舊版本號（其他 worker 回錯的 304）
+            stable = await self._read_version(meta_collection) == version
+            if stable:
+                break
+        self.body = dumps(products)
+        self.by_name = {p["name"]: p for p in products if "name" in p}
+        # 版本不穩定或本行程途中有寫入時，這份快照只給這次請求用，不裝上去（下次請求會重讀）
+        if stable and generation == self._generation:
+            self.products = products
+            self.version = version
+
+    async def get(self, products_collection, meta_collection) -> bytes:
+        if self.products is None:
+            async with self._lock:
+                if self.products is None:
+                    await self._load(products_collection, meta_collection)
+        return self.body
+
+    async def get_version(self, meta_collection) -> int:
+        if self.version is not None:
+            return self.version
+        # 快照還沒載入：只讀版本文件，不掃 products（If-None-Match 對上就不用載入）
+        return await self._read_version(meta_collection)
+
+    async def get_product(self, products_collection, meta_collection, name: str) -> Optional[Dict[str, Any]]:
+        await self.get(products_collection, meta_collection)
+        return self.by_name.get(name)
+
+    async def get_search_index(self, products_collection, meta_collection) -> SearchIndex:
+        await self.get(products_collection, meta_collection)
+        snapshot = self.by_name
+        if self._search is None or self._search[0] is not snapshot:
+            async with self._search_lock:
+                if self._search is None or self._search[0] is not snapshot:
+                    # 建索引是純 CPU 工作，丟到 thread，不卡住 event loop
+                    index = await asyncio.to_thread(SearchIndex, list(snapshot.values()))
+                    self._search = (snapshot, index)
+        return self._search[1]
+
+    async def render(self, products_collection, meta_collection, viewer: Optional[str]) -> bytes:
+        """組出 {"products": [...], "viewer": ...}，products 直接拼接快取好的 bytes。"""
+        body = await self.get(products_collection, meta_collection)
+        return b'{"products":' + body + b',"viewer":' + dumps(viewer) + b"}"
+
+    # ---- 跨 worker 失效 ----
+    async def _poll(self) -> None:
+        # 只讀 meta 的版本文件，跟快照的版本不同才失效（不用每次都重掃整份 products）
+        while True:
+            await asyncio.sleep(settings.CATALOG_POLL_SECONDS)
+            if self.version is None:
+                continue
+            try:
+                version = await self._read_version(self._meta)
+            except PyMongoError as e:
+                logger.warning("catalog version poll error: %s", e)
+                continue
+            if version != self.version:
+                self.invalidate()
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                # products 跟 meta（目錄版本）都要看：版本 +1 也要讓快照失效
+                async with await self._database.watch(self._pipeline) as stream:
+                    # 重新連上之前可能漏掉事件，先失效一次
+                    self.invalidate()
+                    async for _ in stream:
+                        self.invalidate()
+            except OperationFailure as e:
+                # standalone mongod 不支援 change stream → 改用輪詢
+                logger.info("change stream unavailable (%s), polling every %ss", e, settings.CATALOG_POLL_SECONDS)
+                await self._poll()
+            except PyMongoError as e:
+                logger.warning("catalog change stream error: %s", e)
+                self.invalidate()
+                await asyncio.sleep(settings.CATALOG_POLL_SECONDS)
+
+    def start(self, products_collection, meta_collection) -> None:
+        if self._watcher is None:
+            self._database = products_collection.database
+            self._meta = meta_collection
+            self._pipeline = [{"$match": {"$or": [
+                {"ns.coll": products_collection.name},
+                {"ns.coll": meta_collection.name, "documentKey._id": CATALOG_VERSION_ID},
+            ]}}]
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+
+catalog = CatalogCache()
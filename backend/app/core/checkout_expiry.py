@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from pymongo.errors import PyMongoError
+
+from app.core import metrics
+from app.core.config import settings
+from app.crud import Repositories, get_repositories
+
+logger = logging.getLogger("checkout")
+
+
+class CheckoutSweeper:
+    """
+    結帳保留回收：每筆 checkout 都有一筆 checkout_reservations（_id = orderNo, expires_at），
+    到期還是 pending 的訂單整批改成 expired，商品放回使用者的購物車（訂單記 items_restored）。
+    多個 worker 同時掃也沒關係：改狀態帶 status=pending；放回商品看訂單上的 items_restored / restore_skipped，
+    中途出錯時保留不刪，下一輪把還沒處理的 expired 單補做完。
+    """
+
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+
+    async def sweep(self, repos: Repositories) -> int:
+        """回收所有已到期的保留，回傳改成 expired 的訂單數。"""
+        reservations_collection = repos.orders.reservations
+        orders_collection = repos.orders.collection
+        batch_size = settings.CHECKOUT_SWEEP_BATCH_SIZE
+        reclaimed = 0
+        while True:
+            now = datetime.now(timezone.utc)
+            due = await (
+                reservations_collection.find({"expires_at": {"$lte": now}}, {"_id": 1})
+                .sort("expires_at", 1)
+                .limit(batch_size)
+                .to_list(length=None)
+            )
+            if not due:
+                return reclaimed
+
+            order_nos = [r["_id"] for r in due]
+            res = await orders_collection.update_many(
+                {"orderNo": {"$in": order_nos}, "status": "pending"},
+                {"$set": {"status": "expired", "expired_at": now, "updatedAt": now}},
+            )
+            if res.modified_count:
+                metrics.inc("checkout_reclaimed_total", res.modified_count)
+                logger.info("[CHECKOUT] expired %s pending order(s)", res.modified_count)
+
+            # 不只這一輪改到的：上一輪改成 expired 之後就出錯 / 重啟、還沒處理商品的單也在這裡補做
+            unhandled = await orders_collection.find(
+                {
+                    "orderNo": {"$in": order_nos},
+                    "status": "expired",
+                    "items_restored": {"$exists": False},
+                    "restore_skipped": {"$exists": False},
+                },
+                {"_id": 0, "orderNo": 1, "account": 1, "items": 1},
+            ).to_list(length=None)
+            for order in unhandled:
+                await self._restore(repos, order)
+
+            # 每張單都處理完才清保留（已付款 / 已失敗的單保留也一起清掉）；中途出錯的話保留還在，下一輪重來
+            await reservations_collection.delete_many({"_id": {"$in": order_nos}})
+            reclaimed += res.modified_count
+            if len(due) < batch_size:
+                return reclaimed
+
+    @staticmethod
+    async def _restore(repos: Repositories, order: Dict[str, Any]) -> None:
+        items = order.get("items") or []
+        account = order.get("account")
+        # 使用者已經開了一台有東西的新車就不放回；舊資料搬過來的單可能沒有 account
+        if not account or not await repos.carts.restore_items(account, items):
+            metrics.inc("checkout_restore_skipped_total")
+            await repos.orders.mark_restore_skipped(order["orderNo"])
+            return
+        # 記下有放回：之後才到的付款成功通知（payment_inbox）會把這些商品拿回來；
+        # 付款通知已經搶先把單改成 paid 的話，就由這裡自己拿回來
+        if not await repos.orders.mark_items_restored(order["orderNo"]):
+            await repos.carts.take_back_items(account, items)
+
+    # ---- 背景執行 ----
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep(await get_repositories())
+            except PyMongoError as e:
+                logger.warning("checkout sweeper error: %s", e)
+            except Exception:
+                # 背景工作不能因為一次意外（壞掉的舊資料等）就整個停掉；下一輪再試
+                logger.exception("checkout sweeper crashed, retrying")
+            await asyncio.sleep(settings.CHECKOUT_SWEEP_SECONDS)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+checkout_sweeper = CheckoutSweeper()
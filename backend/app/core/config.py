@@ -5,9 +5,72 @@ from typing import List, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "TCB-MONGO" 
+    API_V1_STR: str = ""
     SENTRY_DSN: Optional[str] = None
     ENVIRONMENT: str = "local"
 
+    # MongoDB：連線池大小、逾時（毫秒）、讀取偏好；啟動時預先建立 MONGO_MIN_POOL_SIZE 條連線
+    MONGO_URL: str = "mongodb://localhost:27017"
+    MONGO_DB: str = "tcb"
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 10
+    MONGO_MAX_IDLE_TIME_MS: Optional[int] = None
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 10000
+    MONGO_CONNECT_TIMEOUT_MS: int = 10000
+    MONGO_SOCKET_TIMEOUT_MS: Optional[int] = None
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = None
+    MONGO_READ_PREFERENCE: str = "primary"
+    # 啟動時順便建索引（通常交給 prestart 做）
+    MONGO_ENSURE_INDEXES_ON_STARTUP: bool = False
+
+    # JWT：access token 短效；refresh token 存在 DB，可撤銷、每次換發都輪替
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 10
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
+    # 剛輪替掉的 refresh token 在這段時間內再拿來換（多個分頁同時 refresh、回應掉了重送）回同一個新 token，不當成外洩
+    REFRESH_TOKEN_REUSE_GRACE_SECONDS: int = 10
+    # 已驗證 JWT 的快取（key 是 token 摘要，不會超過 token 本身的 exp）
+    JWT_CACHE_MAXSIZE: int = 10000
+    JWT_CACHE_TTL_SECONDS: float = 60
+
+    # 商品目錄快取：change stream 不能用時的輪詢秒數
+    CATALOG_POLL_SECONDS: int = 30
+
+    # get_current_user 的使用者快取（其他 worker 改資料時最多舊這麼久）
+    USER_CACHE_TTL_SECONDS: float = 5
+    USER_CACHE_MAXSIZE: int = 10000
+
+    # bcrypt 專用 thread pool 大小，以及最多允許多少個雜湊在排隊（超過回 429）
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 32
+
+    # ECPay 後台 API（async client）：逾時秒數、連線池 / 同時請求上限、查詢類 API 重試次數
+    ECPAY_HTTP_TIMEOUT_SECONDS: float = 10
+    ECPAY_HTTP_MAX_CONNECTIONS: int = 10
+    ECPAY_HTTP_RETRIES: int = 2
+
+    # 付款通知 inbox：consumer 每批處理筆數、沒有新通知時的輪詢秒數、單筆最多重試次數
+    ECPAY_INBOX_BATCH_SIZE: int = 100
+    ECPAY_INBOX_POLL_SECONDS: float = 5
+    ECPAY_INBOX_MAX_ATTEMPTS: int = 5
+
+    # 結帳保留：多久沒付款就把訂單改成 expired、商品放回購物車；sweeper 的間隔與每批筆數
+    CHECKOUT_EXPIRE_MINUTES: int = 60
+    CHECKOUT_SWEEP_SECONDS: float = 60
+    CHECKOUT_SWEEP_BATCH_SIZE: int = 500
+    # 保留紀錄過期後多久由 TTL monitor 刪掉（sweeper 停機超過這段時間的單就不會被回收）
+    CHECKOUT_RESERVATION_RETENTION_HOURS: int = 168
+
+    # 商品圖衍生檔：寬度級距（srcset 用）、壓縮品質、磁碟快取上限
+    IMAGE_WIDTHS: List[int] = [160, 320, 640, 960, 1280]
+    IMAGE_QUALITY: int = 75
+    IMAGE_CACHE_MAX_MB: int = 512
+
+    # /metrics 的 bearer token（Prometheus scrape_config 的 authorization.credentials）；沒設定就不開放，回 404
+    METRICS_TOKEN: Optional[str] = None
+
+    # 開發用：HTML 頁面快取每次請求都檢查原始檔有沒有改
+    PAGE_RELOAD: bool = False
+
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
 
     @property
@@ -17,6 +80,8 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
+        # .env 裡還有 ECPay 等其他模組自己讀的變數
+        extra = "ignore"
 
 
 settings = Settings()
\ No newline at end of file
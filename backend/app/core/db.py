@@ -1,18 +1,51 @@
-import os
-from pymongo import AsyncMongoClient
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import AsyncMongoClient, ASCENDING, DESCENDING, IndexModel
+from app.core.config import settings
+from app.core.monitoring import command_metrics, pool_metrics
 
 
-MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-MONGO_DB  = os.getenv("MONGO_DB", "tcb")
+MONGO_URL = settings.MONGO_URL
+MONGO_DB  = settings.MONGO_DB
 
 _client: AsyncMongoClient | None = None
 
+def _client_options() -> Dict[str, Any]:
+    options: Dict[str, Any] = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "readPreference": settings.MONGO_READ_PREFERENCE,
+        # 指令耗時 / 連線池 checkout 等待 → /metrics
+        "event_listeners": [command_metrics, pool_metrics],
+    }
+    # 沒設定就用 driver 預設（不限制）
+    for key, value in (
+        ("maxIdleTimeMS", settings.MONGO_MAX_IDLE_TIME_MS),
+        ("socketTimeoutMS", settings.MONGO_SOCKET_TIMEOUT_MS),
+        ("waitQueueTimeoutMS", settings.MONGO_WAIT_QUEUE_TIMEOUT_MS),
+    ):
+        if value is not None:
+            options[key] = value
+    return options
+
 async def get_client() -> AsyncMongoClient:
     global _client
     if _client is None:
-        _client = AsyncMongoClient(MONGO_URL, serverSelectionTimeoutMS=10000, maxPoolSize=100)
+        _client = AsyncMongoClient(MONGO_URL, **_client_options())
     return _client
 
+async def open_client() -> AsyncMongoClient:
+    """
+    給 lifespan 用：建立 client，同時送出 MONGO_MIN_POOL_SIZE 個 ping，
+    讓 server selection 與連線池在接第一個請求之前就準備好。
+    """
+    client = await get_client()
+    warm = max(settings.MONGO_MIN_POOL_SIZE, 1)
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(warm)))
+    return client
+
 async def close_client():
     global _client
     if _client is not None:
@@ -27,23 +60,178 @@ async def get_db():
     client = await get_client()
     return client[MONGO_DB]
 
-# ---- Collection providers（給 Depends 用）----
-async def users_col():
-    return (await get_db())["users"]
+# collection handle 由 app.crud.Repositories 統一建立（帶 codec options），路由用 app.api.deps 的 *_repo
 
-async def products_col():
-    return (await get_db())["products"]
+# 購物車 ETag 查詢（CartRepository.get_revision）用 hint 指定的覆蓋索引
+CART_REVISION_INDEX = "ix_account_status_rev"
 
-async def carts_col():
-    return (await get_db())["carts"]
+# ---- 索引清單（每個路由會下的查詢都要有對應索引）----
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        # 登入 / get_current_user / 編輯刪除都用 account；註冊時 email、phone 也要唯一
+        IndexModel([("account", ASCENDING)], unique=True, name="ux_account"),
+        IndexModel([("email", ASCENDING)], unique=True, name="ux_email"),
+        IndexModel([("phone", ASCENDING)], unique=True, name="ux_phone"),
+    ],
+    "products": [
+        # 商品以 name 當主鍵（新增時檢查重複、購物車、編輯刪除、分頁游標）
+        IndexModel([("name", ASCENDING)], unique=True, name="ux_name"),
+    ],
+    "carts": [
+        # (account, status) 開頭的查詢都用這個；多了 rev、_id，ETag 查詢只讀索引就夠
+        IndexModel(
+            [("account", ASCENDING), ("status", ASCENDING), ("rev", ASCENDING), ("_id", ASCENDING)],
+            name=CART_REVISION_INDEX,
+        ),
+        # 每個帳號只會有一台 active 購物車（add_to_cart 以此 upsert）
+        IndexModel(
+            [("account", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"status": "active"},
+            name="ux_account_active",
+        ),
+    ],
+    "orders": [
+        # 結帳建單 / ECPay 通知以訂單號找單
+        IndexModel([("orderNo", ASCENDING)], unique=True, name="ux_orderNo"),
+        # 訂單紀錄分頁：(createdAt, _id) 由新到舊，_id 是同一毫秒的 tie-breaker
+        IndexModel(
+            [("account", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+            name="ix_account_createdAt_id_desc",
+        ),
+    ],
+    "refresh_tokens": [
+        IndexModel([("token_hash", ASCENDING)], unique=True, name="ux_token_hash"),
+        # 偵測到重複使用時整個 family 一起撤銷
+        IndexModel([("family", ASCENDING)], name="ix_family"),
+        # 過期的 refresh token 由 TTL monitor 自動清掉
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="ttl_expires_at"),
+    ],
+    "checkout_reservations": [
+        # sweeper 撈已到期的保留；到期後再過 retention 由 TTL monitor 清掉
+        # （改 CHECKOUT_RESERVATION_RETENTION_HOURS 後要 collMod 或重建這個索引）
+        IndexModel(
+            [("expires_at", ASCENDING)],
+            expireAfterSeconds=settings.CHECKOUT_RESERVATION_RETENTION_HOURS * 3600,
+            name="ttl_expires_at",
+        ),
+    ],
+    "ecpay_inbox": [
+        # 同一則通知（ECPay 重送）只會寫入一次
+        IndexModel(
+            [("MerchantTradeNo", ASCENDING), ("TradeNo", ASCENDING), ("RtnCode", ASCENDING)],
+            unique=True,
+            name="ux_notify_key",
+        ),
+        # consumer 依收到順序撈待處理的通知
+        IndexModel([("status", ASCENDING), ("received_at", ASCENDING)], name="ix_status_received_at"),
+    ],
+}
 
-async def orders_col():
-    return (await get_db())["orders"]
+# 舊版留下、已經沒有查詢會用到的索引
+OBSOLETE_INDEXES: Dict[str, List[str]] = {
+    # ix_account_status 由 ix_account_status_rev 取代（前綴相同）
+    "carts": ["ix_username_status", "ux_merchant_trade_no", "ix_account_status"],
+    # 分頁需要 _id 當 tie-breaker，改用 ix_account_createdAt_id_desc
+    "orders": ["ix_account_createdAt_desc"],
+}
+
+# 路由實際會下的查詢形狀：(collection, filter, sort)；verify_query_plans 用 explain 檢查
+QUERY_SHAPES: List[Tuple[str, Dict[str, Any], Optional[List[Tuple[str, int]]]]] = [
+    ("users", {"account": "_"}, None),
+    ("users", {"email": "_"}, None),
+    ("users", {"phone": "_"}, None),
+    ("products", {"name": "_"}, None),
+    ("products", {}, [("name", ASCENDING)]),
+    ("products", {"name": {"$gt": "_"}}, [("name", ASCENDING)]),
+    ("carts", {"account": "_", "status": "active"}, None),
+    ("carts", {"account": "_", "status": "active", "items.name": "_"}, None),
+    ("orders", {"orderNo": "_", "status": "pending"}, None),
+    ("orders", {"orderNo": {"$in": ["_"]}}, None),
+    ("orders", {"account": "_"}, [("createdAt", DESCENDING), ("_id", DESCENDING)]),
+    ("refresh_tokens", {"token_hash": "_"}, None),
+    ("refresh_tokens", {"family": "_", "revoked_at": None}, None),
+    ("orders", {"orderNo": {"$in": ["_"]}, "status": "pending"}, None),
+    ("checkout_reservations", {"expires_at": {"$lte": "_"}}, [("expires_at", ASCENDING)]),
+    ("ecpay_inbox", {"status": "pending"}, [("received_at", ASCENDING)]),
+]
 
 # ---- 索引（冪等；prestart / lifespan 都能叫）----
+# 唯一索引建立前先找出重複的 key，每個索引最多列出幾組
+DUPLICATE_SAMPLE_LIMIT = 5
+
+async def find_duplicate_keys(collection, index: IndexModel) -> List[Dict[str, Any]]:
+    """
+    找出會讓唯一索引建不起來的重複 key（有 partialFilterExpression 的只看符合條件的文件）。
+    缺欄位跟 null 在索引裡是同一個值，所以一起算。回傳 [{"key": {...}, "count": n}, ...]。
+    """
+    document = index.document
+    fields = [field for field, _ in document["key"].items()]
+    pipeline: List[Dict[str, Any]] = []
+    if document.get("partialFilterExpression"):
+        pipeline.append({"$match": document["partialFilterExpression"]})
+    pipeline += [
+        {"$group": {
+            "_id": {field: {"$ifNull": [f"${field}", None]} for field in fields},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$sort": {"count": DESCENDING}},
+        {"$limit": DUPLICATE_SAMPLE_LIMIT},
+    ]
+    cursor = await collection.aggregate(pipeline, allowDiskUse=True)
+    return [{"key": doc["_id"], "count": doc["count"]} for doc in await cursor.to_list(length=None)]
+
+async def check_unique_indexes(db) -> None:
+    """
+    還沒建起來的唯一索引，先檢查既有資料有沒有重複；有的話列出 collection / 索引 / key 後丟 RuntimeError，
+    不讓 create_indexes 只回一個 DuplicateKeyError。已經存在的索引不可能有重複，跳過（不用每次掃整個 collection）。
+    """
+    problems = []
+    for name, indexes in INDEXES.items():
+        existing = {index["name"] for index in await (await db[name].list_indexes()).to_list(length=None)}
+        for index in indexes:
+            document = index.document
+            if not document.get("unique") or document["name"] in existing:
+                continue
+            for dup in await find_duplicate_keys(db[name], index):
+                problems.append(f"{name}.{document['name']} {dup['key']} x{dup['count']}")
+    if problems:
+        raise RuntimeError(
+            "Duplicate keys block unique index creation; fix or remove these documents and re-run prestart: "
+            + "; ".join(problems)
+        )
+
 async def ensure_indexes():
-    carts  = await carts_col()
-    orders = await orders_col()
-    await carts.create_index([("username", 1), ("status", 1)], name="ix_username_status")
-    await orders.create_index([("orderNo", 1)], unique=True, name="ux_orderNo")
-    await orders.create_index([("account", 1), ("createdAt", -1)], name="ix_account_createdAt_desc")
+    db = await get_db()
+    await check_unique_indexes(db)
+    for name, indexes in INDEXES.items():
+        await db[name].create_indexes(indexes)
+    for name, index_names in OBSOLETE_INDEXES.items():
+        existing = await (await db[name].list_indexes()).to_list(length=None)
+        for index in existing:
+            if index["name"] in index_names:
+                await db[name].drop_index(index["name"])
+
+def _has_collscan(plan: Any) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(v) for v in plan)
+    return False
+
+async def verify_query_plans():
+    """對 QUERY_SHAPES 逐一 explain，只要有任何一個還是 COLLSCAN 就丟 RuntimeError。"""
+    db = await get_db()
+    bad = []
+    for name, filter_, sort in QUERY_SHAPES:
+        cursor = db[name].find(filter_)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        if _has_collscan(explain.get("queryPlanner", {}).get("winningPlan")):
+            bad.append(f"{name} {filter_} sort={sort}")
+    if bad:
+        raise RuntimeError("COLLSCAN in query plan: " + "; ".join(bad))
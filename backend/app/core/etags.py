@@ -0,0 +1,36 @@
+"""
+JSON API 的 ETag：由版本號（商品目錄 version / 購物車 rev）組成，不用先產生 body 再算雜湊；
+If-None-Match 對上時不必讀商品 / 購物車文件就能回 304。
+"""
+import hashlib
+from typing import Any, Dict, Optional
+
+from fastapi import Response, status
+
+# 內容因登入者而異：瀏覽器每次都要重新驗證，共用快取不能存
+CACHE_CONTROL = "private, no-cache"
+
+
+def make(kind: str, version: int, *variant: Any) -> str:
+    """"<kind>-<version>[-<variant 雜湊>]"；同一個版本但不同參數（viewer、分頁...）的回應要有不同的 ETag。"""
+    tag = f"{kind}-{version}"
+    if variant:
+        tag += "-" + hashlib.blake2b(repr(variant).encode("utf-8"), digest_size=8).hexdigest()
+    return f'"{tag}"'
+
+
+def matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match 用弱比較：W/"x" 跟 "x" 視為相同
+    return any(t.strip().removeprefix("W/") == etag for t in if_none_match.split(","))
+
+
+def headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Authorization"}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers(etag))
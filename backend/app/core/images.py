@@ -0,0 +1,226 @@
+"""
+商品圖衍生檔：依寬度分級（IMAGE_WIDTHS）重新壓縮成 AVIF / WebP / JPEG，存在 IMAGE_CACHE_DIR。
+第一次被要求時才產生（或新增 / 修改商品時先在背景產生），磁碟快取超過上限就刪最久沒用的。
+Pillow 列在 pyproject 的相依套件裡；只在開發環境沒裝時才退回：/img 直接導回原圖、不給 srcset。
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.paths import IMAGE_CACHE_DIR, IMAGE_DIR
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # pragma: no cover - 開發環境沒裝 Pillow
+    Image = None
+
+logger = logging.getLogger("images")
+
+# 格式 → (Pillow 格式名, 副檔名, Content-Type)；順序就是偏好順序
+FORMATS: Dict[str, Tuple[str, str, str]] = {
+    "avif": ("AVIF", ".avif", "image/avif"),
+    "webp": ("WEBP", ".webp", "image/webp"),
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+}
+# 命中時最多多久更新一次 mtime（淘汰時用 mtime 當「最近使用」）
+_TOUCH_INTERVAL = 3600
+
+
+class ImageUnavailable(Exception):
+    """沒裝 Pillow，或這張原圖不能處理。"""
+
+
+def _supported_formats() -> List[str]:
+    if Image is None:
+        return []
+    return [f for f in FORMATS if f == "jpeg" or features.check(f)]
+
+
+SUPPORTED_FORMATS = _supported_formats()
+
+
+def bucket_width(width: int) -> int:
+    """往上取到最近的寬度級距（超過最大級距就用最大的）。"""
+    for w in settings.IMAGE_WIDTHS:
+        if width <= w:
+            return w
+    return settings.IMAGE_WIDTHS[-1]
+
+
+def negotiate_format(accept: str) -> str:
+    accept = accept.lower()
+    for fmt in SUPPORTED_FORMATS:
+        if fmt == "jpeg" or FORMATS[fmt][2] in accept:
+            return fmt
+    return "jpeg"
+
+
+def source_path(rel: str) -> Path:
+    """/image 底下的原圖；路徑跑出 IMAGE_DIR 或不存在時丟 FileNotFoundError。"""
+    root = IMAGE_DIR.resolve()
+    path = (root / rel).resolve()
+    if root not in path.parents or not path.is_file():
+        raise FileNotFoundError(rel)
+    return path
+
+
+def srcset(img: Optional[str]) -> Optional[str]:
+    """商品 img（/image/xxx.jpg）→ 各寬度衍生檔的 srcset；外部網址或其他路徑回 None。"""
+    if not img or not img.startswith("/image/"):
+        return None
+    rel = quote(img[len("/image/"):])
+    return ", ".join(f"/img/{w}/{rel} {w}w" for w in settings.IMAGE_WIDTHS)
+
+
+def with_srcset(product: Dict[str, Any]) -> Dict[str, Any]:
+    # 沒裝 Pillow 就產生不了衍生檔（/img 只會 307 回原圖），不給 srcset，瀏覽器直接載原圖
+    if not SUPPORTED_FORMATS:
+        return product
+    product["srcset"] = srcset(product.get("img"))
+    return product
+
+
+class DerivativeCache:
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self._size: Optional[int] = None
+        # _size / _evict 由好幾個 to_thread 的 worker thread 同時改
+        self._size_lock = threading.Lock()
+        # 每個衍生檔一把鎖 + 正在用（持有或等待）的請求數；沒人用了才拿掉
+        self._locks: Dict[Path, List[Any]] = {}
+
+    def _path(self, source: Path, width: int, fmt: str) -> Path:
+        # key 含原圖的 mtime / 大小：原圖被換掉就會產生新的衍生檔（舊的等著被淘汰）
+        st = source.stat()
+        key = f"{source.relative_to(IMAGE_DIR.resolve()).as_posix()}:{st.st_mtime_ns}:{st.st_size}"
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        return self.directory / f"{digest}.w{width}{FORMATS[fmt][1]}"
+
+    def _render(self, source: Path, target: Path, width: int, fmt: str) -> None:
+        started = time.perf_counter()
+        with Image.open(source) as im:
+            im = ImageOps.exif_transpose(im)
+            if im.width > width:  # 不放大
+                im.thumbnail((width, im.height), Image.LANCZOS)
+            if fmt == "jpeg" and im.mode not in ("RGB", "L"):
+                im = im.convert("RGB")
+            elif im.mode not in ("RGB", "RGBA", "L"):
+                im = im.convert("RGBA")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            # 每次產生各用一個暫存檔，不會有兩個 render 寫同一個檔、再把寫一半的 os.replace 上去
+            tmp = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+            options = {"quality": settings.IMAGE_QUALITY}
+            if fmt == "jpeg":
+                options.update(optimize=True, progressive=True)
+            try:
+                im.save(tmp, FORMATS[fmt][0], **options)
+            except Exception:
+                tmp.unlink(missing_ok=True)
+                raise
+        os.replace(tmp, target)
+        metrics.observe("image_render_seconds", time.perf_counter() - started, format=fmt)
+
+    def _scan_size(self) -> int:
+        if not self.directory.is_dir():
+            return 0
+        return sum(p.stat().st_size for p in self.directory.iterdir() if p.is_file())
+
+    def _evict(self) -> None:
+        """（呼叫端持有 _size_lock）超過 IMAGE_CACHE_MAX_MB 就從最久沒用的開始刪，刪到上限的 90%。"""
+        limit = settings.IMAGE_CACHE_MAX_MB * 1024 * 1024
+        if self._size is None:
+            self._size = self._scan_size()
+        if self._size <= limit:
+            return
+        entries = sorted(
+            (p.stat().st_mtime, p.stat().st_size, p) for p in self.directory.iterdir() if p.is_file()
+        )
+        for _, size, p in entries:
+            if self._size <= limit * 0.9:
+                break
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+            self._size -= size
+            metrics.inc("image_cache_evictions_total")
+
+    def _lookup(self, rel: str, width: int, fmt: str) -> Tuple[Path, bool]:
+        if Image is None or fmt not in SUPPORTED_FORMATS:
+            raise ImageUnavailable(rel)
+        target = self._path(source_path(rel), width, fmt)
+        try:
+            st = target.stat()
+        except FileNotFoundError:
+            return target, False
+        if time.time() - st.st_mtime > _TOUCH_INTERVAL:
+            os.utime(target)
+        return target, True
+
+    def _generate(self, rel: str, target: Path, width: int, fmt: str) -> None:
+        if target.exists():  # 等鎖的時候別人已經產生了
+            return
+        try:
+            self._render(source_path(rel), target, width, fmt)
+        except (OSError, ValueError) as e:
+            raise ImageUnavailable(rel) from e
+        with self._size_lock:
+            if self._size is not None:
+                self._size += target.stat().st_size
+            self._evict()
+
+    async def get(self, rel: str, width: int, fmt: str) -> Path:
+        """回傳衍生檔路徑；沒有就產生（同一個檔案同時只會產生一次）。"""
+        width = bucket_width(width)
+        target, hit = await asyncio.to_thread(self._lookup, rel, width, fmt)
+        metrics.inc("image_cache_requests_total", result="hit" if hit else "miss")
+        if hit:
+            return target
+        entry = self._locks.setdefault(target, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await asyncio.to_thread(self._generate, rel, target, width, fmt)
+        finally:
+            # 放開鎖的當下 locked() 是 False，但可能還有人在等；用計數判斷，不然新請求會拿到第二把鎖
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[target]
+        return target
+
+    async def warm(self, img: Optional[str]) -> None:
+        """新增 / 修改商品時先把各寬度 × 各格式產生好。"""
+        if not img or not img.startswith("/image/") or Image is None:
+            return
+        rel = img[len("/image/"):]
+        for width in settings.IMAGE_WIDTHS:
+            for fmt in SUPPORTED_FORMATS:
+                try:
+                    await self.get(rel, width, fmt)
+                except (FileNotFoundError, ImageUnavailable) as e:
+                    logger.warning("skip warming %s: %r", img, e)
+                    return
+
+
+derivatives = DerivativeCache(IMAGE_CACHE_DIR)
+
+# 背景產生中的 task（保留參照，避免被 GC）
+_warming: set = set()
+
+
+def schedule_warm(img: Optional[str]) -> None:
+    if Image is None:
+        return
+    task = asyncio.create_task(derivatives.warm(img))
+    _warming.add(task)
+    task.add_done_callback(_warming.discard)
@@ -0,0 +1,104 @@
+import bisect
+import threading
+from typing import Dict, List, Tuple
+
+# 行程內的簡易指標；label 以排序後的 tuple 當 key
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[LabelKey, float]] = {}
+# histogram：每個 series 是 [各 bucket 次數..., +Inf 次數, 總和, 總次數]
+_histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+# gauge：目前值（例如 inbox 最舊一筆待處理通知等了多久）
+_gauges: Dict[str, Dict[LabelKey, float]] = {}
+
+# 秒為單位的延遲 bucket（Mongo 指令 / 連線池 checkout 常常不到 1ms）
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1.0, **labels: str) -> None:
+    key = _key(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0.0) + value
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    key = _key(labels)
+    i = bisect.bisect_left(DEFAULT_BUCKETS, value)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        h = series.get(key)
+        if h is None:
+            h = series[key] = [0.0] * (len(DEFAULT_BUCKETS) + 3)
+        h[i] += 1
+        h[-2] += value
+        h[-1] += 1
+
+
+def gauge(name: str, value: float, **labels: str) -> None:
+    key = _key(labels)
+    with _lock:
+        _gauges.setdefault(name, {})[key] = value
+
+
+def get(name: str, **labels: str) -> float:
+    return _counters.get(name, {}).get(_key(labels), 0.0)
+
+
+def snapshot() -> Dict[str, Dict[LabelKey, float]]:
+    with _lock:
+        return {name: dict(series) for name, series in _counters.items()}
+
+
+def histogram_snapshot() -> Dict[str, Dict[LabelKey, List[float]]]:
+    with _lock:
+        return {name: {k: list(v) for k, v in series.items()} for name, series in _histograms.items()}
+
+
+def gauge_snapshot() -> Dict[str, Dict[LabelKey, float]]:
+    with _lock:
+        return {name: dict(series) for name, series in _gauges.items()}
+
+
+# ---- Prometheus text exposition format ----
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+
+def _value(v: float) -> str:
+    v = float(v)
+    return str(int(v)) if v.is_integer() else repr(v)
+
+
+def render() -> str:
+    """所有 counter / gauge / histogram 輸出成 /metrics 的格式（每個 worker 各自一份）。"""
+    lines: List[str] = []
+    for kind, data in (("counter", snapshot()), ("gauge", gauge_snapshot())):
+        for name, series in sorted(data.items()):
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_labels(key)} {_value(v)}" for key, v in sorted(series.items()))
+    bounds = [repr(b) for b in DEFAULT_BUCKETS] + ["+Inf"]
+    for name, series in sorted(histogram_snapshot().items()):
+        lines.append(f"# TYPE {name} histogram")
+        for key, h in sorted(series.items()):
+            cumulative = 0.0
+            for le, count in zip(bounds, h):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(key + (('le', le),))} {_value(cumulative)}")
+            lines.append(f"{name}_sum{_labels(key)} {_value(h[-2])}")
+            lines.append(f"{name}_count{_labels(key)} {_value(h[-1])}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,153 @@
+"""
+/metrics 的資料來源：每個路由的請求數 / 延遲（ASGI middleware），
+以及 pymongo 的 command monitoring（各 collection × 指令的耗時）與連線池 checkout 等待時間。
+全部寫進 app.core.metrics（行程內、一把 lock），每個請求多花幾微秒，可以一直開著。
+"""
+import time
+from typing import Any, Callable, Dict, Tuple
+
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+from starlette.routing import Mount
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import metrics
+
+_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+
+class RequestMetricsMiddleware:
+    """
+    http_requests_total{route,method,status} 與 http_request_duration_seconds{route,method}（含送完 body）。
+    route 用 app 的 generate_unique_id_function（main.custom_generate_unique_id）；掛載的靜態目錄用 mount 名稱；
+    沒對到任何路由的歸成 unmatched，避免 label 無限增加。
+    """
+
+    def __init__(self, app: ASGIApp, route_id: Callable[[APIRoute], str]) -> None:
+        self.app = app
+        self.route_id = route_id
+        self._labels: Dict[int, str] = {}  # id(route / mount 的 app) → label（APIRoute 不能當 dict key）
+
+    def _label(self, scope: Scope) -> str:
+        # router 比對後把 route / endpoint 寫回同一個 scope；FastAPI 的 router 不會替 Mount 設 scope["route"]
+        key = scope.get("route") or scope.get("endpoint")
+        if key is None:
+            return "unmatched"
+        label = self._labels.get(id(key))
+        if label is None:
+            if isinstance(key, APIRoute):
+                label = self.route_id(key)
+            else:
+                mount = next((r for r in scope["app"].routes if isinstance(r, Mount) and r.app is key), None)
+                label = getattr(key, "name", None) or (mount.name if mount else None) or "unmatched"
+            self._labels[id(key)] = label
+        return label
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = self._label(scope)
+            method = scope["method"] if scope["method"] in _METHODS else "OTHER"
+            metrics.observe("http_request_duration_seconds", time.perf_counter() - started, route=route, method=method)
+            metrics.inc("http_requests_total", route=route, method=method, status=str(status))
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """mongo_command_duration_seconds{command,collection}；失敗另外記 mongo_command_failures_total。"""
+
+    # 同時進行中的指令不會多到這個數；超過代表有 started 沒配到結束事件，直接清掉
+    MAX_PENDING = 10000
+
+    def __init__(self) -> None:
+        self._pending: Dict[Tuple[Any, int], str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        target = event.command.get(event.command_name)
+        # find / insert / update ... 的值是 collection 名稱；getMore 的是 cursor id，collection 另外放
+        collection = target if isinstance(target, str) else event.command.get("collection", "")
+        if len(self._pending) >= self.MAX_PENDING:
+            self._pending.clear()
+        self._pending[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event, failed: bool) -> None:
+        collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection is None:
+            return
+        labels = {"command": event.command_name, "collection": collection}
+        metrics.observe("mongo_command_duration_seconds", event.duration_micros / 1e6, **labels)
+        if failed:
+            metrics.inc("mongo_command_failures_total", **labels)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, failed=True)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """連線池：checkout 等待時間、checkout 失敗原因、每台 server 目前開著的連線數。"""
+
+    def __init__(self) -> None:
+        self._open: Dict[str, int] = {}
+
+    @staticmethod
+    def _server(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def _connections(self, event, delta: int) -> None:
+        server = self._server(event)
+        self._open[server] = self._open.get(server, 0) + delta
+        metrics.gauge("mongo_pool_connections", self._open[server], server=server)
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        if event.duration is not None:
+            metrics.observe("mongo_pool_checkout_seconds", event.duration, server=self._server(event))
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        metrics.inc("mongo_pool_checkout_failures_total", server=self._server(event), reason=str(event.reason))
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent) -> None:
+        self._connections(event, 1)
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent) -> None:
+        self._connections(event, -1)
+
+    def pool_cleared(self, event: monitoring.PoolClearedEvent) -> None:
+        metrics.inc("mongo_pool_cleared_total", server=self._server(event))
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_check_out_started(self, event) -> None:
+        pass
+
+    def connection_checked_in(self, event) -> None:
+        pass
+
+
+command_metrics = CommandMetrics()
+pool_metrics = PoolMetrics()
@@ -0,0 +1,125 @@
+"""
+HTML 頁面快取：啟動時把每個頁面組好（navbar / footer 直接內嵌），連同 gzip 版本與 ETag 放在記憶體。
+頁面請求不再碰檔案系統；PAGE_RELOAD=true（開發用）時每次請求檢查原始檔 mtime，有改就重組。
+"""
+import gzip
+import hashlib
+import logging
+import re
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.core import assets
+from app.core.config import settings
+from app.core.paths import DIST_DIR, STATIC_DIR
+
+logger = logging.getLogger("pages")
+
+# 頁面裡要內嵌的元件：<div id="navbar"></div> → 放進 components/navbar.html 的內容
+COMPONENTS = ("navbar", "footer")
+_SLOT = re.compile(r'<div id="(%s)">\s*</div>' % "|".join(COMPONENTS))
+
+
+class Page:
+    __slots__ = ("body", "gzip_body", "etag", "gzip_etag", "sources")
+
+    def __init__(self, body: bytes, sources: Dict[Path, int]) -> None:
+        digest = hashlib.sha256(body).hexdigest()[:20]
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+        self.sources = sources  # 原始檔 → mtime_ns（reload 模式用）
+
+
+def _root() -> Path:
+    # 有 build 過就用 dist 裡已經改寫成指紋 URL 的版本
+    return DIST_DIR / "static" if assets.manifest else STATIC_DIR
+
+
+class PageCache:
+
+    def __init__(self) -> None:
+        self._pages: Dict[Tuple[str, ...], Page] = {}
+
+    def _assemble(self, parts: Tuple[str, ...]) -> Page:
+        root = _root()
+        path = root.joinpath(*parts)
+        sources = {path: path.stat().st_mtime_ns}
+        html = path.read_text(encoding="utf-8")
+
+        def inline(m: "re.Match[str]") -> str:
+            component = root / "components" / f"{m.group(1)}.html"
+            sources[component] = component.stat().st_mtime_ns
+            return f'<div id="{m.group(1)}">{component.read_text(encoding="utf-8")}</div>'
+
+        return Page(_SLOT.sub(inline, html).encode("utf-8"), sources)
+
+    @staticmethod
+    def _stale(page: Page) -> bool:
+        try:
+            return any(p.stat().st_mtime_ns != mtime for p, mtime in page.sources.items())
+        except FileNotFoundError:
+            return True
+
+    def get(self, *parts: str) -> Page:
+        page = self._pages.get(parts)
+        if page is None or (settings.PAGE_RELOAD and self._stale(page)):
+            page = self._pages[parts] = self._assemble(parts)
+        return page
+
+    def prerender(self) -> int:
+        """啟動時先把所有頁面組好（components 本身不算頁面）。"""
+        root = _root()
+        count = 0
+        for path in sorted(root.rglob("*.html")):
+            parts = path.relative_to(root).parts
+            if parts[0] == "components":
+                continue
+            self._pages[parts] = self._assemble(parts)
+            count += 1
+        logger.info("prerendered %s page(s) from %s", count, root)
+        return count
+
+
+pages = PageCache()
+
+
+class PageResponse(Response):
+    """依請求的 If-None-Match / Accept-Encoding 決定回 304、gzip 還是原文。"""
+
+    media_type = "text/html"
+
+    def __init__(self, page: Page) -> None:
+        self.page = page
+        super().__init__(content=page.body, headers={
+            "ETag": page.etag,
+            "Cache-Control": assets.REVALIDATE,
+            "Vary": "Accept-Encoding",
+        })
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request_headers = Headers(scope=scope)
+        use_gzip = "gzip" in assets.accepted_encodings(scope)
+        etag = self.page.gzip_etag if use_gzip else self.page.etag
+        if_none_match: Optional[str] = request_headers.get("if-none-match")
+        if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+            response = Response(status_code=304, headers={
+                "ETag": etag, "Cache-Control": assets.REVALIDATE, "Vary": "Accept-Encoding",
+            })
+            await response(scope, receive, send)
+            return
+        if use_gzip:
+            self.body = self.page.gzip_body
+            self.headers["Content-Encoding"] = "gzip"
+            self.headers["Content-Length"] = str(len(self.body))
+            self.headers["ETag"] = etag
+        await super().__call__(scope, receive, send)
+
+
+def page(*parts: str) -> PageResponse:
+    return PageResponse(pages.get(*parts))
@@ -7,4 +7,8 @@ BACKEND_DIR = APP_DIR.parent
 PROJECT_ROOT = BACKEND_DIR.parent           # .../TCB-Mongo
 FRONTEND_DIR = PROJECT_ROOT / "frontend" 
 STATIC_DIR = FRONTEND_DIR / "static"
-IMAGE_DIR = FRONTEND_DIR / "image"
\ No newline at end of file
+IMAGE_DIR = FRONTEND_DIR / "image"
+# build_assets 的輸出（指紋檔名 + gzip/brotli 預壓縮 + manifest.json）
+DIST_DIR = FRONTEND_DIR / "dist"
+# 商品圖衍生檔（各寬度 / 格式）的磁碟快取
+IMAGE_CACHE_DIR = FRONTEND_DIR / "image_cache"
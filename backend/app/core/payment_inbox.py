@@ -0,0 +1,257 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app.core import metrics
+from app.core.config import settings
+from app.crud import Repositories, get_repositories
+
+logger = logging.getLogger("ecpay")
+
+# consumer 讀訂單時只需要這些欄位
+_ORDER_FIELDS = {"_id": 0, "orderNo": 1, "account": 1, "status": 1, "amount": 1, "items": 1}
+
+
+def _age(received_at: datetime, now: datetime) -> float:
+    # 沒帶 CODEC_OPTIONS 的 collection 讀回來的 datetime 沒有 tzinfo（預設 UTC）
+    if received_at.tzinfo is None:
+        received_at = received_at.replace(tzinfo=timezone.utc)
+    return max((now - received_at).total_seconds(), 0.0)
+
+
+async def _take_back_restored(repos: Repositories, order: Dict[str, Any]) -> None:
+    """逾時訂單的商品已經放回購物車，付款卻成功了：拿回來；拿不完整（已被移除 / 又結帳掉）就標記人工退款。"""
+    if await repos.carts.take_back_items(order["account"], order.get("items") or []):
+        metrics.inc("ecpay_late_payment_total", result="taken_back")
+        return
+    await repos.orders.flag_refund_review(order["orderNo"], "late_payment_items_reused")
+    metrics.inc("ecpay_late_payment_total", result="refund_review")
+    logger.warning("[ECPAY] LATE_PAYMENT_REFUND_REVIEW no=%s (restored items already used)", order["orderNo"])
+
+
+async def apply_notification(repos: Repositories, order: Optional[Dict[str, Any]], message: Dict[str, Any]) -> str:
+    """
+    把一則已驗簽的付款通知套用到 pending 訂單上，回傳處理結果。
+    更新條件都帶讀到的 status（pending / expired），同一則通知重送 / 重放只會生效一次。
+    """
+    form = message["payload"]
+    merchant_trade_no = message["MerchantTradeNo"]
+
+    try:
+        trade_amt = int(form.get("TradeAmt", "0"))
+    except Exception:
+        logger.warning("[ECPAY] BAD_TRADE_AMT no=%s raw=%s", merchant_trade_no, form.get("TradeAmt"))
+        return "bad_amount"
+
+    # 找不到單視為已處理
+    if not order:
+        logger.warning("[ECPAY] ORDER_NOT_FOUND no=%s", merchant_trade_no)
+        return "not_found"
+
+    status_now = order.get("status")
+    # 逾時被 sweeper 改成 expired 之後才付款成功（例如 ATM 轉帳）仍然入帳
+    late_payment = status_now == "expired" and message["RtnCode"] == "1"
+    if status_now != "pending" and not late_payment:
+        logger.info("[ECPAY] NON_PENDING no=%s status=%s -> idempotent OK", merchant_trade_no, status_now)
+        return "not_pending"
+    if late_payment:
+        logger.warning("[ECPAY] LATE_PAYMENT no=%s (order already expired)", merchant_trade_no)
+
+    try:
+        expect_amt = int(order.get("amount", -1))
+    except Exception:
+        expect_amt = -1
+    if expect_amt != trade_amt:
+        logger.warning("[ECPAY] AMOUNT_MISMATCH no=%s expect=%s got=%s", merchant_trade_no, expect_amt, trade_amt)
+        return "amount_mismatch"
+
+    now = datetime.now(timezone.utc)
+    # 原始表單留在 inbox，訂單上只記是哪一則通知
+    updates = {
+        "provider_inbox_id": message["_id"],
+        "updatedAt": now,
+    }
+    if message["RtnCode"] == "1":  # 成功
+        updates.update({
+            "status": "paid",
+            "provider_trade_no": form.get("TradeNo"),
+            "paid_at": now,
+        })
+    else:  # 未成功 → 訂單 failed，商品放回購物車
+        updates.update({
+            "status": "failed",
+            "failure_reason": form.get("RtnMsg") or "PaymentNotSuccessful",
+        })
+
+    restored = None
+    if late_payment:
+        # 回傳更新後的 items_restored：跟 sweeper 的 mark_items_restored 都帶 status 條件，
+        # 先標記的話這裡看得到、由這裡把商品拿回來；這裡先改成 paid 的話 sweeper 的標記會失敗、由它拿回來
+        after = await repos.orders.collection.find_one_and_update(
+            {"orderNo": merchant_trade_no, "status": status_now},
+            {"$set": updates},
+            projection={"_id": 0, "items_restored": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        modified = int(after is not None)
+        if after and after.get("items_restored"):
+            await _take_back_restored(repos, order)
+    else:
+        res = await repos.orders.collection.update_one(
+            {"orderNo": merchant_trade_no, "status": status_now},
+            {"$set": updates},
+        )
+        modified = res.modified_count
+        if modified and updates["status"] == "failed":
+            restored = await repos.carts.restore_items(order["account"], order.get("items") or [])
+    logger.info(
+        "[ECPAY] UPDATE no=%s modified=%s -> %s restored=%s",
+        merchant_trade_no, modified, updates["status"], restored,
+    )
+    # 同一批後面若還有這張單的通知，要看到更新後的狀態
+    order["status"] = updates["status"]
+    return updates["status"]
+
+
+class PaymentInbox:
+    """
+    ECPay 付款通知 inbox：webhook 只負責驗簽 + 寫入 ecpay_inbox 後立刻回 1|OK，
+    訂單狀態轉換由背景 consumer 依收到順序批次套用。
+    """
+
+    def __init__(self) -> None:
+        self._wake = asyncio.Event()
+        self._consumer: Optional[asyncio.Task] = None
+
+    async def record(self, inbox_collection, form: Dict[str, Any]) -> bool:
+        """寫入一則通知；同一則通知重送時回 False（已經收過）。"""
+        message = {
+            "MerchantTradeNo": form.get("MerchantTradeNo"),
+            "TradeNo": form.get("TradeNo"),
+            "RtnCode": str(form.get("RtnCode", "")),
+            "payload": form,
+            "status": "pending",
+            "attempts": 0,
+            "received_at": datetime.now(timezone.utc),
+        }
+        try:
+            await inbox_collection.insert_one(message)
+        except DuplicateKeyError:
+            metrics.inc("ecpay_inbox_received_total", result="duplicate")
+            return False
+        metrics.inc("ecpay_inbox_received_total", result="new")
+        self._wake.set()
+        return True
+
+    async def replay(
+        self,
+        inbox_collection,
+        *,
+        merchant_trade_no: Optional[str] = None,
+        since: Optional[datetime] = None,
+    ) -> int:
+        """把處理過的通知改回 pending 重新套用（轉換本身是冪等的），回傳筆數。"""
+        filter_: Dict[str, Any] = {"status": {"$ne": "pending"}}
+        if merchant_trade_no:
+            filter_["MerchantTradeNo"] = merchant_trade_no
+        if since:
+            filter_["received_at"] = {"$gte": since}
+        res = await inbox_collection.update_many(
+            filter_,
+            {"$set": {"status": "pending", "attempts": 0}, "$unset": {"outcome": "", "processed_at": "", "last_error": ""}},
+        )
+        metrics.inc("ecpay_inbox_replayed_total", res.modified_count)
+        self._wake.set()
+        return res.modified_count
+
+    async def drain(self, repos: Repositories) -> int:
+        """處理所有待處理的通知，回傳處理筆數；有單筆出錯時留到下一輪再試。"""
+        inbox_collection = repos.ecpay_inbox
+        orders_collection = repos.orders.collection
+        batch_size = settings.ECPAY_INBOX_BATCH_SIZE
+        processed = 0
+        while True:
+            batch = await inbox_collection.find({"status": "pending"}).sort("received_at", 1).limit(batch_size).to_list(length=None)
+            now = datetime.now(timezone.utc)
+            metrics.gauge("ecpay_inbox_oldest_pending_seconds", _age(batch[0]["received_at"], now) if batch else 0.0)
+            if not batch:
+                return processed
+
+            # 一批通知對應的訂單一次撈回來
+            nos = list({m["MerchantTradeNo"] for m in batch})
+            orders = {
+                o["orderNo"]: o
+                for o in await orders_collection.find({"orderNo": {"$in": nos}}, _ORDER_FIELDS).to_list(length=None)
+            }
+
+            ops = []
+            failed = False
+            for message in batch:
+                try:
+                    outcome = await apply_notification(repos, orders.get(message["MerchantTradeNo"]), message)
+                except Exception as e:
+                    # 任何錯誤都只影響這一則（CancelledError 不是 Exception，照樣往外傳）；
+                    # Mongo 錯誤多半是暫時的，其他錯誤（程式 bug、壞掉的資料）留 traceback
+                    failed = True
+                    attempts = message.get("attempts", 0) + 1
+                    logger.warning(
+                        "[ECPAY] INBOX_ERROR no=%s attempt=%s err=%r", message["MerchantTradeNo"], attempts, e,
+                        exc_info=not isinstance(e, PyMongoError),
+                    )
+                    update = {"attempts": attempts, "last_error": f"{type(e).__name__}: {e}"}
+                    if attempts >= settings.ECPAY_INBOX_MAX_ATTEMPTS:
+                        update.update({"status": "error", "processed_at": datetime.now(timezone.utc)})
+                        metrics.inc("ecpay_inbox_processed_total", outcome="error")
+                    ops.append(UpdateOne({"_id": message["_id"]}, {"$set": update}))
+                    continue
+                done_at = datetime.now(timezone.utc)
+                ops.append(UpdateOne(
+                    {"_id": message["_id"], "status": "pending"},
+                    {"$set": {"status": "done", "outcome": outcome, "processed_at": done_at}},
+                ))
+                metrics.inc("ecpay_inbox_processed_total", outcome=outcome)
+                metrics.observe("ecpay_inbox_lag_seconds", _age(message["received_at"], done_at))
+                processed += 1
+
+            await inbox_collection.bulk_write(ops, ordered=False)
+            if failed:
+                return processed
+            if len(batch) < batch_size:
+                metrics.gauge("ecpay_inbox_oldest_pending_seconds", 0.0)
+                return processed
+
+    # ---- 背景 consumer ----
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                await self.drain(await get_repositories())
+            except PyMongoError as e:
+                logger.warning("ecpay inbox consumer error: %s", e)
+            except Exception:
+                # consumer 不能因為一次意外就整個停掉；下一輪再試
+                logger.exception("ecpay inbox consumer crashed, retrying")
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.ECPAY_INBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._consumer is None:
+            self._consumer = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._consumer is not None:
+            self._consumer.cancel()
+            try:
+                await self._consumer
+            except asyncio.CancelledError:
+                pass
+            self._consumer = None
+
+
+inbox = PaymentInbox()
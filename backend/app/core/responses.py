@@ -0,0 +1,35 @@
+"""
+全站的 JSON 輸出：orjson 直接把 dict / list 編成 UTF-8 bytes，ObjectId、Decimal128 等 BSON 型別也認得；
+datetime 由 orjson 原生處理（ISO 8601，跟 jsonable_encoder 的 isoformat 一樣）。
+路由直接回 ORJSONResponse 時不會經過 FastAPI 的 jsonable_encoder（逐欄位走一遍、複製整份資料）。
+"""
+from typing import Any
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+
+# 非字串的 dict key（例如 int）轉成字串，跟 json.dumps 行為一致
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    # 只在 orjson 不認得的型別才會呼叫
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=JSON_OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    """app 的 default_response_class；介面跟 JSONResponse 相同（content / status_code / headers）。"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
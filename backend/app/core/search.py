@@ -0,0 +1,134 @@
+"""
+商品搜尋：行程內的倒排索引，跟著商品目錄快照（app.core.catalog）一起重建，商品寫入後自動同步。
+
+- text：name / description 全文檢索，BM25 排序（name 權重較高）；所有詞都要出現（AND）。
+- prefix：商品名稱自動完成，名稱開頭或名稱裡任一個詞的開頭符合就算。
+
+其他文字以詞為單位；中日韓文字沒有空白斷詞，索引單字 + 相鄰兩字（bigram），
+查詢兩個字以上用 bigram、單一個字用單字。查詢只碰到相關的 posting，不掃整份目錄。
+"""
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Tuple
+
+# 假名、漢字、諺文：連續的一段另外處理（見 tokenize）；其他文字 / 數字一段一個詞
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_WORD = re.compile(rf"[{_CJK}]+|[^\W_{_CJK}]+")
+_CJK_CHAR = re.compile(rf"[{_CJK}]")
+
+# 欄位權重：名稱命中比描述命中重要
+FIELD_WEIGHTS = {"name": 3.0, "description": 1.0}
+# BM25 參數
+K1 = 1.2
+B = 0.75
+
+
+def normalize(text: Any) -> str:
+    # 全形 → 半形、大小寫不分
+    return unicodedata.normalize("NFKC", str(text or "")).casefold()
+
+
+def _is_cjk(word: str) -> bool:
+    return bool(_CJK_CHAR.match(word))
+
+
+def tokenize(text: Any, *, query: bool = False) -> List[str]:
+    """索引時中日韓文字產生單字 + bigram；查詢時兩個字以上只用 bigram（單字太常見，只會拖慢交集）。"""
+    tokens: List[str] = []
+    for word in _WORD.findall(normalize(text)):
+        if not _is_cjk(word):
+            tokens.append(word)
+            continue
+        bigrams = [word[i:i + 2] for i in range(len(word) - 1)]
+        if query:
+            tokens.extend(bigrams or [word])
+        else:
+            tokens.extend(word)
+            tokens.extend(bigrams)
+    return tokens
+
+
+def _prefix_keys(name: str) -> List[Tuple[str, int]]:
+    """名稱自動完成的 key：(從每個詞開頭到結尾的字串, 起點)；中日韓文字每個字都當詞的開頭。"""
+    keys = []
+    for m in _WORD.finditer(name):
+        starts = range(m.start(), m.end()) if _is_cjk(m.group()) else (m.start(),)
+        keys.extend((name[i:], i) for i in starts)
+    return keys
+
+
+class SearchIndex:
+    """由一份商品清單建出來之後就不再變動；商品有異動時 catalog 整個換一份新的。"""
+
+    def __init__(self, products: List[Dict[str, Any]]) -> None:
+        # 固定依名稱排序：同分時的順序跟分頁都穩定
+        self.products = sorted(products, key=lambda p: str(p.get("name", "")))
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self._build_text()
+        self._build_prefix()
+
+    def _build_text(self) -> None:
+        n = len(self.products)
+        fields = {f: [Counter(tokenize(p.get(f))) for p in self.products] for f in FIELD_WEIGHTS}
+        postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+
+        # BM25 每個 (詞, 商品) 的分數跟查詢無關，建索引時就算好；查詢只要加總
+        for f, docs in fields.items():
+            weight = FIELD_WEIGHTS[f]
+            avg_len = (sum(sum(c.values()) for c in docs) / n if n else 0) or 1
+            for doc, counts in enumerate(docs):
+                norm = K1 * (1 - B + B * sum(counts.values()) / avg_len)
+                for term, tf in counts.items():
+                    posting = postings[term]
+                    posting[doc] = posting.get(doc, 0.0) + weight * tf * (K1 + 1) / (tf + norm)
+        for term, posting in postings.items():
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc in posting:
+                posting[doc] *= idf
+        self.postings = dict(postings)
+
+    def _build_prefix(self) -> None:
+        keys = []
+        for doc, p in enumerate(self.products):
+            keys.extend((key, start, doc) for key, start in _prefix_keys(normalize(p.get("name"))))
+        keys.sort()
+        self._prefix_keys = [k[0] for k in keys]
+        self._prefix_docs = [(k[1], k[2]) for k in keys]
+
+    def _page(self, keys: Dict[int, Any], offset: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        # 只排出需要的前 offset + limit 筆，命中很多時不用整個排序
+        top = heapq.nsmallest(offset + limit, keys, key=keys.__getitem__)
+        return [self.products[doc] for doc in top[offset:]], len(keys)
+
+    def search(self, query: str, *, offset: int = 0, limit: int = 20) -> Tuple[List[Dict[str, Any]], int]:
+        """全文檢索：每個詞都要出現，依 BM25 分數由高到低（同分依名稱）；回傳 (這一頁, 總筆數)。"""
+        terms = list(dict.fromkeys(tokenize(query, query=True)))
+        lists = [self.postings.get(t) for t in terms]
+        if not lists or not all(lists):
+            return [], 0
+        # 從最短的 posting 開始交集
+        lists.sort(key=len)
+        scores = lists[0]
+        for posting in lists[1:]:
+            scores = {doc: s + posting[doc] for doc, s in scores.items() if doc in posting}
+        return self._page({doc: (-s, doc) for doc, s in scores.items()}, offset, limit)
+
+    def complete(self, prefix: str, *, offset: int = 0, limit: int = 20) -> Tuple[List[Dict[str, Any]], int]:
+        """自動完成：名稱開頭符合的排最前面，其次是名稱中間的詞；同一組內短的名稱優先。"""
+        prefix = normalize(prefix).strip()
+        if not prefix:
+            return [], 0
+        best: Dict[int, int] = {}
+        i = bisect_left(self._prefix_keys, prefix)
+        while i < len(self._prefix_keys) and self._prefix_keys[i].startswith(prefix):
+            start, doc = self._prefix_docs[i]
+            if doc not in best or start < best[doc]:
+                best[doc] = start
+            i += 1
+        return self._page({
+            doc: (start > 0, len(self.products[doc].get("name", "")), doc) for doc, start in best.items()
+        }, offset, limit)
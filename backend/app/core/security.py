@@ -1,11 +1,24 @@
 # security.py
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
 import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from jose import jwt, JWTError
+from passlib.context import CryptContext
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.config import settings
 
 SECRET_KEY = os.getenv("SECRET_KEY", "CHANGE_ME")
 ALGORITHM  = os.getenv("ALGORITHM", "HS256")
-ACCESS_TTL = int(os.getenv("ACCESS_EXPIRES_SECONDS", "1800"))  # 30min
+ACCESS_TTL = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+REFRESH_TTL = settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400
 
 def create_jwt(claims: dict, expires_in: int | None = None) -> str:
     now = datetime.now(timezone.utc)
@@ -18,8 +31,101 @@ def create_jwt(claims: dict, expires_in: int | None = None) -> str:
     }
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def decode_jwt(token: str) -> dict | None:
+# ---- 驗證 JWT：快取已驗證的 claims + HS* 的快速路徑 ----
+_HMAC_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+_DIGEST = _HMAC_DIGESTS.get(ALGORITHM)
+_SIGNING_KEY = SECRET_KEY.encode("utf-8")
+# create_jwt 產生的 header 段固定不變，先算好；不同的 header 一律交給 python-jose
+_HEADER_SEGMENT = jwt.encode({}, SECRET_KEY, algorithm=ALGORITHM).split(".", 1)[0]
+
+_jwt_cache = TTLCache("jwt", maxsize=settings.JWT_CACHE_MAXSIZE, ttl=settings.JWT_CACHE_TTL_SECONDS)
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+def _decode_hmac(token: str) -> dict | None:
+    """只處理自己簽的 token：header 完全相同才走這裡，驗章與 exp/nbf 規則同 python-jose（leeway=0）。"""
+    header, payload, signature = token.split(".")
+    signing_input = token[: len(header) + 1 + len(payload)].encode("ascii")
+    expected = hmac.new(_SIGNING_KEY, signing_input, _DIGEST).digest()
+    if not hmac.compare_digest(expected, _b64decode(signature)):
+        return None
+    claims = json.loads(_b64decode(payload))
+    if not isinstance(claims, dict):
+        return None
+    now = time.time()
+    if "exp" in claims and int(claims["exp"]) < now:
+        return None
+    if "nbf" in claims and int(claims["nbf"]) > now:
+        return None
+    if "iat" in claims:
+        int(claims["iat"])
+    return claims
+
+def _decode_uncached(token: str) -> dict | None:
+    if _DIGEST is not None and token.startswith(_HEADER_SEGMENT + ".") and token.count(".") == 2:
+        try:
+            return _decode_hmac(token)
+        except (ValueError, TypeError, UnicodeError):
+            return None
     try:
         return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
+
+def decode_jwt(token: str) -> dict | None:
+    # 同一個 token 一個頁面會驗好幾次：以 token 摘要為 key 快取驗證結果，最長活到 exp
+    key = hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+    claims = _jwt_cache.get(key)
+    if claims is not None:
+        exp = claims.get("exp")
+        if exp is None or int(exp) >= time.time():
+            return claims
+        _jwt_cache.pop(key)
+    claims = _decode_uncached(token)
+    if claims is not None:
+        exp = claims.get("exp")
+        ttl = settings.JWT_CACHE_TTL_SECONDS if exp is None else min(settings.JWT_CACHE_TTL_SECONDS, int(exp) - time.time())
+        if ttl > 0:
+            _jwt_cache.set(key, claims, ttl=ttl)
+    return claims
+
+# refresh token 是不透明的亂數字串；DB 只存它的 sha256
+def new_refresh_token() -> str:
+    return secrets.token_urlsafe(32)
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+# 輪替出來的新 token 由舊 token 推導（HMAC）：同一個 token 換幾次都得到同一個新 token，DB 不用存明文
+def successor_refresh_token(token: str) -> str:
+    digest = hmac.new(_SIGNING_KEY, b"refresh:" + token.encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+# ---- 密碼雜湊：bcrypt 一次幾十到幾百 ms，丟到專用 thread pool，不卡 event loop ----
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_hash_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_pending = 0  # 執行中 + 排隊中的數量（只在 event loop 內增減）
+
+class PasswordHashBusy(Exception):
+    """排隊中的雜湊工作已達上限；呼叫端應回 429，而不是繼續堆積。"""
+
+async def _run_in_hash_pool(op: str, fn, *args):
+    global _hash_pending
+    if _hash_pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        metrics.inc("password_hash_rejected_total", op=op)
+        raise PasswordHashBusy(op)
+    _hash_pending += 1
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_pool, fn, *args)
+    finally:
+        _hash_pending -= 1
+        metrics.observe("password_hash_seconds", time.perf_counter() - start, op=op)
+
+async def hash_password(password: str) -> str:
+    return await _run_in_hash_pool("hash", pwd_context.hash, password)
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run_in_hash_pool("verify", pwd_context.verify, password, hashed)
@@ -1,86 +1,753 @@
-from typing import Optional, List, Dict, Any
-from passlib.context import CryptContext
-
-_pwd = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# READ USER
-async def get_user_by_account(users, account: str) -> Optional[dict]:
-    return await users.find_one({"account": account})
-
-# CREATE
-async def user_exists(users, filter_dict: dict) -> bool:
-    return await users.find_one(filter_dict) is not None
-
-async def create_user(users, *, account: str, username: str, password: str,
-                      phone: str, email: str, level: int = 0) -> dict:
-    doc = {
-        "account": account,
-        "username": username,
-        "password": _pwd.hash(password), 
-        "phone": phone,
-        "email": email,
-        "level": level,
-    }
-    await users.insert_one(doc)
-    return {"account": account, "username": username, "phone": phone, "email": email, "level": level}
-
-#Delete user
-async def delete_user_by_account(users, account: str) -> bool:
-    result = await users.delete_one({"account": account})
-    return result.deleted_count == 1
-
-# UPDATE USer
-async def update_user_by_account(users, account: str, update_fields: dict) -> bool:
-    if not update_fields:
-        return False
-    result = await users.update_one({"account": account}, {"$set": update_fields})
-    return result.matched_count == 1
-
-# READ products
-
-async def get_all_products(products_collection) -> List[Dict[str, Any]]:
-    cursor = products_collection.find({}, {"_id": 0})
-    products = await cursor.to_list(length=None)
-    return products
-
-async def get_product_by_name(products_collection, name: str):
-    return await products_collection.find_one({"name": name}, {"_id": 0})
-
-async def create_product(
-    products_collection,
-    *,
-    name: str,
-    price: int,
-    img: str,
-    description: str,
-) -> Dict[str, Any]:
-    doc = {
-        "name": name,
-        "price": price,
-        "img": img,
-        "description": description,
+import base64
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, AsyncIterator, Awaitable, Callable, Tuple
+from bson import ObjectId
+from bson.codec_options import CodecOptions
+from pymongo import DESCENDING, ReturnDocument, UpdateOne
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from app.core.catalog import CATALOG_VERSION_ID, catalog
+from app.core.config import settings
+from app.core.cache import user_cache
+from app.core.db import CART_REVISION_INDEX, MONGO_DB, get_client
+from app.core.images import schedule_warm
+from app.core.security import (
+    hash_password, new_refresh_token, hash_refresh_token, successor_refresh_token, REFRESH_TTL,
+)
+
+# standalone mongod 收到 transaction 時的錯誤碼
+ILLEGAL_OPERATION = 20
+
+# 所有 collection 共用的 codec：datetime 讀回來一律是 UTC aware（跟寫入時的 datetime.now(timezone.utc) 一致）
+CODEC_OPTIONS = CodecOptions(tz_aware=True, tzinfo=timezone.utc)
+
+# USERS
+class UserRepository:
+
+    def __init__(self, collection: AsyncCollection) -> None:
+        self.collection = collection
+
+    # READ USER
+    async def get_by_account(self, account: str) -> Optional[dict]:
+        return await self.collection.find_one({"account": account})
+
+    # 給 get_current_user / token refresh 用：不含 password，先查快取
+    async def get_principal(self, account: str) -> Optional[dict]:
+        user = user_cache.get(account)
+        if user is None:
+            user = await self.collection.find_one({"account": account}, {"password": 0})
+            if user:
+                user_cache.set(account, user)
+        return user
+
+    # 管理頁用：不含 _id
+    async def get_public(self, account: str) -> Optional[dict]:
+        return await self.collection.find_one({"account": account}, {"_id": 0})
+
+    async def list_all(self) -> List[dict]:
+        return await self.collection.find({}, {"_id": 0}).to_list(length=None)
+
+    # CREATE
+    async def exists(self, filter_dict: dict) -> bool:
+        return await self.collection.find_one(filter_dict) is not None
+
+    async def create(self, *, account: str, username: str, password: str,
+                     phone: str, email: str, level: int = 0) -> dict:
+        doc = {
+            "account": account,
+            "username": username,
+            "password": await hash_password(password),
+            "phone": phone,
+            "email": email,
+            "level": level,
+        }
+        await self.collection.insert_one(doc)
+        return {"account": account, "username": username, "phone": phone, "email": email, "level": level}
+
+    #Delete user
+    async def delete_by_account(self, account: str) -> bool:
+        result = await self.collection.delete_one({"account": account})
+        user_cache.pop(account)
+        return result.deleted_count == 1
+
+    # UPDATE USer
+    async def update_by_account(self, account: str, update_fields: dict) -> bool:
+        if not update_fields:
+            return False
+        result = await self.collection.update_one({"account": account}, {"$set": update_fields})
+        user_cache.pop(account)
+        return result.matched_count == 1
+
+# PRODUCTS
+# 列表模式：清單頁不需要 description
+PRODUCT_VIEWS: Dict[str, Dict[str, int]] = {
+    "full": {"_id": 0},
+    "list": {"_id": 0, "description": 0},
+}
+
+# keyset 分頁：商品名稱唯一，游標就是「上一頁最後一筆的 name」
+def encode_product_cursor(name: str) -> str:
+    return base64.urlsafe_b64encode(name.encode("utf-8")).decode("ascii")
+
+def decode_product_cursor(cursor: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("invalid cursor") from e
+
+# 搜尋結果依分數排序，沒有 keyset 可用：游標是下一頁的起點（位移）
+def encode_search_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"o:{offset}".encode("ascii")).decode("ascii")
+
+def decode_search_cursor(cursor: str) -> int:
+    try:
+        kind, offset = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split(":", 1)
+        if kind != "o" or int(offset) < 0:
+            raise ValueError(cursor)
+        return int(offset)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("invalid cursor") from e
+
+class ProductRepository:
+
+    def __init__(self, collection: AsyncCollection, meta: AsyncCollection) -> None:
+        self.collection = collection
+        self.meta = meta
+
+    # READ products
+    async def get_all(self) -> List[Dict[str, Any]]:
+        return await self.collection.find({}, {"_id": 0}).to_list(length=None)
+
+    # 整份目錄 / 單一商品走記憶體快照（catalog），不打 DB
+    async def render_catalog(self, viewer: Optional[str]) -> bytes:
+        return await catalog.render(self.collection, self.meta, viewer)
+
+    async def get_cached(self, name: str) -> Optional[Dict[str, Any]]:
+        return await catalog.get_product(self.collection, self.meta, name)
+
+    # 搜尋 / 自動完成：記憶體裡的倒排索引（跟著目錄快照重建）；回傳 (這一頁, 總筆數)
+    async def search(
+        self, query: str, *, mode: str = "text", offset: int = 0, limit: int = 20,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        index = await catalog.get_search_index(self.collection, self.meta)
+        lookup = index.complete if mode == "prefix" else index.search
+        return lookup(query, offset=offset, limit=limit)
+
+    # 目錄版本（ETag 用）：快照載入時一起讀進記憶體，沒載入時只讀 meta 的一筆文件
+    async def catalog_version(self) -> int:
+        return await catalog.get_version(self.meta)
+
+    # 版本 +1 並讓本行程的快照失效；批次匯入（bench/seed.py）寫完整批後呼叫一次
+    async def bump_version(self) -> None:
+        try:
+            await self._inc_version()
+        finally:
+            catalog.invalidate()
+
+    async def _inc_version(self, session: Optional[AsyncClientSession] = None) -> None:
+        await self.meta.update_one(
+            {"_id": CATALOG_VERSION_ID}, {"$inc": {"version": 1}}, upsert=True, session=session,
+        )
+
+    # standalone mongod 不支援 transaction；第一次失敗後整個行程改走依序寫入
+    _transactions = True
+
+    async def _write(self, op: Callable[[Optional[AsyncClientSession]], Awaitable[Tuple[Any, bool]]]) -> Any:
+        """
+        商品寫入跟目錄版本 +1 放在同一個 transaction，不會有「商品改了、版本沒動」（舊 ETag 一直回 304）。
+        op(session) 回傳 (結果, 有沒有改到商品)；沒改到就不動版本。
+        不支援 transaction 時依序寫，版本 +1 放 finally：寫入中途出錯也照樣 +1（多 +1 只是多一次重新載入）。
+        """
+        if ProductRepository._transactions:
+            async def in_transaction(session: AsyncClientSession) -> Tuple[Any, bool]:
+                result, changed = await op(session)
+                if changed:
+                    await self._inc_version(session)
+                return result, changed
+
+            try:
+                async with self.collection.database.client.start_session() as session:
+                    result, changed = await session.with_transaction(in_transaction)
+            except OperationFailure as e:
+                if e.code != ILLEGAL_OPERATION:
+                    raise
+                ProductRepository._transactions = False
+            else:
+                if changed:
+                    catalog.invalidate()
+                return result
+
+        changed = True
+        try:
+            result, changed = await op(None)
+            return result
+        finally:
+            if changed:
+                await self.bump_version()
+
+    async def stream(
+        self,
+        *,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        projection: Optional[Dict[str, int]] = None,
+        batch_size: int = 100,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        filter_ = {"name": {"$gt": after}} if after is not None else {}
+        cursor = (
+            self.collection.find(filter_, projection or PRODUCT_VIEWS["full"])
+            .sort("name", 1)
+            .batch_size(batch_size)
+        )
+        if limit:
+            cursor = cursor.limit(limit)
+        async for doc in cursor:
+            yield doc
+
+    async def get_page(
+        self,
+        *,
+        after: Optional[str] = None,
+        limit: int = 20,
+        projection: Optional[Dict[str, int]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        # 多拿一筆判斷是否還有下一頁
+        products = [p async for p in self.stream(after=after, limit=limit + 1, projection=projection)]
+        if len(products) <= limit:
+            return products, None
+        products = products[:limit]
+        return products, encode_product_cursor(products[-1]["name"])
+
+    async def get_by_name(self, name: str):
+        return await self.collection.find_one({"name": name}, {"_id": 0})
+
+    async def create(
+        self,
+        *,
+        name: str,
+        price: int,
+        img: str,
+        description: str,
+    ) -> Dict[str, Any]:
+        doc = {
+            "name": name,
+            "price": price,
+            "img": img,
+            "description": description,
+        }
+        await self._write(lambda session: self._insert(doc, session))
+        # 縮圖在背景先產生，列表頁第一次載入就有
+        schedule_warm(img)
+        return doc
+
+    async def _insert(self, doc: Dict[str, Any], session: Optional[AsyncClientSession]) -> Tuple[None, bool]:
+        await self.collection.insert_one(doc, session=session)
+        return None, True
+
+    async def name_exists(self, name: str) -> bool:
+        return await self.collection.find_one({"name": name}) is not None
+
+    async def delete_by_name(self, name: str) -> bool:
+        async def op(session: Optional[AsyncClientSession]) -> Tuple[bool, bool]:
+            result = await self.collection.delete_one({"name": name}, session=session)
+            # 沒刪到東西（名稱不存在）就不動版本，快照跟客戶端的 ETag 都繼續有效
+            deleted = result.deleted_count == 1
+            return deleted, deleted
+        return await self._write(op)
+
+    async def update(self, name: str, update_fields: dict) -> None:
+        if not update_fields:
+            return
+
+        async def op(session: Optional[AsyncClientSession]) -> Tuple[None, bool]:
+            await self.collection.update_one({"name": name}, {"$set": update_fields}, session=session)
+            return None, True
+        await self._write(op)
+        if update_fields.get("img"):
+            schedule_warm(update_fields["img"])
+
+# CARTS
+def _item_values(field: str) -> dict:
+    return {"$map": {
+        "input": {"$ifNull": ["$items", []]},
+        "in": {"$toInt": {"$ifNull": [f"$$this.{field}", 0]}},
+    }}
+
+# 購物車 subtotal / count 存在文件上；每個修改 items 的 update pipeline 最後接這個 stage，
+# 在同一次原子寫入裡算好，讀取時不用再重算
+CART_TOTALS_STAGE = {"$set": {
+    "subtotal": {"$sum": {"$map": {
+        "input": {"$ifNull": ["$items", []]},
+        "in": {"$multiply": [
+            {"$toInt": {"$ifNull": ["$$this.price", 0]}},
+            {"$toInt": {"$ifNull": ["$$this.quantity", 0]}},
+        ]},
+    }}},
+    "count": {"$sum": _item_values("quantity")},
+}}
+
+# 每次修改購物車 rev + 1（ETag = _id + rev）；update pipeline 最後接這個 stage，一般 update 用 $inc
+CART_REV_STAGE = {"$set": {"rev": {"$add": [{"$ifNull": ["$rev", 0]}, 1]}}}
+CART_REV_INC = {"rev": 1}
+
+# 回傳給前端的購物車欄位（subtotal / count 已存在文件上；_id / rev 組 ETag）
+CART_PROJECTION = {"items": 1, "subtotal": 1, "count": 1, "rev": 1}
+
+def cart_totals(cart: Optional[dict]) -> Dict[str, int]:
+    """讀存好的 subtotal / count；舊文件沒有這兩個欄位時才現算。"""
+    cart = cart or {}
+    if "subtotal" in cart and "count" in cart:
+        return {"subtotal": int(cart["subtotal"]), "count": int(cart["count"])}
+    items = cart.get("items") or []
+    return {
+        "subtotal": sum(int(i.get("price", 0)) * int(i.get("quantity", 0)) for i in items),
+        "count": sum(int(i.get("quantity", 0)) for i in items),
     }
-    await products_collection.insert_one(doc)
-    return doc
 
+def _add_item_pipeline(name: str, quantity: int, price: int, img) -> list[dict]:
+    """
+    一次 update 完成「已在車裡就累加、不在就 append」；在 server 端原子執行，不會互相覆蓋。
+    字串一律包 $literal，避免商品名稱以 $ 開頭被當成欄位路徑。
+    """
+    name_ = {"$literal": name}
+    items = {"$ifNull": ["$items", []]}
+    return [{
+        "$set": {
+            "items": {
+                "$cond": [
+                    {"$in": [name_, {"$map": {"input": items, "in": "$$this.name"}}]},
+                    {"$map": {
+                        "input": items,
+                        "in": {"$cond": [
+                            {"$eq": ["$$this.name", name_]},
+                            {"$mergeObjects": ["$$this", {
+                                "quantity": {"$add": [{"$ifNull": ["$$this.quantity", 0]}, quantity]},
+                                "price": price,  # 價格以現在商品價格為準
+                            }]},
+                            "$$this",
+                        ]},
+                    }},
+                    {"$concatArrays": [items, [{
+                        "name": name_, "quantity": quantity, "price": price, "img": {"$literal": img},
+                    }]]},
+                ]
+            },
+        }
+    }, CART_TOTALS_STAGE, CART_REV_STAGE]
+
+def _take_back_pipeline(quantities: Dict[str, int]) -> list[dict]:
+    """每個品項扣掉指定數量，扣到 0 以下的整行拿掉；跟 _add_item_pipeline 一樣在 server 端原子執行。"""
+    taken = {"$switch": {
+        "branches": [
+            {"case": {"$eq": ["$$this.name", {"$literal": name}]}, "then": quantity}
+            for name, quantity in quantities.items()
+        ],
+        "default": 0,
+    }}
+    return [{
+        "$set": {"items": {"$filter": {
+            "input": {"$map": {
+                "input": {"$ifNull": ["$items", []]},
+                "in": {"$mergeObjects": ["$$this", {
+                    "quantity": {"$subtract": [{"$ifNull": ["$$this.quantity", 0]}, taken]},
+                }]},
+            }},
+            "cond": {"$gt": ["$$this.quantity", 0]},
+        }}},
+    }, CART_TOTALS_STAGE, CART_REV_STAGE]
+
+class CartRepository:
+
+    def __init__(self, collection: AsyncCollection) -> None:
+        self.collection = collection
+
+    async def get_active(self, account: str) -> Optional[dict]:
+        return await self.collection.find_one({"account": account, "status": "active"}, CART_PROJECTION)
+
+    # 只要 _id / rev（組 ETag）：ix_account_status_rev 覆蓋整個查詢，不用讀購物車文件；
+    # ux_account_active 也符合條件，用 hint 固定走覆蓋索引
+    async def get_revision(self, account: str) -> Optional[dict]:
+        return await self.collection.find_one(
+            {"account": account, "status": "active"}, {"_id": 1, "rev": 1}, hint=CART_REVISION_INDEX,
+        )
+
+    async def add_item(self, account: str, *, name: str, quantity: int, price: int, img) -> dict:
+        """一次 round trip：upsert（第一次也會建立）並回傳更新後的購物車。"""
+        pipeline = _add_item_pipeline(name, quantity, price, img)
+        for attempt in range(3):
+            try:
+                return await self.collection.find_one_and_update(
+                    {"account": account, "status": "active"},
+                    pipeline,
+                    projection=CART_PROJECTION,
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+            except DuplicateKeyError:
+                # 兩個請求同時建立第一台 active 車（ux_account_active），輸的那個重試就會走更新
+                if attempt == 2:
+                    raise
+
+    # 把 items 陣列裡 name=指定值 的項目移除並重算總計；沒有那個項目（或購物車不存在）回 None
+    async def remove_item(self, account: str, name: str) -> Optional[dict]:
+        return await self.collection.find_one_and_update(
+            {"account": account, "status": "active", "items.name": name},
+            [
+                {"$set": {"items": {"$filter": {
+                    "input": "$items",
+                    "cond": {"$ne": ["$$this.name", {"$literal": name}]},
+                }}}},
+                CART_TOTALS_STAGE,
+                CART_REV_STAGE,
+            ],
+            projection=CART_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def set_quantity(self, account: str, name: str, quantity: int) -> Optional[dict]:
+        return await self.collection.find_one_and_update(
+            {"account": account, "status": "active", "items.name": name},
+            [
+                {"$set": {"items": {"$map": {
+                    "input": "$items",
+                    "in": {"$cond": [
+                        {"$eq": ["$$this.name", {"$literal": name}]},
+                        {"$mergeObjects": ["$$this", {"quantity": quantity}]},
+                        "$$this",
+                    ]},
+                }}}},
+                CART_TOTALS_STAGE,
+                CART_REV_STAGE,
+            ],
+            projection=CART_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def clear(self, account: str) -> None:
+        await self.collection.update_one(
+            {"account": account, "status": "active"},
+            {"$set": {"items": [], "subtotal": 0, "count": 0}, "$inc": CART_REV_INC},
+            upsert=False,  # 清空通常不需要幫你建立新車
+        )
+
+    # 結帳時把 active 車的 items 原子地「拿走」（車清空），回傳拿走前的內容；空車 / 金額不對時回 None
+    async def take_items(self, account: str) -> Optional[dict]:
+        return await self.collection.find_one_and_update(
+            {"account": account, "status": "active", "items.0": {"$exists": True}, "subtotal": {"$gt": 0}},
+            {"$set": {"items": [], "subtotal": 0, "count": 0}, "$inc": CART_REV_INC},
+            projection=CART_PROJECTION,
+            return_document=ReturnDocument.BEFORE,
+        )
+
+    # 付款失敗 / 建單失敗時把商品放回購物車；使用者已經開了一台有東西的新車就不動（回 False）
+    async def restore_items(self, account: str, items: List[dict]) -> bool:
+        totals = cart_totals({"items": items})
+        try:
+            await self.collection.update_one(
+                {"account": account, "status": "active", "items.0": {"$exists": False}},
+                {"$set": {"items": items, **totals}, "$inc": CART_REV_INC},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    # 逾時放回購物車的商品，訂單後來還是付款成功了：把放回去的數量拿掉。
+    # 回傳是否全部拿回（使用者已經移除 / 又結帳掉一部分時回 False）
+    async def take_back_items(self, account: str, items: List[dict]) -> bool:
+        quantities: Dict[str, int] = {}
+        for item in items:
+            quantities[item["name"]] = quantities.get(item["name"], 0) + int(item.get("quantity", 0))
+        if not quantities:
+            return True
+        before = await self.collection.find_one_and_update(
+            {"account": account, "status": "active", "items.name": {"$in": list(quantities)}},
+            _take_back_pipeline(quantities),
+            projection={"items": 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+        present = {i["name"]: int(i.get("quantity", 0)) for i in (before or {}).get("items", [])}
+        return all(present.get(name, 0) >= quantity for name, quantity in quantities.items())
+
+    async def reconcile_totals(self) -> int:
+        """找出存的 subtotal / count 跟 items 對不上（或還沒有）的購物車並修正，回傳修正筆數。"""
+        stored = CART_TOTALS_STAGE["$set"]
+        result = await self.collection.update_many(
+            {"$expr": {"$or": [
+                {"$ne": ["$subtotal", stored["subtotal"]]},
+                {"$ne": ["$count", stored["count"]]},
+            ]}},
+            [CART_TOTALS_STAGE, CART_REV_STAGE],
+        )
+        return result.modified_count
+
+# ORDERS
+def _order_created_at() -> datetime:
+    # Mongo 只存到毫秒；先截掉，分頁游標才能精準比對
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+# keyset 分頁：依 (createdAt, _id) 由新到舊，游標是上一頁最後一筆的這兩個值
+ORDER_LIST_SORT = [("createdAt", DESCENDING), ("_id", DESCENDING)]
+ORDER_LIST_PROJECTION = {"account": 0, "provider_inbox_id": 0}
+
+def encode_order_cursor(created_at: datetime, order_id: ObjectId) -> str:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    raw = f"{int(created_at.timestamp() * 1000)}:{order_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_order_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        millis, order_id = raw.split(":", 1)
+        return datetime.fromtimestamp(int(millis) / 1000, tz=timezone.utc), ObjectId(order_id)
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+# 舊版購物車狀態 → 訂單狀態
+_CART_TO_ORDER_STATUS = {"pending": "pending", "success": "paid", "failed": "failed"}
+
+class OrderRepository:
+    """orders 與結帳保留（checkout_reservations，_id = orderNo）。"""
+
+    def __init__(self, collection: AsyncCollection, reservations: AsyncCollection) -> None:
+        self.collection = collection
+        self.reservations = reservations
+
+    async def create(self, *, order_no: str, account: str, items: List[dict],
+                     amount: int, count: int) -> dict:
+        """訂單建立後 items / amount 不再改變，只有付款狀態會更新。"""
+        now = _order_created_at()
+        order = {
+            "orderNo": order_no,
+            "account": account,
+            "items": items,
+            "amount": amount,
+            "count": count,
+            "status": "pending",
+            "provider": "ECPay",
+            "provider_trade_no": None,
+            "paid_at": None,
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        await self.collection.insert_one(order)
+        return order
+
+    # 付款狀態查詢用：只給訂單本人看（ux_orderNo）
+    async def get_for_account(self, order_no: str, account: str) -> Optional[dict]:
+        return await self.collection.find_one(
+            {"orderNo": order_no, "account": account}, {"_id": 0, "orderNo": 1, "status": 1, "amount": 1},
+        )
+
+    # sweeper 把逾時訂單的商品放回購物車之後記一筆；單已經不是 expired（付款通知先到）時回 False
+    async def mark_items_restored(self, order_no: str) -> bool:
+        res = await self.collection.update_one(
+            {"orderNo": order_no, "status": "expired"}, {"$set": {"items_restored": True}},
+        )
+        return res.modified_count == 1
+
+    # sweeper 沒把商品放回（使用者已經有一台有東西的車 / 舊資料沒有 account）也記一筆，下一輪不會再處理
+    async def mark_restore_skipped(self, order_no: str) -> None:
+        await self.collection.update_one({"orderNo": order_no}, {"$set": {"restore_skipped": True}})
+
+    # 付款成功但商品已經被別的地方用掉（放回購物車後又結帳等），需要人工確認 / 退款
+    async def flag_refund_review(self, order_no: str, reason: str) -> None:
+        await self.collection.update_one(
+            {"orderNo": order_no},
+            {"$set": {"refund_review": True, "refund_reason": reason, "updatedAt": datetime.now(timezone.utc)}},
+        )
+
+    # 結帳保留：到期還沒付款的 pending 訂單由 checkout sweeper 回收
+    async def reserve_checkout(self, *, order_no: str, account: str) -> None:
+        now = datetime.now(timezone.utc)
+        await self.reservations.insert_one({
+            "_id": order_no,
+            "account": account,
+            "created_at": now,
+            "expires_at": now + timedelta(minutes=settings.CHECKOUT_EXPIRE_MINUTES),
+        })
+
+    async def get_page(
+        self,
+        account: str,
+        *,
+        after: Optional[Tuple[datetime, ObjectId]] = None,
+        limit: int,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        filter_: Dict[str, Any] = {"account": account}
+        if after is not None:
+            created_at, order_id = after
+            filter_["$or"] = [
+                {"createdAt": {"$lt": created_at}},
+                {"createdAt": created_at, "_id": {"$lt": order_id}},
+            ]
+        # 多讀一筆判斷有沒有下一頁
+        orders = await (
+            self.collection.find(filter_, ORDER_LIST_PROJECTION)
+            .sort(ORDER_LIST_SORT)
+            .limit(limit + 1)
+            .to_list(length=None)
+        )
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_order_cursor(orders[-1]["createdAt"], orders[-1]["_id"])
+        for order in orders:
+            order.pop("_id", None)
+        return orders, next_cursor
+
+    async def migrate_from_carts(self, carts_collection: AsyncCollection) -> int:
+        """
+        舊版結帳直接把購物車改成 pending / success / failed 當訂單用；
+        把這些車搬進 orders（以 orderNo 冪等）後從 carts 刪掉，回傳搬移筆數。
+        """
+        legacy = await carts_collection.find(
+            {"status": {"$in": list(_CART_TO_ORDER_STATUS)}, "merchant_trade_no": {"$exists": True}},
+        ).to_list(length=None)
+        if not legacy:
+            return 0
+        ops, reservations = [], []
+        for cart in legacy:
+            items = cart.get("items_snapshot") or cart.get("items") or []
+            created_at = cart.get("updated_at") or cart["_id"].generation_time
+            order = {
+                "orderNo": cart["merchant_trade_no"],
+                "account": cart.get("account"),
+                "items": items,
+                "amount": int(cart.get("amount_snapshot", cart_totals({"items": items})["subtotal"])),
+                "count": cart_totals({"items": items})["count"],
+                "status": _CART_TO_ORDER_STATUS[cart["status"]],
+                "provider": cart.get("provider", "ECPay"),
+                "provider_trade_no": cart.get("provider_trade_no"),
+                "paid_at": cart.get("paid_at"),
+                "createdAt": created_at,
+                "updatedAt": cart.get("updated_at") or created_at,
+            }
+            ops.append(UpdateOne({"orderNo": order["orderNo"]}, {"$setOnInsert": order}, upsert=True))
+            # 還沒付款的單補一筆結帳保留（從舊車的時間起算），不然 sweeper 永遠不會回收；
+            # 早就過期的下一輪就改成 expired、商品放回購物車（訂單已經不是 pending 時 sweeper 只清掉保留）
+            if order["status"] == "pending":
+                reservations.append(UpdateOne({"_id": order["orderNo"]}, {"$setOnInsert": {
+                    "account": order["account"],
+                    "created_at": created_at,
+                    "expires_at": created_at + timedelta(minutes=settings.CHECKOUT_EXPIRE_MINUTES),
+                }}, upsert=True))
+        await self.collection.bulk_write(ops, ordered=False)
+        if reservations:
+            await self.reservations.bulk_write(reservations, ordered=False)
+        await carts_collection.delete_many({"_id": {"$in": [c["_id"] for c in legacy]}})
+        return len(legacy)
+
+# REFRESH TOKEN
+class RefreshTokenRepository:
+
+    def __init__(self, collection: AsyncCollection) -> None:
+        self.collection = collection
+
+    @staticmethod
+    def _new_doc(token_hash: str, account: str, family: Optional[str], now: datetime) -> dict:
+        return {
+            "token_hash": token_hash,
+            "account": account,
+            "family": family or token_hash,  # 同一次登入輪替出來的 token 共用 family
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=REFRESH_TTL),
+            "revoked_at": None,
+        }
+
+    async def create(self, *, account: str, family: Optional[str] = None) -> str:
+        token = new_refresh_token()
+        await self.collection.insert_one(
+            self._new_doc(hash_refresh_token(token), account, family, datetime.now(timezone.utc)),
+        )
+        return token
+
+    async def _issue_successor(self, token: str, doc: dict, now: datetime) -> Optional[str]:
+        """寫入（已經有就沿用）token 的 successor；successor 已被撤銷（登出 / 又輪替掉）時回 None。"""
+        successor = successor_refresh_token(token)
+        successor_hash = hash_refresh_token(successor)
+        try:
+            issued = await self.collection.find_one_and_update(
+                {"token_hash": successor_hash},
+                {"$setOnInsert": self._new_doc(successor_hash, doc["account"], doc["family"], now)},
+                projection={"revoked_at": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # 同一個 token 的兩個 refresh 同時 upsert：另一個已經寫進去了
+            issued = await self.collection.find_one({"token_hash": successor_hash}, {"revoked_at": 1})
+        return successor if issued and issued.get("revoked_at") is None else None
+
+    async def rotate(self, token: str) -> Optional[Tuple[str, str]]:
+        """
+        用掉一個 refresh token 換新的；成功回 (account, 新 token)，無效回 None。
+        新 token 由舊 token 推導，剛輪替掉的 token 在 REFRESH_TOKEN_REUSE_GRACE_SECONDS 內再拿來換
+        （多個分頁同時 refresh）會拿到同一個新 token；超過時間才視為外洩。
+        """
+        token_hash = hash_refresh_token(token)
+        now = datetime.now(timezone.utc)
+        doc = await self.collection.find_one_and_update(
+            {"token_hash": token_hash, "revoked_at": None, "expires_at": {"$gt": now}},
+            {"$set": {"revoked_at": now, "rotated_at": now}},
+        )
+        if doc is None:
+            doc = await self.collection.find_one(
+                {"token_hash": token_hash}, {"account": 1, "family": 1, "revoked_at": 1, "rotated_at": 1},
+            )
+            if not doc or not doc.get("revoked_at"):
+                return None
+            # 只有「輪替掉」的 token 有寬限；登出撤銷的 token 沒有 rotated_at
+            rotated_at = doc.get("rotated_at")
+            grace = timedelta(seconds=settings.REFRESH_TOKEN_REUSE_GRACE_SECONDS)
+            if rotated_at is None or now - rotated_at > grace:
+                # 已經輪替掉的 token 又被拿來用 → 視為外洩，整個 family 撤銷
+                await self.collection.update_many(
+                    {"family": doc["family"], "revoked_at": None}, {"$set": {"revoked_at": now}},
+                )
+                return None
+        new_token = await self._issue_successor(token, doc, now)
+        if new_token is None:
+            return None
+        return doc["account"], new_token
 
-async def product_name_exists(products_collection, name: str) -> bool:
-    return await products_collection.find_one({"name": name}) is not None
+    async def revoke(self, token: str) -> bool:
+        used = await self.collection.find_one({"token_hash": hash_refresh_token(token)}, {"family": 1})
+        if not used:
+            return False
+        await self.collection.update_many(
+            {"family": used["family"], "revoked_at": None},
+            {"$set": {"revoked_at": datetime.now(timezone.utc)}},
+        )
+        return True
 
-async def delete_product_by_name(products_collection, name: str) -> bool:
-    result = await products_collection.delete_one({"name": name})
-    return result.deleted_count == 1
+# ---- Repository 容器 ----
+class Repositories:
+    """
+    database / collection handle 只在這裡建一次（帶 CODEC_OPTIONS）。
+    app 的 lifespan 把它放在 app.state.repos，路由的 Depends 只是取屬性；背景工作 / 腳本用 get_repositories()。
+    """
 
+    def __init__(self, db: AsyncDatabase) -> None:
+        self.db = db.with_options(codec_options=CODEC_OPTIONS)
+        self.users = UserRepository(self.db["users"])
+        self.products = ProductRepository(self.db["products"], self.db["meta"])
+        self.carts = CartRepository(self.db["carts"])
+        self.orders = OrderRepository(self.db["orders"], self.db["checkout_reservations"])
+        self.refresh_tokens = RefreshTokenRepository(self.db["refresh_tokens"])
+        # inbox 的讀寫都在 PaymentInbox 裡，直接給 collection
+        self.ecpay_inbox: AsyncCollection = self.db["ecpay_inbox"]
 
-async def update_product(
-    products_collection,
-    name: str,
-    update_fields: dict,
-) -> None:
+_repositories: Optional[Repositories] = None
 
-    if not update_fields:
-        return
-    await products_collection.update_one(
-        {"name": name},
-        {"$set": update_fields},
-    )
\ No newline at end of file
+async def get_repositories() -> Repositories:
+    """跟著目前的 client：close_client 之後（例如 prestart 每步新的 event loop）會重建。"""
+    global _repositories
+    client = await get_client()
+    if _repositories is None or _repositories.db.client is not client:
+        _repositories = Repositories(client[MONGO_DB])
+    return _repositories
@@ -1,12 +1,22 @@
 
+from contextlib import asynccontextmanager
 import sentry_sdk
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from app.api.main import api_router
 from app.core.config import settings
-from app.core.paths import STATIC_DIR, IMAGE_DIR
+from app.core.paths import STATIC_DIR, IMAGE_DIR, DIST_DIR
+from app.core.assets import AssetFiles
+from app.core.pages import pages
+from app.core.catalog import catalog
+from app.core.db import open_client, close_client, ensure_indexes
+from app.crud import get_repositories
+from app.core.payment_inbox import inbox
+from app.core.checkout_expiry import checkout_sweeper
+from app.core.monitoring import RequestMetricsMiddleware
+from app.core.responses import ORJSONResponse
+from app.api.routes.carts import ecpay_client
 
 def custom_generate_unique_id(route: APIRoute) -> str:
     return f"{route.tags[0]}-{route.name}" if route.tags else route.name
@@ -16,15 +26,44 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mongo client：先連上並把連線池暖好，第一個請求不用等 server selection / 建連線
+    await open_client()
+    if settings.MONGO_ENSURE_INDEXES_ON_STARTUP:
+        await ensure_indexes()
+    # database / collection handle 只建一次，路由的 Depends 直接從 app.state 拿
+    app.state.repos = await get_repositories()
+    # HTML 頁面先組好放記憶體
+    pages.prerender()
+    # 商品目錄快取：監聽其他 worker 的寫入
+    catalog.start(app.state.repos.products.collection, app.state.repos.products.meta)
+    # ECPay 付款通知 inbox 的背景 consumer
+    inbox.start()
+    # 逾時未付款的結帳回收
+    checkout_sweeper.start()
+    yield
+    # 先停背景工作（它們還在用 client），最後才關 client
+    await checkout_sweeper.stop()
+    await inbox.stop()
+    await catalog.stop()
+    await ecpay_client.aclose()
+    await close_client()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json" if settings.API_V1_STR else "/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    # 回傳 dict 的路由也用 orjson 編碼（熱門路由直接回 ORJSONResponse，連 jsonable_encoder 都跳過）
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
-# ✅ 用絕對路徑（或 Path）掛靜態檔案
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
-app.mount("/image", StaticFiles(directory=IMAGE_DIR), name="image")
+# ✅ 用絕對路徑（或 Path）掛靜態檔案；有跑過 python -m app.build_assets 就優先用 dist（指紋檔名 + 預壓縮）
+app.mount("/static", AssetFiles(directory=STATIC_DIR, dist_directory=DIST_DIR / "static"), name="static")
+app.mount("/image", AssetFiles(directory=IMAGE_DIR, dist_directory=DIST_DIR / "image"), name="image")
 
 # if settings.all_cors_origins: 前端分離用
 #     app.add_middleware(
@@ -37,6 +76,9 @@ app.mount("/image", StaticFiles(directory=IMAGE_DIR), name="image")
 
 app.include_router(api_router)  #, prefix=settings.API_V1_STR
 
+# 每個路由的請求數 / 延遲 → /metrics
+app.add_middleware(RequestMetricsMiddleware, route_id=custom_generate_unique_id)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000, reload=True)
@@ -13,6 +13,9 @@ class LoginData(BaseModel):
     account: str
     password: str    
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
 #===========products models ============
 class ProductUpdate(BaseModel):
     price: int | None = None
@@ -1,6 +1,7 @@
 import logging, asyncio
 from tenacity import retry, stop_after_attempt, wait_fixed, before_log, after_log
-from app.core.db import ping, ensure_indexes
+from app.core.db import ping, ensure_indexes, verify_query_plans, close_client
+from app.crud import get_repositories
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("prestart")
@@ -12,13 +13,32 @@ logger = logging.getLogger("prestart")
     after=after_log(logger, logging.WARN),
 )
 def _wait_mongo():
-    asyncio.run(ping())
+    asyncio.run(_run(ping))
+
+# 每次 asyncio.run 都是新的 event loop，client 不能跨 loop 沿用，用完就關
+async def _run(*steps):
+    try:
+        for step in steps:
+            await step()
+    finally:
+        await close_client()
+
+# 購物車上存的 subtotal / count 若跟 items 對不上就修正
+async def _reconcile_carts():
+    fixed = await (await get_repositories()).carts.reconcile_totals()
+    logger.info("Cart totals reconciled: %s cart(s) repaired.", fixed)
+
+# 舊版把 pending / success / failed 的購物車當訂單用，搬進 orders
+async def _migrate_orders():
+    repos = await get_repositories()
+    moved = await repos.orders.migrate_from_carts(repos.carts.collection)
+    logger.info("Orders migrated from carts: %s.", moved)
 
 def main():
     logger.info("Pre-start: waiting for Mongo...")
     _wait_mongo()
-    logger.info("Mongo is up. Ensuring indexes...")
-    asyncio.run(ensure_indexes())
+    logger.info("Mongo is up. Ensuring indexes and checking query plans...")
+    asyncio.run(_run(ensure_indexes, _migrate_orders, verify_query_plans, _reconcile_carts))
     logger.info("Pre-start done.")
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+import argparse, asyncio, logging
+from datetime import datetime, timezone
+from app.core.db import close_client
+from app.crud import get_repositories
+from app.core.payment_inbox import inbox
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("replay_inbox")
+
+# 把已處理的 ECPay 通知改回 pending，執行中的 app 下一輪輪詢就會重新套用
+async def _replay(merchant_trade_no, since):
+    try:
+        count = await inbox.replay((await get_repositories()).ecpay_inbox, merchant_trade_no=merchant_trade_no, since=since)
+        logger.info("Replay queued: %s notification(s).", count)
+    finally:
+        await close_client()
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay ECPay payment notifications from ecpay_inbox.")
+    parser.add_argument("--no", dest="merchant_trade_no", help="only this MerchantTradeNo")
+    parser.add_argument("--since", help="only notifications received at/after this ISO time (UTC)")
+    args = parser.parse_args()
+    since = datetime.fromisoformat(args.since) if args.since else None
+    if since and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    asyncio.run(_replay(args.merchant_trade_no, since))
+
+if __name__ == "__main__":
+    main()
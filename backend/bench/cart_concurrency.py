@@ -0,0 +1,57 @@
+"""
+並行加入購物車不會遺失累加：同一個帳號同時送 N 次 POST /api/cart（各 +1），
+最後數量必須剛好是 N。需要本機 mongod（MONGO_URL / MONGO_DB）。
+
+    cd backend && python -m bench.cart_concurrency
+"""
+import asyncio
+import sys
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.deps import get_current_user
+from app.api.routes import carts
+from app.core.db import close_client, ensure_indexes
+from app.crud import get_repositories
+
+ACCOUNT = "bench-concurrency"
+PRODUCT = "bench-concurrency-product"
+
+
+async def main(n: int = 50) -> bool:
+    await ensure_indexes()
+    repos = await get_repositories()
+    products = repos.products.collection
+    cart_collection = repos.carts.collection
+    await products.update_one(
+        {"name": PRODUCT},
+        {"$set": {"name": PRODUCT, "price": 10, "img": "", "description": ""}},
+        upsert=True,
+    )
+    await cart_collection.delete_many({"account": ACCOUNT})
+
+    app = FastAPI()
+    app.state.repos = repos
+    app.include_router(carts.router)
+    app.dependency_overrides[get_current_user] = lambda: {"account": ACCOUNT}
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            responses = await asyncio.gather(*[
+                client.post("/api/cart", json={"name": PRODUCT, "quantity": 1}) for _ in range(n)
+            ])
+            assert all(r.status_code == 201 for r in responses), [r.text for r in responses if r.status_code != 201]
+            cart = (await client.get("/api/cart")).json()
+    finally:
+        await products.delete_one({"name": PRODUCT})
+        await cart_collection.delete_many({"account": ACCOUNT})
+        await close_client()
+
+    quantity = sum(i["quantity"] for i in cart["cart"] if i["name"] == PRODUCT)
+    print(f"{n} parallel adds -> quantity {quantity}")
+    return quantity == n
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
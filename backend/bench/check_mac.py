@@ -0,0 +1,49 @@
+"""
+CheckMacValue：舊版（deepcopy + OrderedDict + 整串 quote_plus）vs CheckMacSigner。
+先用隨機參數確認兩邊輸出逐位元相同，再比較每次呼叫的時間。
+
+    cd backend && python -m bench.check_mac
+"""
+import logging
+import random
+import timeit
+
+from app.core.ECpay.ECpay_sdk import ECPayPaymentSdk
+from tests.ecpay_legacy import (
+    HASH_IV, HASH_KEY, MERCHANT_ID,
+    checkout_params, legacy_check_value, legacy_check_value_for_notify, notify_form, random_params,
+)
+
+
+def verify_identical(sdk, cases=5000):
+    rng = random.Random(20260101)
+    samples = [checkout_params(i) for i in range(50)] + [notify_form(i) for i in range(50)]
+    samples += [random_params(rng) for _ in range(cases)]
+    for p in samples:
+        assert sdk.generate_check_value(p) == legacy_check_value(p), p
+        assert sdk.generate_check_value_for_notify(p) == legacy_check_value_for_notify(p), p
+    return len(samples)
+
+
+def main(number: int = 20000) -> dict:
+    logging.getLogger("ecpay").setLevel(logging.INFO)  # 跟 app 內一樣（carts.py），不印 debug
+    sdk = ECPayPaymentSdk(MerchantID=MERCHANT_ID, HashKey=HASH_KEY, HashIV=HASH_IV)
+    checked = verify_identical(sdk)
+    print(f"byte-for-byte identical on {checked} parameter sets")
+
+    params, form = checkout_params(), notify_form()
+    form["CheckMacValue"] = legacy_check_value_for_notify(form)
+    cases = {
+        "sign_legacy": lambda: legacy_check_value(params),
+        "sign_signer": lambda: sdk.generate_check_value(params),
+        "notify_legacy": lambda: legacy_check_value_for_notify(form) == form["CheckMacValue"],
+        "notify_signer": lambda: sdk.verify_notify_mac(form),
+    }
+    results = {name: min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6 for name, fn in cases.items()}
+    for name, us in results.items():
+        print(f"{name:>14}: {us:8.2f} µs/call")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+每個請求解析 collection dependency 的成本：舊的 Depends(*_col)（每次 await get_client / get_db 再建 collection）
+vs 現在 lifespan 建好放在 app.state.repos 的 repository。不需要 mongod（不會真的下查詢）。
+
+    cd backend && python -m bench.deps
+"""
+import asyncio
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+
+from app.api.deps import carts_repo, orders_repo, products_repo
+from app.core.db import close_client, get_db
+from app.crud import get_repositories
+
+
+# 改版前的 provider（結帳這類路由一次要三個）
+async def legacy_carts_col():
+    return (await get_db())["carts"]
+
+async def legacy_orders_col():
+    return (await get_db())["orders"]
+
+async def legacy_products_col():
+    return (await get_db())["products"]
+
+
+def _app(repos) -> FastAPI:
+    app = FastAPI()
+    app.state.repos = repos
+
+    @app.get("/legacy")
+    async def legacy(carts=Depends(legacy_carts_col), orders=Depends(legacy_orders_col),
+                     products=Depends(legacy_products_col)):
+        return None
+
+    @app.get("/repos")
+    async def repositories(carts=Depends(carts_repo), orders=Depends(orders_repo),
+                           products=Depends(products_repo)):
+        return None
+
+    @app.get("/none")
+    async def baseline():
+        return None
+
+    return app
+
+
+async def _run(number: int) -> dict:
+    app = _app(await get_repositories())
+    results = {}
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for path in ("/none", "/legacy", "/repos"):
+                for _ in range(200):  # 暖機
+                    await client.get(path)
+                best = float("inf")
+                for _ in range(3):
+                    started = time.perf_counter()
+                    for _ in range(number):
+                        await client.get(path)
+                    best = min(best, time.perf_counter() - started)
+                results[path.strip("/")] = best / number * 1e6  # µs / request
+    finally:
+        await close_client()
+    return results
+
+
+def main(number: int = 3000) -> dict:
+    results = asyncio.run(_run(number))
+    for name, us in results.items():
+        print(f"{name:>8}: {us:8.2f} µs/request  (deps: {us - results['none']:7.2f} µs)")
+    return results
+
+
+if __name__ == "__main__":
+    main()
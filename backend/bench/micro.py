@@ -0,0 +1,116 @@
+"""
+熱點函式的 micro-benchmark：CheckMacValue 簽章 / 驗章、decode_jwt（快取 / 不快取）、cart_totals、
+回應編碼（jsonable_encoder + JSONResponse 對 ORJSONResponse，200 個商品 / 100 筆訂單）、
+商品搜尋（5000 個商品的倒排索引：全文檢索 / 自動完成）。
+不需要 mongod。每個 case 跑 rounds 批、每批 batch 次，用「每批平均」當一個樣本算 p50 / p95 / p99（µs / call）。
+
+    cd backend && python -m bench.micro
+"""
+import gc
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core import security
+from app.core.ECpay.ECpay_sdk import ECPayPaymentSdk
+from app.core.images import with_srcset
+from app.core.responses import ORJSONResponse
+from app.core.search import SearchIndex
+from app.crud import cart_totals
+from bench.check_mac import HASH_IV, HASH_KEY, MERCHANT_ID, checkout_params, notify_form
+from bench.report import summarize
+
+
+def _time(fn: Callable[[], object], *, rounds: int, batch: int) -> Dict[str, float]:
+    for _ in range(batch):  # 暖機
+        fn()
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            for _ in range(batch):
+                fn()
+            samples.append((time.perf_counter() - t0) / batch)
+        elapsed = time.perf_counter() - started
+    finally:
+        if gc_enabled:
+            gc.enable()
+    result = summarize(samples, elapsed, unit=1e6)
+    # throughput 以「次呼叫」計
+    result["count"] = rounds * batch
+    result["throughput"] = round(rounds * batch / elapsed, 2)
+    return result
+
+
+def cases() -> Dict[str, Callable[[], object]]:
+    logging.getLogger("ecpay").setLevel(logging.INFO)  # 跟 app 內一樣（carts.py），不印 debug
+    sdk = ECPayPaymentSdk(MerchantID=MERCHANT_ID, HashKey=HASH_KEY, HashIV=HASH_IV)
+    params = checkout_params()
+    form = notify_form()
+    form["CheckMacValue"] = sdk.generate_check_value_for_notify(form)
+
+    token = security.create_jwt({"account": "bench", "username": "bench", "level": 0})
+
+    items = [{"name": f"p{i}", "price": 100 + i, "quantity": 1 + i % 3} for i in range(10)]
+    stored = {"items": items, **cart_totals({"items": items})}
+    legacy = {"items": items}  # 沒存 subtotal / count 的舊文件 → 現算
+
+    # /api/products?view=full&limit=... 的回應形狀
+    products = {"products": [
+        with_srcset({"name": f"商品 {i}", "price": 50 + i, "img": f"/image/p{i}.jpg", "description": "說明" * 20})
+        for i in range(200)
+    ], "viewer": "bench", "next_cursor": "bench-cursor"}
+    # /api/products/search：中英混合的名稱 / 描述
+    words = ["tea", "milk", "coffee", "latte", "green", "black", "oolong", "matcha", "cake", "bread"]
+    flavors = ["珍珠奶茶", "烏龍茶", "抹茶拿鐵", "黑糖鮮奶", "紅茶", "咖啡", "蛋糕", "麵包"]
+    index = SearchIndex([
+        {"name": f"{flavors[i % 8]} {words[i % 10]} {i}", "price": i,
+         "description": f"{words[(i * 3) % 10]} {words[(i * 7) % 10]} {flavors[(i * 5) % 8]}，每日現做"}
+        for i in range(5000)
+    ])
+
+    # /api/orders：createdAt 是 datetime
+    now = datetime.now(timezone.utc)
+    orders = {"orders": [
+        {"orderNo": f"ODR{i:012d}", "status": "paid", "amount": 300, "count": 3, "items": items[:3],
+         "createdAt": now - timedelta(minutes=i)}
+        for i in range(100)
+    ], "next_cursor": None}
+
+    return {
+        "generate_check_value": lambda: sdk.generate_check_value(params),
+        "verify_notify_mac": lambda: sdk.verify_notify_mac(form),
+        "decode_jwt_cached": lambda: security.decode_jwt(token),
+        "decode_jwt_uncached": lambda: security._decode_uncached(token),
+        "cart_totals_stored": lambda: cart_totals(stored),
+        "cart_totals_recompute": lambda: cart_totals(legacy),
+        # 之前的路徑：回 dict → jsonable_encoder 走一遍 → json.dumps
+        "encode_products_jsonable": lambda: JSONResponse(jsonable_encoder(products)).body,
+        "encode_products_orjson": lambda: ORJSONResponse(products).body,
+        "encode_orders_jsonable": lambda: JSONResponse(jsonable_encoder(orders)).body,
+        "encode_orders_orjson": lambda: ORJSONResponse(orders).body,
+        "search_text": lambda: index.search("奶茶 tea"),
+        "search_prefix": lambda: index.complete("抹茶"),
+    }
+
+
+def run(*, rounds: int = 200, batch: int = 200) -> Dict[str, Dict[str, float]]:
+    return {name: _time(fn, rounds=rounds, batch=batch) for name, fn in cases().items()}
+
+
+def main() -> Dict[str, Dict[str, float]]:
+    results = run()
+    for name, r in results.items():
+        print(f"{name:>25}: p50 {r['p50']:8.2f}  p95 {r['p95']:8.2f}  p99 {r['p99']:8.2f} µs/call")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+bench 共用的統計與輸出：延遲樣本 → throughput / p50 / p95 / p99，結果存成可以在 commit 之間 diff 的 JSON。
+"""
+import json
+import math
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    """nearest-rank 百分位數；samples 要先排序。"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(sorted_samples)) - 1, 0)
+    return sorted_samples[rank]
+
+
+def summarize(latencies: List[float], elapsed: float, *, unit: float = 1e3, errors: int = 0) -> Dict[str, Any]:
+    """latencies / elapsed 以秒為單位；unit=1e3 → 輸出毫秒，1e6 → 微秒。"""
+    samples = sorted(latencies)
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "throughput": round(len(samples) / elapsed, 2) if elapsed > 0 else 0.0,  # 次 / 秒
+        "mean": round(sum(samples) / len(samples) * unit, 3) if samples else 0.0,
+        "p50": round(percentile(samples, 50) * unit, 3),
+        "p95": round(percentile(samples, 95) * unit, 3),
+        "p99": round(percentile(samples, 99) * unit, 3),
+    }
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "commit": _commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def write(report: Dict[str, Any], out: Optional[str]) -> None:
+    text = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True)
+    if out:
+        Path(out).write_text(text + "\n", encoding="utf-8")
+    print(text)
@@ -0,0 +1,53 @@
+"""
+整套 benchmark：micro-benchmark（不需要 mongod）+ 壓測情境（需要 mongod 或 --base-url），
+輸出一份 JSON（含 commit / Python 版本），存下來跟其他 commit 的結果 diff。
+
+    cd backend && python -m bench.run --out bench-$(git rev-parse --short HEAD).json
+    cd backend && python -m bench.run --micro-only
+"""
+import argparse
+import asyncio
+
+from bench import micro, scenarios
+from bench.report import environment, write
+
+
+async def _load(args) -> dict:
+    if args.seed and not args.base_url:
+        from app.core.db import close_client, ensure_indexes
+        from app.crud import get_repositories
+        from bench.seed import reset, seed
+        try:
+            await ensure_indexes()
+            repos = await get_repositories()
+            await reset(repos)
+            await seed(repos, users=args.users, products=args.products)
+        finally:
+            await close_client()
+    return await scenarios.run(
+        users=args.users, iterations=args.iterations, products=args.products, base_url=args.base_url,
+    )
+
+
+def main() -> dict:
+    parser = argparse.ArgumentParser(description="Run micro-benchmarks and load scenarios, report JSON.")
+    scenarios.add_arguments(parser)
+    parser.add_argument("--micro-only", action="store_true", help="skip the scenarios (no mongod needed)")
+    parser.add_argument("--seed", action="store_true", help="reset and seed bench data before the scenarios")
+    parser.add_argument("--out", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {
+        "environment": environment(),
+        "micro": micro.run(),  # µs / call
+        "params": {"users": args.users, "iterations": args.iterations, "products": args.products,
+                   "target": args.base_url or "in-process"},
+    }
+    if not args.micro_only:
+        report["scenarios"] = asyncio.run(_load(args))  # ms / request
+    write(report, args.out)
+    return report
+
+
+if __name__ == "__main__":
+    main()
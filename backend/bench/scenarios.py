@@ -0,0 +1,151 @@
+"""
+店面 / 付款流程的壓測情境。每個 virtual user（bench.seed 建的 bench-user-<i>）：
+登入一次，之後每一輪 瀏覽商品 → 加入購物車 → 改數量 → 結帳 → 送出帶正確 CheckMacValue 的 /payment/notify → 重送同一則通知。
+
+預設在同一個行程裡透過 ASGI 直接打 app（跑完整 lifespan，不經過網路），需要 mongod；
+--base-url 則打一台已經在跑的服務（ECPay 金鑰要跟那台一樣）。先跑 python -m bench.seed。
+
+    cd backend && python -m bench.scenarios --users 20 --iterations 10
+"""
+import argparse
+import asyncio
+import secrets
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from bench.report import summarize
+from bench.seed import PASSWORD, product_name, user_account
+
+SCENARIOS = (
+    "login", "browse_catalog", "browse_page", "add_to_cart", "set_quantity",
+    "checkout", "notify", "notify_replay",
+)
+
+
+class Recorder:
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, scenario: str, client: httpx.AsyncClient, method: str, url: str,
+                      *, ok=lambda r: r.is_success, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[scenario] += 1
+            return None
+        self.latencies[scenario].append(time.perf_counter() - started)
+        if not ok(response):
+            self.errors[scenario] += 1
+            return None
+        return response
+
+    def report(self, elapsed: float) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: summarize(self.latencies[name], elapsed, errors=self.errors[name])
+            for name in SCENARIOS if self.latencies[name] or self.errors[name]
+        }
+
+
+def notify_form(sdk, fields: Dict[str, Any]) -> Dict[str, str]:
+    """模擬 ECPay 付款成功通知（CheckMacValue 用跟 app 同一組金鑰算）。"""
+    form = {
+        "MerchantID": str(fields.get("MerchantID", "")),
+        "MerchantTradeNo": fields["MerchantTradeNo"],
+        "RtnCode": "1",
+        "RtnMsg": "交易成功",
+        "TradeNo": "BENCH" + secrets.token_hex(6).upper(),
+        "TradeAmt": str(fields["TotalAmount"]),
+        "PaymentDate": time.strftime("%Y/%m/%d %H:%M:%S"),
+        "PaymentType": "Credit_CreditCard",
+        "PaymentTypeChargeFee": "0",
+        "TradeDate": fields.get("MerchantTradeDate", ""),
+        "SimulatePaid": "1",
+    }
+    form["CheckMacValue"] = sdk.generate_check_value_for_notify(form)
+    return form
+
+
+async def virtual_user(client: httpx.AsyncClient, rec: Recorder, sdk, i: int, *,
+                       iterations: int, products: int) -> None:
+    login = await rec.request(
+        "login", client, "POST", "/api/login", json={"account": user_account(i), "password": PASSWORD},
+    )
+    if login is None:
+        return
+    headers = {"Authorization": f"Bearer {login.json()['token']}"}
+
+    for n in range(iterations):
+        name = product_name((i * iterations + n) % products)
+        await rec.request("browse_catalog", client, "GET", "/api/products", headers=headers)
+        await rec.request("browse_page", client, "GET", "/api/products",
+                          params={"view": "list", "limit": 20}, headers=headers)
+        await rec.request("add_to_cart", client, "POST", "/api/cart",
+                          json={"name": name, "quantity": 1}, headers=headers)
+        await rec.request("set_quantity", client, "PATCH", f"/api/cart/items/{name}",
+                          json={"quantity": 2}, headers=headers)
+        checkout = await rec.request("checkout", client, "POST", "/api/checkout", headers=headers)
+        if checkout is None:
+            continue
+        form = notify_form(sdk, checkout.json()["fields"])
+        acknowledged = lambda r: r.is_success and r.text == "1|OK"
+        await rec.request("notify", client, "POST", "/payment/notify", data=form, ok=acknowledged)
+        # ECPay 沒收到 1|OK 會重送：同一則通知第二次要走冪等路徑
+        await rec.request("notify_replay", client, "POST", "/payment/notify", data=form, ok=acknowledged)
+
+
+@asynccontextmanager
+async def _client(base_url: Optional[str]):
+    if base_url:
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            yield client
+        return
+    from app.main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30) as client:
+            yield client
+
+
+async def run(*, users: int = 20, iterations: int = 10, products: int = 200,
+              base_url: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    from app.api.routes.carts import sdk
+
+    rec = Recorder()
+    async with _client(base_url) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            virtual_user(client, rec, sdk, i, iterations=iterations, products=products) for i in range(users)
+        ))
+        elapsed = time.perf_counter() - started
+    return rec.report(elapsed)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--users", type=int, default=20, help="virtual users (must be <= seeded users)")
+    parser.add_argument("--iterations", type=int, default=10, help="storefront rounds per virtual user")
+    parser.add_argument("--products", type=int, default=200, help="seeded product count")
+    parser.add_argument("--base-url", help="hit a running server instead of the in-process app")
+
+
+def main() -> Dict[str, Dict[str, Any]]:
+    parser = argparse.ArgumentParser(description="Run storefront / payment load scenarios.")
+    add_arguments(parser)
+    args = parser.parse_args()
+    results = asyncio.run(run(
+        users=args.users, iterations=args.iterations, products=args.products, base_url=args.base_url,
+    ))
+    for name, r in results.items():
+        print(f"{name:>15}: {r['count']:6d} req  {r['throughput']:8.1f}/s  "
+              f"p50 {r['p50']:7.2f}  p95 {r['p95']:7.2f}  p99 {r['p99']:7.2f} ms  errors {r['errors']}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+壓測資料：N 個使用者（bench-user-<i>，密碼都是 PASSWORD）、M 個商品（bench-product-<i>）、每個使用者一台 active 購物車。
+以 upsert 寫入，重跑不會重複；--reset 先清掉上次壓測留下的 bench-* 資料（含訂單、保留、付款通知）。
+需要 mongod（MONGO_URL / MONGO_DB）。
+
+    cd backend && python -m bench.seed --users 50 --products 200
+"""
+import argparse
+import asyncio
+from typing import Dict
+
+from pymongo import UpdateOne
+
+from app.core.db import close_client, ensure_indexes
+from app.core.security import hash_password
+from app.crud import CART_REV_INC, Repositories, cart_totals, get_repositories
+
+PREFIX = "bench-"
+PASSWORD = "bench-password"
+_PREFIX_FILTER = {"$regex": f"^{PREFIX}"}
+
+
+def user_account(i: int) -> str:
+    return f"{PREFIX}user-{i}"
+
+
+def product_name(i: int) -> str:
+    return f"{PREFIX}product-{i}"
+
+
+async def reset(repos: Repositories) -> None:
+    order_nos = await repos.orders.collection.distinct("orderNo", {"account": _PREFIX_FILTER})
+    await repos.ecpay_inbox.delete_many({"MerchantTradeNo": {"$in": order_nos}})
+    await repos.orders.reservations.delete_many({"account": _PREFIX_FILTER})
+    await repos.orders.collection.delete_many({"account": _PREFIX_FILTER})
+    await repos.refresh_tokens.collection.delete_many({"account": _PREFIX_FILTER})
+    await repos.carts.collection.delete_many({"account": _PREFIX_FILTER})
+    await repos.users.collection.delete_many({"account": _PREFIX_FILTER})
+    await repos.products.collection.delete_many({"name": _PREFIX_FILTER})
+    await repos.products.bump_version()
+
+
+async def seed(repos: Repositories, *, users: int, products: int, cart_items: int = 3) -> Dict[str, int]:
+    # bcrypt 很慢：雜湊一次，所有壓測帳號共用
+    hashed = await hash_password(PASSWORD)
+    if users:
+        await repos.users.collection.bulk_write([
+            UpdateOne({"account": user_account(i)}, {"$set": {
+                "account": user_account(i),
+                "username": f"Bench User {i}",
+                "password": hashed,
+                "phone": f"{PREFIX}{i:08d}",
+                "email": f"{PREFIX}{i}@example.com",
+                "level": 0,
+            }}, upsert=True)
+            for i in range(users)
+        ], ordered=False)
+
+    catalog = [
+        {"name": product_name(i), "price": 50 + (i * 37) % 950, "img": "", "description": f"bench product {i}"}
+        for i in range(products)
+    ]
+    if catalog:
+        await repos.products.collection.bulk_write([
+            UpdateOne({"name": p["name"]}, {"$set": p}, upsert=True) for p in catalog
+        ], ordered=False)
+        # 直接寫 collection 沒經過 ProductRepository：目錄版本要自己加，不然 ETag 還是舊的
+        await repos.products.bump_version()
+
+    carts = []
+    for i in range(users):
+        items = []
+        for k in range(min(cart_items, products)):
+            p = catalog[(i * cart_items + k) % products]
+            items.append({"name": p["name"], "price": p["price"], "quantity": 1 + (i + k) % 3, "img": p["img"]})
+        carts.append(UpdateOne(
+            {"account": user_account(i), "status": "active"},
+            {"$set": {"items": items, **cart_totals({"items": items})}, "$inc": CART_REV_INC},
+            upsert=True,
+        ))
+    if carts:
+        await repos.carts.collection.bulk_write(carts, ordered=False)
+    return {"users": users, "products": products, "carts": len(carts)}
+
+
+async def _run(args) -> None:
+    try:
+        await ensure_indexes()
+        repos = await get_repositories()
+        if args.reset:
+            await reset(repos)
+        print(await seed(repos, users=args.users, products=args.products))
+    finally:
+        await close_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed bench users, products and carts.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--reset", action="store_true", help="remove previous bench-* data first")
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
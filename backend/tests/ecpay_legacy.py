@@ -0,0 +1,90 @@
+"""
+改寫前 BasePayment 的 CheckMacValue 實作（deepcopy + OrderedDict + 整串 quote_plus），作為 CheckMacSigner 的對照組，
+加上產生測試參數的幾個函式。tests/test_ecpay_mac.py 跟 bench/check_mac.py 共用。
+"""
+import collections
+import copy
+import hashlib
+import string
+from urllib.parse import quote_plus
+
+MERCHANT_ID, HASH_KEY, HASH_IV = "3002607", "pwFHCqoQZGmho4w6", "EkRm7iFT261dpevs"
+
+
+def legacy_check_value(params, merchant_id=MERCHANT_ID, hash_key=HASH_KEY, hash_iv=HASH_IV):
+    _params = copy.deepcopy(params)
+    _params.pop('CheckMacValue', None)
+    _params['MerchantID'] = merchant_id
+    ordered = collections.OrderedDict(sorted(_params.items(), key=lambda kv: kv[0].lower()))
+    raw = f"HashKey={hash_key}&"
+    raw += ''.join([f"{k}={'' if v is None else str(v)}&" for k, v in ordered.items()])
+    raw += f"HashIV={hash_iv}"
+    encoded = quote_plus(raw, safe='-_.!*()').lower()
+    et = int(_params.get('EncryptType', 1))
+    h = hashlib.sha256 if et == 1 else hashlib.md5
+    return h(encoded.encode('utf-8')).hexdigest().upper()
+
+
+def legacy_check_value_for_notify(params, hash_key=HASH_KEY, hash_iv=HASH_IV):
+    _p = copy.deepcopy(params)
+    for k in list(_p.keys()):
+        if k in {"CheckMacValue", "card4no", "card6no", "gwsr", "auth_code", "eci", "stage", "staed", "stast"}:
+            _p.pop(k, None)
+    if "TradeAmt" in _p and "amount" in _p:
+        _p.pop("amount", None)
+    for k, v in list(_p.items()):
+        if v is None or str(v) == "":
+            _p.pop(k, None)
+    ordered = collections.OrderedDict(sorted(_p.items(), key=lambda kv: kv[0].lower()))
+    raw = f"HashKey={hash_key}&" + "".join(f"{k}={str(v)}&" for k, v in ordered.items()) + f"HashIV={hash_iv}"
+    encoded = quote_plus(raw, safe='-_.!*()').lower()
+    et = int(_p.get("EncryptType", 1))
+    h = hashlib.sha256 if et == 1 else hashlib.md5
+    return h(encoded.encode("utf-8")).hexdigest().upper()
+
+
+def checkout_params(i=0):
+    return {
+        "MerchantTradeNo": f"ODR20260101{i:08X}",
+        "MerchantTradeDate": "2026/01/01 12:00:00",
+        "PaymentType": "aio",
+        "TotalAmount": 1280 + i,
+        "TradeDesc": "TEST ORDER",
+        "ItemName": "巧克力麻糬#抹茶麻糬#草莓大福",
+        "ChoosePayment": "ALL",
+        "ReturnURL": "https://example.com/payment/notify",
+        "OrderResultURL": "https://example.com/payment/return",
+        "ClientBackURL": "https://example.com/",
+        "NeedExtraPaidInfo": "Y",
+        "EncryptType": 1,
+        "MerchantID": MERCHANT_ID,
+    }
+
+
+def notify_form(i=0):
+    return {
+        "CustomField1": "", "CustomField2": "", "CustomField3": "", "CustomField4": "",
+        "MerchantID": MERCHANT_ID, "MerchantTradeNo": f"ODR20260101{i:08X}",
+        "PaymentDate": "2026/01/01 12:01:00", "PaymentType": "Credit_CreditCard",
+        "PaymentTypeChargeFee": "26", "RtnCode": "1", "RtnMsg": "交易成功", "SimulatePaid": "0",
+        "StoreID": "", "TradeAmt": str(1280 + i), "amount": str(1280 + i), "TradeDate": "2026/01/01 12:00:00",
+        "TradeNo": f"2601011200{i:06d}", "card4no": "2222", "card6no": "431195", "gwsr": "12345",
+        "auth_code": "777777", "eci": "0", "process_date": "2026/01/01 12:01:00",
+    }
+
+
+def random_params(rng):
+    alphabet = string.ascii_letters + string.digits + " -_.!*()~'&=+/?#%中文麻糬"
+    params = {}
+    for _ in range(rng.randint(1, 25)):
+        key = "".join(rng.choice(string.ascii_letters + "_") for _ in range(rng.randint(1, 12)))
+        value = rng.choice([
+            None, "", rng.randint(-5, 10 ** 6),
+            "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 80))),
+        ])
+        params[key] = value
+    params["EncryptType"] = rng.choice([0, 1, "1"])
+    if rng.random() < 0.5:
+        params["TradeAmt"] = str(rng.randint(1, 9999))
+        params["amount"] = params["TradeAmt"]
+    return params
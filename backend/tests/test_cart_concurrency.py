@@ -0,0 +1,120 @@
+"""
+購物車並行寫入：同一個帳號同時送很多個加入 / 移除，數量不能遺失，而且永遠只有一台 active 購物車。
+需要真的 mongod（update pipeline、partial unique index 都要 server 端執行）；連不上就 skip。
+每個測試用一個用完即丟的 database，不碰 MONGO_DB 的資料。
+"""
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from pymongo import AsyncMongoClient
+from pymongo.errors import PyMongoError
+
+from app.api.deps import get_current_user
+from app.api.routes import carts
+from app.core.catalog import catalog
+from app.core.config import settings
+from app.core.db import INDEXES, MONGO_URL
+from app.crud import Repositories
+
+ACCOUNT = "concurrency"
+N = 40
+
+
+@asynccontextmanager
+async def cart_app():
+    client = AsyncMongoClient(MONGO_URL, serverSelectionTimeoutMS=1000)
+    try:
+        await client.admin.command("ping")
+    except PyMongoError as e:
+        await client.close()
+        pytest.skip(f"mongod not available at {MONGO_URL} ({type(e).__name__})")
+
+    db = client[f"{settings.MONGO_DB}_test_{uuid.uuid4().hex[:8]}"]
+    try:
+        for name in ("carts", "products"):
+            await db[name].create_indexes(INDEXES[name])
+        repos = Repositories(db)
+        await repos.products.collection.insert_many([
+            {"name": name, "price": price, "img": "", "description": ""}
+            for name, price in (("mochi", 30), ("daifuku", 45), ("dango", 20))
+        ])
+        # 商品目錄是行程內的快照，換了 database 要重新載入；
+        # 先載入好，並行的請求就不會去搶 catalog 的 lock（每個測試各自一個 event loop）
+        catalog.invalidate()
+        assert await repos.products.get_cached("mochi") is not None
+
+        app = FastAPI()
+        app.state.repos = repos
+        app.include_router(carts.router)
+        app.dependency_overrides[get_current_user] = lambda: {"account": ACCOUNT}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            yield http, repos
+    finally:
+        catalog.invalidate()
+        await client.drop_database(db.name)
+        await client.close()
+
+
+def add(http, name, quantity=1):
+    return http.post("/api/cart", json={"name": name, "quantity": quantity})
+
+
+def remove(http, name):
+    return http.delete(f"/api/cart/items/{name}")
+
+
+async def active_carts(repos):
+    return await repos.carts.collection.find({"account": ACCOUNT, "status": "active"}).to_list(length=None)
+
+
+def assert_consistent(cart):
+    # subtotal / count 跟 items 在同一次寫入裡算好，並行之後也要對得上
+    items = cart["items"]
+    assert cart["subtotal"] == sum(i["price"] * i["quantity"] for i in items)
+    assert cart["count"] == sum(i["quantity"] for i in items)
+    assert len({i["name"] for i in items}) == len(items)
+
+
+def test_concurrent_adds_on_empty_cart_create_one_cart_and_lose_nothing():
+    async def scenario():
+        async with cart_app() as (http, repos):
+            # 第一次加入同時建立購物車：ux_account_active 擋下的那些要重試成累加
+            responses = await asyncio.gather(*(add(http, name) for _ in range(N) for name in ("mochi", "daifuku")))
+            assert [r.status_code for r in responses] == [201] * (2 * N)
+
+            (cart,) = await active_carts(repos)
+            assert {i["name"]: i["quantity"] for i in cart["items"]} == {"mochi": N, "daifuku": N}
+            assert_consistent(cart)
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_adds_and_removes_keep_quantities_and_single_active_cart():
+    async def scenario():
+        async with cart_app() as (http, repos):
+            for name in ("mochi", "daifuku"):
+                assert (await add(http, name)).status_code == 201
+
+            # mochi 一直累加；daifuku 同時被移除好幾次（只有一個會成功）；dango 第一次加入
+            responses = await asyncio.gather(
+                *(add(http, "mochi", 2) for _ in range(N)),
+                *(remove(http, "daifuku") for _ in range(5)),
+                *(add(http, "dango") for _ in range(N)),
+            )
+            statuses = [r.status_code for r in responses]
+            assert statuses[:N] == [201] * N
+            assert sorted(statuses[N:N + 5]) == [200, 404, 404, 404, 404]
+            assert statuses[N + 5:] == [201] * N
+
+            (cart,) = await active_carts(repos)
+            assert {i["name"]: i["quantity"] for i in cart["items"]} == {"mochi": 1 + 2 * N, "dango": N}
+            assert_consistent(cart)
+
+            body = (await http.get("/api/cart")).json()
+            assert body["total"] == {"subtotal": cart["subtotal"], "count": cart["count"]}
+
+    asyncio.run(scenario())
@@ -0,0 +1,128 @@
+"""CheckoutSweeper：改成 expired 之後、放回商品之前出錯，下一輪要把商品補放回去，不能弄丟。"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+from app.core.checkout_expiry import CheckoutSweeper
+from app.crud import OrderRepository
+
+
+def _matches(doc, filter_):
+    for key, cond in filter_.items():
+        value = doc.get(key)
+        if isinstance(cond, dict):
+            if "$in" in cond and value not in cond["$in"]:
+                return False
+            if "$lte" in cond and not value <= cond["$lte"]:
+                return False
+            if "$exists" in cond and (key in doc) != cond["$exists"]:
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs.sort(key=lambda d: d[key], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class Collection:
+    """只實作 sweeper / OrderRepository 會用到的那幾個操作。"""
+
+    def __init__(self, docs):
+        self.docs = [dict(d) for d in docs]
+
+    def find(self, filter_, projection=None):
+        return Cursor([dict(d) for d in self.docs if _matches(d, filter_)])
+
+    async def update_many(self, filter_, update):
+        hits = [d for d in self.docs if _matches(d, filter_)]
+        for d in hits:
+            d.update(update["$set"])
+        return SimpleNamespace(modified_count=len(hits))
+
+    async def update_one(self, filter_, update):
+        for d in self.docs:
+            if _matches(d, filter_):
+                d.update(update["$set"])
+                return SimpleNamespace(modified_count=1)
+        return SimpleNamespace(modified_count=0)
+
+    async def delete_many(self, filter_):
+        self.docs = [d for d in self.docs if not _matches(d, filter_)]
+
+
+class Carts:
+    def __init__(self, fail_times=0):
+        self.fail_times = fail_times
+        self.restored = []
+
+    async def restore_items(self, account, items):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise AutoReconnect("connection reset")
+        self.restored.append((account, items))
+        return True
+
+    async def take_back_items(self, account, items):
+        return True
+
+
+ITEMS = [{"name": "mochi", "price": 30, "quantity": 2}]
+
+
+@pytest.fixture
+def repos():
+    past = datetime.now(timezone.utc) - timedelta(minutes=1)
+    orders = Collection([
+        {"orderNo": "A", "account": "u", "status": "pending", "items": ITEMS},
+        {"orderNo": "B", "account": "v", "status": "paid", "items": ITEMS},
+    ])
+    reservations = Collection([{"_id": "A", "expires_at": past}, {"_id": "B", "expires_at": past}])
+    return SimpleNamespace(orders=OrderRepository(orders, reservations), carts=Carts(fail_times=1))
+
+
+def test_failure_between_expire_and_restore_is_recovered_next_round(repos):
+    sweeper = CheckoutSweeper()
+
+    with pytest.raises(AutoReconnect):
+        asyncio.run(sweeper.sweep(repos))
+    # 已經改成 expired，但商品還沒放回；保留也還在
+    assert repos.orders.collection.docs[0]["status"] == "expired"
+    assert repos.carts.restored == []
+    assert {r["_id"] for r in repos.orders.reservations.docs} == {"A", "B"}
+
+    asyncio.run(sweeper.sweep(repos))
+    assert repos.carts.restored == [("u", ITEMS)]
+    assert repos.orders.collection.docs[0]["items_restored"] is True
+    assert repos.orders.reservations.docs == []
+
+    # 再掃一次不會重複放回
+    asyncio.run(sweeper.sweep(repos))
+    assert repos.carts.restored == [("u", ITEMS)]
+
+
+def test_order_without_account_is_skipped_not_retried_forever(repos):
+    repos.carts.fail_times = 0
+    del repos.orders.collection.docs[0]["account"]
+
+    asyncio.run(CheckoutSweeper().sweep(repos))
+
+    assert repos.carts.restored == []
+    assert repos.orders.collection.docs[0]["restore_skipped"] is True
+    assert repos.orders.reservations.docs == []
@@ -0,0 +1,85 @@
+"""ensure_indexes 建唯一索引之前，既有資料有重複要列出是哪些 key，而不是只丟一個 DuplicateKeyError。"""
+import asyncio
+from collections import Counter
+
+import pytest
+
+from app.core.db import check_unique_indexes
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class Collection:
+    """只實作 check_unique_indexes 會用到的 list_indexes / aggregate（$match 等值、$group 計數）。"""
+
+    def __init__(self, docs=(), indexes=()):
+        self.docs = list(docs)
+        self.indexes = [{"name": "_id_"}] + [{"name": name} for name in indexes]
+        self.pipelines = []
+
+    async def list_indexes(self):
+        return Cursor(self.indexes)
+
+    async def aggregate(self, pipeline, **kwargs):
+        self.pipelines.append(pipeline)
+        docs = self.docs
+        match = pipeline[0]["$match"] if "$match" in pipeline[0] else {}
+        docs = [d for d in docs if all(d.get(k) == v for k, v in match.items())]
+        group = next(stage["$group"] for stage in pipeline if "$group" in stage)
+        fields = [expr["$ifNull"][0][1:] for expr in group["_id"].values()]
+        counts = Counter(tuple(d.get(f) for f in fields) for d in docs)
+        return Cursor([
+            {"_id": dict(zip(fields, key)), "count": n}
+            for key, n in counts.most_common() if n > 1
+        ])
+
+
+class Database(dict):
+    def __missing__(self, name):
+        return self.setdefault(name, Collection())
+
+
+def test_duplicates_are_reported_with_their_keys():
+    db = Database(
+        users=Collection([
+            {"account": "amy", "email": "a@x", "phone": "1"},
+            {"account": "amy", "email": "b@x", "phone": "2"},
+            {"account": "bob", "email": "b@x"},
+            {"account": "cat", "email": "c@x"},
+        ]),
+        carts=Collection([
+            {"account": "amy", "status": "active"},
+            {"account": "amy", "status": "active"},
+            {"account": "bob", "status": "active"},
+            {"account": "bob", "status": "paid"},
+        ]),
+    )
+
+    with pytest.raises(RuntimeError) as e:
+        asyncio.run(check_unique_indexes(db))
+
+    message = str(e.value)
+    assert "users.ux_account {'account': 'amy'} x2" in message
+    assert "users.ux_email {'email': 'b@x'} x2" in message
+    # bob、cat 都沒有 phone：缺欄位在唯一索引裡都算 null
+    assert "users.ux_phone {'phone': None} x2" in message
+    # partial index 只看 active 的購物車
+    assert "carts.ux_account_active {'account': 'amy'} x2" in message
+    assert "'bob'" not in message.split("carts.ux_account_active", 1)[1]
+
+
+def test_existing_unique_indexes_are_not_rescanned():
+    db = Database(users=Collection(
+        [{"account": "amy", "email": "a@x", "phone": "1"}] * 2,
+        indexes=["ux_account", "ux_email", "ux_phone"],
+    ))
+
+    asyncio.run(check_unique_indexes(db))
+
+    assert db["users"].pipelines == []
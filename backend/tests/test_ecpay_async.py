@@ -0,0 +1,126 @@
+"""AsyncECPayClient 的重試 / 退避：用 httpx.MockTransport 當 ECPay，不連外。"""
+import asyncio
+from urllib.parse import urlencode
+
+import httpx
+import pytest
+
+from app.core.ECpay import ECpay_async
+from app.core.ECpay.ECpay_async import AsyncECPayClient
+from app.core.ECpay.ECpay_sdk import ECPayPaymentSdk
+
+# ECPay 公開的測試商店
+MERCHANT_ID, HASH_KEY, HASH_IV = "3002607", "pwFHCqoQZGmho4w6", "EkRm7iFT261dpevs"
+URL = "https://ecpay.test/endpoint"
+
+
+@pytest.fixture
+def sdk():
+    return ECPayPaymentSdk(MerchantID=MERCHANT_ID, HashKey=HASH_KEY, HashIV=HASH_IV)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """記下每次退避的秒數，不真的等。"""
+    recorded = []
+
+    async def fake_sleep(seconds):
+        recorded.append(seconds)
+
+    monkeypatch.setattr(ECpay_async.asyncio, "sleep", fake_sleep)
+    return recorded
+
+
+def scripted(*steps):
+    """依序回應：int → 該 status 的回應，Exception → 丟出；同時記下收到的請求。"""
+    calls = []
+    steps = list(steps)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        step = steps.pop(0) if len(steps) > 1 else steps[0]
+        if isinstance(step, Exception):
+            raise step
+        if isinstance(step, httpx.Response):
+            return step
+        return httpx.Response(step, text="ok")
+
+    return httpx.MockTransport(handler), calls
+
+
+def run(client: AsyncECPayClient, coro_fn):
+    async def main():
+        async with client:
+            return await coro_fn(client)
+    return asyncio.run(main())
+
+
+def test_retries_5xx_with_exponential_backoff(sdk, sleeps):
+    transport, calls = scripted(503, 502, 200)
+    client = AsyncECPayClient(sdk, retries=2, backoff=0.1, transport=transport)
+
+    response = run(client, lambda c: c.send_post(URL, {"a": "1"}))
+
+    assert response.status_code == 200
+    assert len(calls) == 3
+    assert sleeps == [0.1, 0.2]
+
+
+def test_retries_transport_errors_then_raises(sdk, sleeps):
+    transport, calls = scripted(httpx.ConnectError("refused"))
+    client = AsyncECPayClient(sdk, retries=2, backoff=0.1, transport=transport)
+
+    with pytest.raises(httpx.ConnectError):
+        run(client, lambda c: c.send_post(URL, {}))
+
+    assert len(calls) == 3
+    assert sleeps == [0.1, 0.2]
+
+
+def test_gives_up_with_http_error_after_last_5xx(sdk, sleeps):
+    transport, calls = scripted(504)
+    client = AsyncECPayClient(sdk, retries=1, backoff=0.1, transport=transport)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run(client, lambda c: c.send_post(URL, {}))
+
+    assert len(calls) == 2
+
+
+def test_4xx_is_returned_without_retry(sdk, sleeps):
+    transport, calls = scripted(400)
+    client = AsyncECPayClient(sdk, retries=2, transport=transport)
+
+    response = run(client, lambda c: c.send_post(URL, {}))
+
+    assert response.status_code == 400
+    assert len(calls) == 1
+    assert sleeps == []
+
+
+@pytest.mark.parametrize("failure", [503, httpx.ReadTimeout("timed out")])
+def test_credit_do_action_is_never_retried(sdk, sleeps, failure):
+    transport, calls = scripted(failure, 200)
+    client = AsyncECPayClient(sdk, retries=3, transport=transport)
+    params = {"MerchantTradeNo": "ODR1", "TradeNo": "T1", "Action": "R", "TotalAmount": 100}
+
+    with pytest.raises(httpx.HTTPError):
+        run(client, lambda c: c.credit_do_action(URL, params))
+
+    assert len(calls) == 1
+    assert sleeps == []
+
+
+def test_order_search_signs_request_and_verifies_reply(sdk, sleeps):
+    reply = {"MerchantID": MERCHANT_ID, "MerchantTradeNo": "ODR1", "TradeStatus": "1", "TradeAmt": "100"}
+    reply["CheckMacValue"] = sdk.generate_check_value(dict(reply))
+    transport, calls = scripted(503, httpx.Response(200, text=urlencode(reply)))
+    client = AsyncECPayClient(sdk, retries=1, backoff=0.1, transport=transport)
+
+    result = run(client, lambda c: c.order_search(URL, {"MerchantTradeNo": "ODR1", "TimeStamp": 1700000000}))
+
+    assert result["TradeStatus"] == "1"
+    assert len(calls) == 2
+    sent = dict(httpx.QueryParams(calls[-1].content.decode()))
+    assert sent["MerchantID"] == MERCHANT_ID
+    assert sent["CheckMacValue"] == sdk.generate_check_value({k: v for k, v in sent.items() if k != "CheckMacValue"})
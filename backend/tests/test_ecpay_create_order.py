@@ -0,0 +1,81 @@
+"""
+CreateOrder 的參數表改成預先編譯（OrderSchema）之後，輸出要跟改寫前完全一樣：欄位順序、值、CheckMacValue、錯誤訊息。
+data/create_order_golden.json 是改寫前的 create_order（git a2fff72^ 的 ECpay_sdk.py）對同一組參數組合算出來的摘要；
+要加組合時用改寫前的 SDK 呼叫 write_golden() 重產。
+"""
+import copy
+import hashlib
+import itertools
+import json
+from pathlib import Path
+
+import pytest
+
+from app.core.ECpay.ECpay_sdk import ECPayPaymentSdk
+
+GOLDEN = Path(__file__).parent / "data" / "create_order_golden.json"
+MERCHANT_ID, HASH_KEY, HASH_IV = "3002607", "pwFHCqoQZGmho4w6", "EkRm7iFT261dpevs"
+
+BASE = {
+    "MerchantTradeNo": "T1", "MerchantTradeDate": "2024/01/01 10:00:00", "PaymentType": "aio",
+    "TotalAmount": 100, "TradeDesc": "d", "ItemName": "a#b", "ReturnURL": "http://x/r", "EncryptType": 1,
+}
+PAYMENTS = ["ALL", "Credit", "ATM", "CVS", "BARCODE", "WebATM", None]
+# 每個組合從這裡挑 0 ~ 2 組疊上去：分期 / 定期定額 / 紅利 / 發票 / 缺欄位 / 超長 / 未知欄位...
+EXTRAS = [
+    {}, {"Redeem": "Y"}, {"UnionPay": 1}, {"CreditInstallment": "3,6"},
+    {"PeriodAmount": 100, "PeriodType": "D", "Frequency": 1, "ExecTimes": 2, "PeriodReturnURL": "u"},
+    {
+        "InvoiceMark": "Y", "RelateNumber": "R1", "CustomerEmail": "a@b.c", "TaxType": "1", "InvoiceItemName": "x",
+        "InvoiceItemCount": "1", "InvoiceItemWord": "w", "InvoiceItemPrice": "100", "InvoiceItemTaxType": "1",
+        "DelayDay": 0, "InvType": "07",
+    },
+    {"InvoiceMark": "Y"}, {"ChooseSubPayment": "TACHONG"}, {"TradeDesc": ""}, {"TradeDesc": "x" * 300},
+    {"TotalAmount": None}, {"ExpireDate": -1}, {"StoreExpireDate": 5, "Desc_1": ""}, {"ClientBackURL": ""},
+    {"Foo": "bar"},
+]
+
+
+def cases():
+    for payment in PAYMENTS:
+        for r in range(3):
+            for combo in itertools.combinations(EXTRAS, r):
+                params = dict(BASE, ChoosePayment=payment)
+                for extra in combo:
+                    params.update(extra)
+                yield params
+
+
+def digest(sdk, params) -> str:
+    try:
+        result = ("ok", list(sdk.create_order(copy.deepcopy(params)).items()))
+    except Exception as e:
+        result = ("err", type(e).__name__, str(e))
+    return hashlib.sha256(repr(result).encode("utf-8")).hexdigest()[:16]
+
+
+def write_golden(sdk) -> None:
+    GOLDEN.parent.mkdir(exist_ok=True)
+    GOLDEN.write_text(json.dumps([digest(sdk, p) for p in cases()], indent=0) + "\n")
+
+
+@pytest.fixture(scope="module")
+def sdk():
+    return ECPayPaymentSdk(MerchantID=MERCHANT_ID, HashKey=HASH_KEY, HashIV=HASH_IV)
+
+
+def test_create_order_matches_pre_schema_output(sdk):
+    golden = json.loads(GOLDEN.read_text())
+    params = list(cases())
+    assert len(params) == len(golden)
+    mismatches = [p for p, expected in zip(params, golden) if digest(sdk, p) != expected]
+    assert not mismatches, f"{len(mismatches)} combinations differ, first: {mismatches[0]}"
+
+
+def test_create_order_does_not_share_state_between_calls(sdk):
+    # 預先編譯的預設值模板不能被某一次呼叫改到
+    first = sdk.create_order(dict(BASE, ChoosePayment="Credit", Redeem="Y"))
+    second = sdk.create_order(dict(BASE, ChoosePayment="Credit"))
+    again = sdk.create_order(dict(BASE, ChoosePayment="Credit"))
+    assert first["Redeem"] == "Y"
+    assert second == again
@@ -0,0 +1,70 @@
+"""CheckMacSigner 要跟改寫前的 CheckMacValue 實作（tests/ecpay_legacy.py 保留的對照組）逐位元相同。"""
+import random
+
+import pytest
+
+from app.core.ECpay.ECpay_sdk import ECPayPaymentSdk
+from tests.ecpay_legacy import (
+    HASH_IV, HASH_KEY, MERCHANT_ID,
+    checkout_params, legacy_check_value, legacy_check_value_for_notify, notify_form, random_params,
+)
+
+SAMPLES = (
+    [checkout_params(i) for i in range(20)]
+    + [notify_form(i) for i in range(20)]
+    + [random_params(random.Random(seed)) for seed in range(1000)]
+)
+
+
+@pytest.fixture(scope="module")
+def sdk():
+    return ECPayPaymentSdk(MerchantID=MERCHANT_ID, HashKey=HASH_KEY, HashIV=HASH_IV)
+
+
+def test_sign_matches_legacy(sdk):
+    for params in SAMPLES:
+        assert sdk.generate_check_value(params) == legacy_check_value(params), params
+
+
+def test_sign_notify_matches_legacy(sdk):
+    for params in SAMPLES:
+        assert sdk.generate_check_value_for_notify(params) == legacy_check_value_for_notify(params), params
+
+
+def test_sign_does_not_mutate_params(sdk):
+    params = checkout_params()
+    params["CheckMacValue"] = "stale"
+    before = dict(params)
+    sdk.generate_check_value(params)
+    sdk.generate_check_value_for_notify(params)
+    assert params == before
+
+
+def test_verify_notify_accepts_legacy_mac(sdk):
+    forms = [notify_form(i) for i in range(5)]
+    for form in forms:
+        form["CheckMacValue"] = legacy_check_value_for_notify(form)
+    assert all(sdk.verify_notify_mac(form) for form in forms)
+    assert sdk.verify_notify_macs(forms) == [True] * len(forms)
+
+
+@pytest.mark.parametrize("tamper", [
+    lambda f: f.update(TradeAmt="1"),
+    lambda f: f.update(RtnCode="0"),
+    lambda f: f.update(CheckMacValue=f["CheckMacValue"].lower()),
+    lambda f: f.pop("CheckMacValue"),
+])
+def test_verify_notify_rejects_tampered_form(sdk, tamper):
+    form = notify_form()
+    form["CheckMacValue"] = legacy_check_value_for_notify(form)
+    tamper(form)
+    assert not sdk.verify_notify_mac(form)
+
+
+def test_verify_notify_ignores_excluded_fields(sdk):
+    # card4no 等欄位不參與驗章：ECPay 加上 / 拿掉這些欄位不影響結果
+    form = notify_form()
+    form["CheckMacValue"] = legacy_check_value_for_notify(form)
+    for key in ("card4no", "card6no", "gwsr"):
+        form[key] = "changed"
+    assert sdk.verify_notify_mac(form)
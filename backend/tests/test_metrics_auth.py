@@ -0,0 +1,38 @@
+"""/metrics 不公開：沒設 METRICS_TOKEN 回 404，有設就要帶對的 bearer token。"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.routes import metrics
+from app.core.config import settings
+
+
+def scrape(headers=None):
+    async def run():
+        app = FastAPI()
+        app.include_router(metrics.router)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            return await http.get("/metrics", headers=headers or {})
+
+    return asyncio.run(run())
+
+
+def test_metrics_disabled_without_token(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", None)
+    assert scrape().status_code == 404
+    assert scrape({"Authorization": "Bearer anything"}).status_code == 404
+
+
+@pytest.mark.parametrize("headers", [None, {"Authorization": "Bearer wrong"}, {"Authorization": "s3cret"}])
+def test_metrics_rejects_missing_or_wrong_token(monkeypatch, headers):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "s3cret")
+    assert scrape(headers).status_code == 401
+
+
+def test_metrics_served_with_token(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "s3cret")
+    response = scrape({"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
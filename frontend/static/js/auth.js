@@ -1,7 +1,54 @@
 // static/js/auth.js
 
+// 同一個分頁裡同時要 refresh 的呼叫共用同一次請求
+let refreshing = null;
+
+// access token 過期時，用 refresh token 換一組新的（不用重新登入）
+export function refreshAccessToken() {
+    if (!refreshing) {
+        refreshing = withRefreshLock(doRefresh).finally(() => { refreshing = null; });
+    }
+    return refreshing;
+}
+
+// refresh token 放在 localStorage，所有分頁共用：用 Web Locks 排隊，一次只有一個分頁去換，
+// 不會兩個分頁拿同一個 refresh token 去換（舊瀏覽器沒有 navigator.locks 就直接換，後端有短暫寬限）
+function withRefreshLock(fn) {
+    if (navigator.locks) {
+        return navigator.locks.request("refresh_token", fn);
+    }
+    return fn();
+}
+
+async function doRefresh() {
+    // 排隊的時候別的分頁可能已經換好了
+    const current = localStorage.getItem("token");
+    if (!isTokenExpired(current)) return current;
+
+    const refreshToken = localStorage.getItem("refresh_token");
+    if (!refreshToken) return null;
+
+    const res = await fetch("/api/token/refresh", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ refresh_token: refreshToken })
+    });
+    if (!res.ok) {
+        localStorage.removeItem("token");
+        localStorage.removeItem("refresh_token");
+        return null;
+    }
+    const result = await res.json();
+    localStorage.setItem("token", result.token);
+    localStorage.setItem("refresh_token", result.refresh_token);
+    return result.token;
+}
+
 export async function loadUserStatus(userStatusId = "userStatus") {
-    const token = localStorage.getItem("token");
+    let token = localStorage.getItem("token");
+    if (isTokenExpired(token)) {
+        token = await refreshAccessToken();
+    }
     let user = {};
     const res = await fetch("/api/user", {
         headers: { Authorization: `Bearer ${token}` }
@@ -15,8 +62,17 @@ export async function loadUserStatus(userStatusId = "userStatus") {
             : `<a href="/login">登入/註冊</a>`;
     }
 }
-export function logout() {
+export async function logout() {
+    const refreshToken = localStorage.getItem("refresh_token");
+    if (refreshToken) {
+        await fetch("/api/token/revoke", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ refresh_token: refreshToken })
+        });
+    }
     localStorage.removeItem("token");
+    localStorage.removeItem("refresh_token");
     window.location.href = "/";
 }
 